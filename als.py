@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# -------------------- Alternating Least Squares --------------------
+
+# Solve workers attach to the fit's arrays once, when the pool starts, and keep them
+# in module globals. The rating structure is fixed for the whole fit; each half-step
+# the parent writes that step's targets and fixed factors into the shared arrays and
+# workers write their solutions back, so blocks are sent as (side, start, stop) only.
+_solve_state = None
+
+def _init_solve_worker(arrays, reg):
+    """arrays maps names to arrays, or in pool workers to their (shared memory name, shape, dtype)"""
+    global _solve_state
+    segments, views = [], {}
+    for name, array in arrays.items():
+        if isinstance(array, tuple):
+            segment = shared_memory.SharedMemory(name=array[0])
+            segments.append(segment)
+            array = np.ndarray(array[1], dtype=array[2], buffer=segment.buf)
+        views[name] = array
+    _solve_state = (views, reg, segments)
+
+def _share_arrays(arrays):
+    """Copies of arrays in new shared memory segments, as (views, segments, specs for _init_solve_worker)"""
+    views, segments, specs = {}, [], {}
+    for name, array in arrays.items():
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        segments.append(segment)
+        views[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+        views[name][...] = array
+        specs[name] = (segment.name, array.shape, array.dtype.str)
+    return views, segments, specs
+
+def _solve_block(task):
+    """
+    Regularised weighted least-squares solutions for a block of rows with similar
+    rating counts, padded to the block's largest count and solved batched, written
+    to the side's solution array.
+
+    A row r minimises sum_j w_j (t_j - f_j @ x)^2 + reg * sum(w) * |x|^2 over its
+    entries j. Rows with fewer entries than dimensions use the dual form, an
+    n x n system per row instead of dim x dim; padding has zero weight.
+    """
+    side, start, stop = task
+    arrays, reg, _ = _solve_state
+    indptr, indices, weights = arrays[side + '_indptr'], arrays[side + '_indices'], arrays[side + '_weights']
+    targets, fixed = arrays[side + '_targets'], arrays[side + '_fixed']
+    rows = arrays[side + '_order'][start:stop]
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    n, dim = int(counts.max()), fixed.shape[1]
+    if n == 0:
+        arrays[side + '_solution'][rows] = 0.0
+        return
+    valid = np.arange(n) < counts[:, None]
+    entries = np.where(valid, starts[:, None] + np.arange(n), 0)
+    sqrt_weights = np.where(valid, np.sqrt(weights[entries]), 0.0)
+    features = fixed[indices[entries]] * sqrt_weights[..., None]
+    weighted_targets = (sqrt_weights * targets[entries])[..., None]
+    penalty = reg * np.maximum(np.where(valid, weights[entries], 0.0).sum(axis=1), 1.0)[:, None, None]
+    features_t = features.transpose(0, 2, 1)
+    if n < dim:
+        gram = features @ features_t + penalty * np.eye(n)
+        solution = features_t @ np.linalg.solve(gram, weighted_targets)
+    else:
+        gram = features_t @ features + penalty * np.eye(dim)
+        solution = np.linalg.solve(gram, features_t @ weighted_targets)
+    arrays[side + '_solution'][rows] = solution[..., 0]
+
+def _row_blocks(indptr, dim, block_floats):
+    """
+    Rows ordered by rating count, and (start, stop) ranges of that order grouping
+    them into blocks of at most ~block_floats padded values
+    """
+    counts = np.diff(indptr)
+    order = np.argsort(counts, kind='stable')
+    sorted_counts = counts[order]
+    bounds, start = [], 0
+    while start < len(order):
+        # Pad to at most twice the smallest count in the block
+        n = 2 * max(int(sorted_counts[start]), 1)
+        per_row = n * dim + min(n, dim) ** 2
+        stop = min(int(np.searchsorted(sorted_counts, n, side='right')), start + max(block_floats // per_row, 1))
+        bounds.append((start, stop))
+        start = stop
+    return order, bounds
+
+class ALSFactorizer:
+    """
+    Biased matrix factorisation fitted by alternating least squares.
+
+    Predicts global_mean + user_bias[u] + item_bias[i] + user_factors[u] @ item_factors[i],
+    the same form as Surprise's SVD. Each half-iteration fixes one side and solves
+    every user (or item) exactly; a bias is fitted alongside the factors by giving
+    the fixed side a constant 1 column. Rows are solved in blocks spread over a
+    process pool started once per fit, which shares the fit's arrays in shared memory.
+
+    With implicit_zeros, 0 ratings (Book-Crossing's "interacted, did not rate")
+    are not taken as ratings of 0: they count as evidence of interest, pulling the
+    prediction towards implicit_rating (default: the mean explicit rating) with
+    confidence implicit_weight instead of 1.
+
+    fit can start from the item factors of an earlier fit instead of random ones;
+    the first user half-step then solves every user against them, so the user side
+    needs no seed, and warm_n_iter iterations are run instead of n_iter.
+    """
+
+    def __init__(self, n_factors=100, n_iter=10, reg=0.1, implicit_zeros=False, implicit_weight=0.25,
+                 implicit_rating=None, block_floats=2**22, n_jobs=None, random_state=42, warm_n_iter=3):
+        self.n_factors = n_factors
+        self.n_iter = n_iter
+        self.warm_n_iter = warm_n_iter
+        self.reg = reg
+        self.implicit_zeros = implicit_zeros
+        self.implicit_weight = implicit_weight
+        self.implicit_rating = implicit_rating
+        self.block_floats = block_floats
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.global_mean = 0.0
+        self.user_factors = None
+        self.user_bias = None
+        self.item_factors = None
+        self.item_bias = None
+
+    def _solve(self, side, arrays, bounds, executor):
+        """Solve every row of one side against the other side's factors; returns (bias, factors)"""
+        tasks = [(side, start, stop) for start, stop in bounds]
+        if executor is None:
+            for task in tasks:
+                _solve_block(task)
+        else:
+            for _ in executor.map(_solve_block, tasks):
+                pass
+        solution = arrays[side + '_solution']
+        return solution[:, 0].copy(), solution[:, 1:].copy()
+
+    def fit(self, matrix, item_factors=None, item_bias=None):
+        """
+        Fit on a user x item scipy.sparse CSR matrix of ratings. Stored zeros are
+        observations (implicit ones with implicit_zeros); missing entries are not.
+
+        item_factors and item_bias, one row per matrix column, warm-start the fit.
+        Items with no earlier factors can be given zeros: they add nothing to the
+        first user half-step and are solved from scratch in the first item half-step.
+        """
+        matrix = matrix.tocsr()
+        ratings = matrix.data.astype(np.float64)
+        if self.implicit_zeros:
+            implicit = ratings == 0
+            explicit_mean = ratings[~implicit].mean() if (~implicit).any() else 0.0
+            implicit_rating = explicit_mean if self.implicit_rating is None else self.implicit_rating
+            ratings = np.where(implicit, implicit_rating, ratings)
+            weights = np.where(implicit, self.implicit_weight, 1.0)
+            self.global_mean = float(explicit_mean)
+        else:
+            weights = np.ones_like(ratings)
+            self.global_mean = float(ratings.mean()) if len(ratings) else 0.0
+        n_users, n_items = matrix.shape
+        dim = self.n_factors + 1
+        user_rows = np.repeat(np.arange(n_users), np.diff(matrix.indptr))
+
+        # Item-major copy of the same entries for the item half-steps
+        item_order = np.argsort(matrix.indices, kind='stable')
+        item_indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(np.bincount(matrix.indices, minlength=n_items), out=item_indptr[1:])
+        item_users = user_rows[item_order]
+        item_ratings = ratings[item_order]
+
+        user_order, user_bounds = _row_blocks(matrix.indptr, dim, self.block_floats)
+        item_order_by_count, item_bounds = _row_blocks(item_indptr, dim, self.block_floats)
+        arrays = {
+            'user_indptr': matrix.indptr, 'user_indices': matrix.indices, 'user_weights': weights,
+            'user_order': user_order, 'user_targets': np.empty(len(ratings)),
+            'user_fixed': np.ones((n_items, dim)), 'user_solution': np.empty((n_users, dim)),
+            'item_indptr': item_indptr, 'item_indices': item_users, 'item_weights': weights[item_order],
+            'item_order': item_order_by_count, 'item_targets': np.empty(len(ratings)),
+            'item_fixed': np.ones((n_users, dim)), 'item_solution': np.empty((n_items, dim)),
+        }
+
+        if item_factors is None:
+            rng = np.random.default_rng(self.random_state)
+            self.item_factors = rng.normal(0, 0.1, (n_items, self.n_factors))
+            self.item_bias = np.zeros(n_items)
+            n_iter = self.n_iter
+        else:
+            if item_factors.shape != (n_items, self.n_factors):
+                raise ValueError(f"item_factors has shape {item_factors.shape}, expected {(n_items, self.n_factors)}")
+            self.item_factors = np.array(item_factors, dtype=np.float64)
+            self.item_bias = np.zeros(n_items) if item_bias is None else np.array(item_bias, dtype=np.float64)
+            n_iter = self.warm_n_iter
+        self.user_factors = np.zeros((n_users, self.n_factors))
+        self.user_bias = np.zeros(n_users)
+
+        # One pool for the whole fit, its workers attached to the arrays in shared memory
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        executor, segments = None, []
+        if n_jobs > 1 and max(len(user_bounds), len(item_bounds)) > 1:
+            arrays, segments, specs = _share_arrays(arrays)
+            executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_solve_worker,
+                                           initargs=(specs, self.reg))
+        else:
+            _init_solve_worker(arrays, self.reg)
+        try:
+            for _ in range(n_iter):
+                arrays['user_fixed'][:, 1:] = self.item_factors
+                np.subtract(ratings - self.global_mean, self.item_bias[matrix.indices], out=arrays['user_targets'])
+                self.user_bias, self.user_factors = self._solve('user', arrays, user_bounds, executor)
+
+                arrays['item_fixed'][:, 1:] = self.user_factors
+                np.subtract(item_ratings - self.global_mean, self.user_bias[item_users], out=arrays['item_targets'])
+                self.item_bias, self.item_factors = self._solve('item', arrays, item_bounds, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _init_solve_worker({}, None)
+            # Views into the segments must go before the segments can be closed
+            arrays.clear()
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        return self
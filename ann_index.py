@@ -0,0 +1,95 @@
+import numpy as np
+
+# -------------------- Approximate Nearest Neighbours --------------------
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index for cosine nearest-neighbour search, pure NumPy.
+
+    Vectors are L2-normalised and clustered with spherical k-means into n_lists
+    coarse cells. Each cell's members are stored contiguously (list_offsets,
+    list_members, list_vectors), so a query scans only the n_probe cells whose
+    centroids are closest to it. Raising n_probe trades latency for recall;
+    n_probe == n_lists is an exact search. Zero vectors are not indexed.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, sample_size=20_000, random_state=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.random_state = random_state
+        self.centroids = None
+        self.list_offsets = None
+        self.list_members = None
+        self.list_vectors = None
+        self.n_vectors = 0
+
+    def _assign(self, vectors, chunk_size=8192):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.n_vectors = len(vectors)
+        norms = np.linalg.norm(vectors, axis=1)
+        indexed = np.flatnonzero(norms > 0)
+        unit = vectors[indexed] / norms[indexed, None]
+        if not len(unit):
+            # Nothing to cluster: an empty index, whose searches find nothing
+            self.centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            self.list_members = np.zeros(0, dtype=np.int32)
+            self.list_vectors = unit
+            return self
+        n_lists = self.n_lists or int(np.clip(np.sqrt(max(len(unit), 1)), 1, 1024))
+        n_lists = max(1, min(n_lists, len(unit)))
+
+        rng = np.random.default_rng(self.random_state)
+        sample = unit[rng.choice(len(unit), min(self.sample_size, len(unit)), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignments = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            sum_norms = np.linalg.norm(sums, axis=1)
+            # Empty cells keep their previous centroid
+            filled = sum_norms > 0
+            self.centroids[filled] = sums[filled] / sum_norms[filled, None]
+
+        assignments = self._assign(unit)
+        order = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=self.list_offsets[1:])
+        self.list_members = indexed[order].astype(np.int32)
+        self.list_vectors = unit[order]
+        return self
+
+    def search(self, query, k=10, n_probe=None, exclude=None):
+        """
+        Approximate top-k (positions, cosine similarities) for one query vector.
+        `exclude` is an optional position (e.g. the query item itself) to leave out.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0 or not len(self.centroids):
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        query = query / query_norm
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        cells = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+
+        members = [self.list_members[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells]
+        vectors = [self.list_vectors[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells]
+        members = np.concatenate(members)
+        sims = np.concatenate(vectors) @ query
+        if exclude is not None:
+            sims[members == exclude] = -np.inf
+        k = min(k, int(np.isfinite(sims).sum()))
+        if k <= 0:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        return members[top], sims[top]
@@ -3,9 +3,8 @@ import pandas as pd
 import random
 from datetime import datetime
 from fpdf import FPDF
-import time
 
-from utils.api import get_recommendations, search_books, load_sample_data
+from utils.api import get_dashboard, search_books
 
 # Set page configuration
 st.set_page_config(
@@ -140,7 +139,7 @@ def main():
         st.markdown("### Recommended For You")
         with st.spinner("Finding your perfect next read..."):
             book_id_param = st.session_state.selected_book_id
-            recommendations = get_recommendations(st.session_state.user_id, book_id_param)
+            recommendations, trending, new_releases = get_dashboard(st.session_state.user_id, book_id_param)
 
             if book_id_param:
                 st.info("Showing books similar to your selection")
@@ -149,14 +148,10 @@ def main():
             display_books_grid(recommendations)
 
         st.markdown("### Popular This Week")
-        popular_books = load_sample_data().sort_values('average_rating', ascending=False).head(6).to_dict('records')
-        display_books_grid(popular_books)
+        display_books_grid(trending)
 
         st.markdown("### New Releases")
-        sample_books = load_sample_data()
-        new_releases = sample_books[sample_books['published_date'] == '2023']
-        new_books = new_releases.sample(min(3, len(new_releases))).to_dict('records') if not new_releases.empty else []
-        display_books_grid(new_books, cols=3)
+        display_books_grid(new_releases, cols=3)
 
     elif page == "🔍 Discover Books":
         st.markdown("## Discover Your Next Favorite Book")
@@ -168,7 +163,6 @@ def main():
 
         if query or search_button:
             with st.spinner("Searching our library..."):
-                time.sleep(0.5)
                 search_results = search_books(query)
                 if search_genre != "All Genres" and search_results:
                     search_results = [book for book in search_results if book.get('genre', '') == search_genre]
@@ -0,0 +1,87 @@
+"""
+Recall@k and queries per second of the IVF item index against brute force.
+
+Run from the repository root:
+
+    python -m benchmarks.ann_benchmark                      # synthetic item factors
+    python -m benchmarks.ann_benchmark --artifacts artifacts  # factors of a trained model
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def synthetic_factors(n_items, n_factors, n_clusters=200, seed=0):
+    """Clustered Gaussian factors, roughly the shape of trained SVD item factors"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, n_factors))
+    labels = rng.integers(0, n_clusters, n_items)
+    return (centers[labels] + rng.normal(scale=0.8, size=(n_items, n_factors))).astype(np.float32)
+
+
+def brute_force(unit, query_positions, k):
+    results = []
+    for position in query_positions:
+        sims = unit @ unit[position]
+        sims[position] = -np.inf
+        top = np.argpartition(-sims, k - 1)[:k]
+        results.append(set(top))
+    return results
+
+
+def run(factors, k=10, n_queries=1000, n_probes=(1, 2, 4, 8, 16, 32), seed=0):
+    norms = np.linalg.norm(factors, axis=1)
+    unit = factors / np.maximum(norms, 1e-12)[:, None]
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(np.flatnonzero(norms > 0), min(n_queries, int((norms > 0).sum())), replace=False)
+
+    started = time.perf_counter()
+    exact = brute_force(unit, queries, k)
+    brute_qps = len(queries) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    index = IVFIndex().fit(factors)
+    build_seconds = time.perf_counter() - started
+
+    results = {'n_items': len(factors), 'n_lists': len(index.centroids), 'k': k,
+               'build_seconds': build_seconds, 'brute_force_qps': brute_qps, 'ivf': []}
+    for n_probe in n_probes:
+        started = time.perf_counter()
+        found = [set(index.search(factors[q], k=k, n_probe=n_probe, exclude=q)[0]) for q in queries]
+        qps = len(queries) / (time.perf_counter() - started)
+        recall = np.mean([len(a & b) / k for a, b in zip(found, exact)])
+        results['ivf'].append({'n_probe': n_probe, 'recall': float(recall), 'qps': qps})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--artifacts', help='Artifact directory to take item factors from')
+    parser.add_argument('--items', type=int, default=270_000, help='Synthetic catalog size')
+    parser.add_argument('--factors', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    if args.artifacts:
+        factors = np.load(f"{args.artifacts}/item_factors.npy")
+    else:
+        factors = synthetic_factors(args.items, args.factors)
+    results = run(factors, k=args.k, n_queries=args.queries)
+
+    print(f"{results['n_items']} items, {results['n_lists']} lists, built in {results['build_seconds']:.1f}s")
+    print(f"brute force: {results['brute_force_qps']:.0f} qps")
+    for row in results['ivf']:
+        print(f"n_probe={row['n_probe']:>3}  recall@{args.k}={row['recall']:.3f}  {row['qps']:.0f} qps")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
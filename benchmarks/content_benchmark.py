@@ -0,0 +1,138 @@
+"""
+Memory footprint and similarity quality of the content vector modes against the
+original float64 TF-IDF over a 5000-word vocabulary.
+
+For each mode it reports fit time, matrix and vectorizer size, query latency, how
+much of the baseline's top-k similarity its neighbours capture, the share of
+neighbours by the same author, and the same capture ratio for books added with
+add_books against a full refit. Capture ratios score neighbour lists by similarity
+under the reference model rather than by identity, so tied neighbours count alike.
+
+Run from a directory holding books.csv, or on generated data:
+
+    python -m benchmarks.content_benchmark
+    python -m benchmarks.content_benchmark --synthetic 200000 --json content.json
+"""
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from book_recommender_api import ContentBasedRecommender, load_and_preprocess_data
+
+# (label, ContentBasedRecommender kwargs); the first one is the baseline
+MODES = (
+    ('tfidf-5000-float64', {'vectors': 'tfidf', 'dtype': np.float64}),
+    ('tfidf-5000-float32', {'vectors': 'tfidf', 'dtype': np.float32}),
+    ('hashing-2^18-float32', {'vectors': 'hashing', 'n_features': 2**18}),
+    ('hashing-2^20-float32', {'vectors': 'hashing', 'n_features': 2**20}),
+)
+
+
+def matrix_mb(matrix):
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+
+
+def neighbours(model, rows, k):
+    return [set(model.similar_positions(model.books_df['book_id'].iloc[row], top_n=k)) for row in rows]
+
+
+def capture(reference, rows, found, expected):
+    """Mean ratio of reference-model similarity summed over `found` vs `expected` neighbours"""
+    matrix = reference.book_content_matrix
+    ratios = []
+    for row, found_positions, expected_positions in zip(rows, found, expected):
+        sims = (matrix[row] @ matrix.T).toarray().ravel()
+        best = sims[list(expected_positions)].sum()
+        ratios.append(sims[list(found_positions)].sum() / best if best > 0 else 1.0)
+    return float(np.mean(ratios))
+
+
+def same_author_share(model, rows, found):
+    authors = model.books_df['authors'].str.lower().to_numpy()
+    return float(np.mean([np.mean(authors[list(positions)] == authors[row]) for row, positions in zip(rows, found)]))
+
+
+def run(books_df, k=10, n_queries=500, add_share=0.05, seed=0):
+    books_df = books_df.reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(books_df), min(n_queries, len(books_df)), replace=False)
+    n_base = len(books_df) - int(len(books_df) * add_share)
+    added = np.arange(n_base, len(books_df))
+    added_queries = added[rng.permutation(len(added))[:n_queries]]
+
+    results = {'n_books': len(books_df), 'k': k, 'modes': []}
+    baseline = baseline_found = None
+    for label, kwargs in MODES:
+        model = ContentBasedRecommender(**kwargs)
+        started = time.perf_counter()
+        model.fit(books_df)
+        fit_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        found = neighbours(model, queries, k)
+        query_ms = (time.perf_counter() - started) / len(queries) * 1000
+        if baseline is None:
+            baseline, baseline_found = model, found
+        vectorizer = model.tfidf_vectorizer if kwargs['vectors'] == 'tfidf' else (
+            model.hashing_vectorizer, model.idf_transformer)
+
+        # Fit on all but the last books, add those, and compare their neighbours to the full fit
+        incremental = ContentBasedRecommender(**kwargs)
+        incremental.fit(books_df.iloc[:n_base])
+        started = time.perf_counter()
+        incremental.add_books(books_df.iloc[n_base:])
+        add_seconds = time.perf_counter() - started
+
+        results['modes'].append({
+            'mode': label,
+            'fit_seconds': fit_seconds,
+            'matrix_mb': matrix_mb(model.book_content_matrix),
+            'vectorizer_mb': len(pickle.dumps(vectorizer)) / 2**20,
+            'nnz_per_book': model.book_content_matrix.nnz / len(books_df),
+            'query_ms': query_ms,
+            'baseline_capture': capture(baseline, queries, found, baseline_found),
+            'same_author_share': same_author_share(model, queries, found),
+            'added_books': len(added),
+            'add_seconds': add_seconds,
+            'added_capture': capture(model, added_queries, neighbours(incremental, added_queries, k),
+                                     neighbours(model, added_queries, k)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, metavar='BOOKS', help='Generate a catalog of this many books')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--add-share', type=float, default=0.05, help='Share of the catalog added incrementally')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from benchmarks.recommender_benchmark import generate_data
+        path = tempfile.mkdtemp(prefix='bookmatch-content-')
+        generate_data(path, args.synthetic, 1000, 1000)
+        os.chdir(path)
+    books_df, _, _ = load_and_preprocess_data()
+    results = run(books_df, k=args.k, n_queries=args.queries, add_share=args.add_share)
+
+    print(f"{results['n_books']} books")
+    for row in results['modes']:
+        print(f"{row['mode']:<22} fit {row['fit_seconds']:6.1f}s  matrix {row['matrix_mb']:7.1f} MB  "
+              f"vectorizer {row['vectorizer_mb']:5.2f} MB  query {row['query_ms']:6.1f} ms  "
+              f"baseline capture {row['baseline_capture']:.3f}  same author {row['same_author_share']:.3f}  "
+              f"add {row['added_books']} in {row['add_seconds']:.2f}s "
+              f"(capture vs refit {row['added_capture']:.3f})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
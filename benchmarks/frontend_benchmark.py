@@ -0,0 +1,177 @@
+"""
+End-to-end latency of the data behind one Streamlit dashboard render, against a
+local stub of the API.
+
+The stub answers the dashboard endpoints with canned book lists after a fixed
+server delay, over HTTP/1.1 keep-alive, and counts the TCP connections it
+accepts. Compared per render (recommendations, trending, new releases):
+
+- before: the old utils/api calls - sequential requests.get, a new connection each
+- after-cold: BookMatchClient with an empty cache - concurrent, pooled connections
+- after-rerun: the same client on a rerun within the cache TTL
+
+It also replays typing a query one key at a time to count the search requests
+that reach the server with and without the debouncer.
+
+    python -m benchmarks.frontend_benchmark
+    python -m benchmarks.frontend_benchmark --delay-ms 50 --renders 50 --json frontend.json
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from benchmarks.recommender_benchmark import latency_summary
+from utils.client import BookMatchClient, make_session
+
+LIST_NAMES = {
+    '/recommendations/': 'recommendations',
+    '/books/trending': 'books',
+    '/books/new-releases': 'books',
+    '/books/search/': 'results',
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay, n_books):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.delay = delay
+        self.connections = 0
+        self.requests = {path: 0 for path in LIST_NAMES}
+        self.lock = threading.Lock()
+        books = [{'book_id': f'S{i:09d}', 'title': f'Book {i}', 'authors': f'Author {i % 97}',
+                  'image_url': 'https://via.placeholder.com/150x225', 'average_rating': 7.5, 'rating_count': i,
+                  'score': 1.0 / (i + 1)} for i in range(n_books)]
+        self.bodies = {path: json.dumps({name: books}).encode() for path, name in LIST_NAMES.items()}
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in one segment, without Nagle's delay on keep-alive connections
+    wbufsize = 2**16
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        body = self.server.bodies.get(path)
+        time.sleep(self.server.delay)
+        if body is None:
+            self.send_response(404)
+            body = b'{"detail": "Not Found"}'
+        else:
+            self.send_response(200)
+            with self.server.lock:
+                self.server.requests[path] += 1
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def render_before(url, user_id):
+    """The dashboard's API calls as utils/api made them before the client module"""
+    books = []
+    params = {'user_id': user_id, 'num_recommendations': 6}
+    books.append(requests.get(f'{url}/recommendations/', params=params).json()['recommendations'])
+    books.append(requests.get(f'{url}/books/trending', params={'limit': 6}).json()['books'])
+    books.append(requests.get(f'{url}/books/new-releases', params={'limit': 3}).json()['books'])
+    return books
+
+
+def measure(server, render, renders):
+    connections = server.connections
+    latencies = []
+    for i in range(renders):
+        started = time.perf_counter()
+        render(i)
+        latencies.append(time.perf_counter() - started)
+    return {**latency_summary(latencies), 'connections_per_render': (server.connections - connections) / renders}
+
+
+def type_query(server, search, query, key_interval):
+    """Fire search for every prefix of query one key_interval apart; returns the requests that reached the server"""
+    before = server.requests['/books/search/']
+    with ThreadPoolExecutor(max_workers=len(query)) as executor:
+        for n in range(1, len(query) + 1):
+            executor.submit(search, query[:n])
+            time.sleep(key_interval)
+    return server.requests['/books/search/'] - before
+
+
+def run(delay=0.02, renders=30, n_books=6, key_interval=0.05, debounce=0.3, query='harry potter'):
+    server = StubServer(delay, n_books)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # Shared by every client, as the front-end shares them between browser sessions
+        session, executor = make_session(), ThreadPoolExecutor(max_workers=8)
+        client = BookMatchClient(server.url, session=session, search_debounce=debounce, executor=executor)
+        client.dashboard(0)
+        results = {
+            'server_delay_ms': delay * 1000,
+            'renders': {
+                'before': measure(server, lambda i: render_before(server.url, i), renders),
+                # A new client (a new browser session) each render, so nothing is cached
+                'after-cold': measure(server, lambda i: BookMatchClient(server.url, session=session,
+                                                                        executor=executor).dashboard(i), renders),
+                'after-rerun': measure(server, lambda i: client.dashboard(0), renders),
+            },
+        }
+
+        def search_before(prefix):
+            # The old search_books sent every query, including ones the API rejects as too short
+            requests.get(f'{server.url}/books/search/', params={'query': prefix})
+
+        results['typeahead'] = {
+            'keys': len(query),
+            'before_requests': type_query(server, search_before, query, key_interval),
+            'after_requests': type_query(server, client.search, query, key_interval),
+        }
+        return results
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delay-ms', type=float, default=20, help='Stub server time per request')
+    parser.add_argument('--renders', type=int, default=30)
+    parser.add_argument('--books', type=int, default=6, help='Books per stub response')
+    parser.add_argument('--key-interval-ms', type=float, default=50, help='Time between keystrokes')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = run(delay=args.delay_ms / 1000, renders=args.renders, n_books=args.books,
+                  key_interval=args.key_interval_ms / 1000)
+    print(f"stub server delay {results['server_delay_ms']:.0f} ms per request")
+    for name, row in results['renders'].items():
+        print(f"{name:<12} render p50/p95 {row['p50_ms']:6.1f}/{row['p95_ms']:6.1f} ms  "
+              f"connections/render {row['connections_per_render']:.2f}")
+    typeahead = results['typeahead']
+    print(f"typing {typeahead['keys']} keys: {typeahead['before_requests']} search requests before, "
+          f"{typeahead['after_requests']} after")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
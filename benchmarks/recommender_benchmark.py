@@ -0,0 +1,331 @@
+"""
+Offline benchmark of the recommenders and search on synthetic Book-Crossing-shaped data.
+
+For each scale it generates books.csv / ratings.csv / users.csv, holds out a share
+of the ratings, and for every component measures fit time, peak RSS and
+per-request p50/p95/p99 latency, plus ranking quality (precision@k, recall@k,
+NDCG@k) of the recommenders and RMSE of the collaborative model. Each component
+runs in a fresh process so its peak RSS is its own.
+
+Run from the repository root:
+
+    python -m benchmarks.recommender_benchmark                          # small scale
+    python -m benchmarks.recommender_benchmark --scales small medium --json bench.json
+    python -m benchmarks.recommender_benchmark --json new.json --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+# (books, users, ratings) per named scale
+SCALES = {
+    'small': (10_000, 20_000, 100_000),
+    'medium': (100_000, 100_000, 1_000_000),
+    'large': (1_000_000, 500_000, 10_000_000),
+}
+
+COMPONENTS = ('content', 'collaborative', 'hybrid', 'search')
+
+WORDS = ('love', 'war', 'night', 'house', 'secret', 'garden', 'river', 'city', 'moon', 'dark', 'king',
+         'summer', 'winter', 'ghost', 'storm', 'island', 'letters', 'daughter', 'journey', 'silent', 'fire',
+         'glass', 'shadow', 'stone', 'mountain', 'road', 'sea', 'dream', 'blood', 'heart')
+
+# -------------------- Synthetic Data --------------------
+
+def generate_data(path, n_books, n_users, n_ratings, n_topics=50, implicit_share=0.62, seed=0):
+    """
+    Write Book-Crossing-shaped CSVs to `path`: a long-tailed book popularity,
+    heavy-tailed user activity, 1-10 explicit ratings and a majority of implicit 0
+    ratings. Books and users belong to topics and users mostly read, and rate
+    higher, inside their own topic, so collaborative models have signal to find.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+
+    book_topics = np.sort(rng.integers(0, n_topics, n_books))
+    popularity = 1.0 / (rng.permutation(n_books) + 1.0) ** 0.9
+    topic_offsets = np.searchsorted(book_topics, np.arange(n_topics + 1))
+    cumulative = np.concatenate([[0.0], np.cumsum(popularity)])
+    quality = rng.normal(0, 1, n_books)
+    isbns = np.char.add('S', np.char.zfill(np.arange(n_books).astype(str), 9))
+    vocabulary = np.array(WORDS)
+    topic_words = rng.integers(0, len(vocabulary), (n_topics, 4))
+    title_words = topic_words[book_topics, rng.integers(0, 4, (n_books, 2)).T].T
+    titles = pd.Series(vocabulary[title_words[:, 0]]).str.title() + ' ' + vocabulary[title_words[:, 1]] \
+        + ' ' + vocabulary[rng.integers(0, len(vocabulary), n_books)]
+    authors = pd.Series(np.char.add('Author ', (book_topics * 40 + rng.integers(0, 40, n_books)).astype(str)))
+    pd.DataFrame({
+        'ISBN': isbns, 'Book-Title': titles, 'Book-Author': authors,
+        'Year-Of-Publication': rng.integers(1950, 2005, n_books), 'Publisher': 'Synthetic',
+        'Image-URL-S': 'https://via.placeholder.com/50x75', 'Image-URL-M': 'https://via.placeholder.com/150x225',
+        'Image-URL-L': 'https://via.placeholder.com/300x450',
+    }).to_csv(os.path.join(path, 'books.csv'), sep=';', index=False)
+
+    user_ids = np.arange(1, n_users + 1)
+    user_topics = rng.integers(0, n_topics, n_users)
+    activity = rng.lognormal(0, 1.5, n_users)
+    raters = rng.choice(n_users, n_ratings, p=activity / activity.sum())
+    own_topic = rng.random(n_ratings) < 0.8
+    topics = np.where(own_topic, user_topics[raters], rng.integers(0, n_topics, n_ratings))
+    # Popularity-weighted pick inside the topic's contiguous block of books
+    low, high = cumulative[topic_offsets[topics]], cumulative[topic_offsets[topics + 1]]
+    books = np.searchsorted(cumulative, low + rng.random(n_ratings) * (high - low), side='right') - 1
+    books = np.clip(books, topic_offsets[topics], np.maximum(topic_offsets[topics + 1] - 1, 0))
+    explicit = np.clip(np.rint(6.5 + np.where(own_topic, 1.5, -1.5) + quality[books]
+                               + rng.normal(0, 1.2, n_ratings)), 1, 10)
+    ratings = np.where(rng.random(n_ratings) < implicit_share, 0, explicit).astype(np.int8)
+    ratings_df = pd.DataFrame({'User-ID': user_ids[raters], 'ISBN': isbns[books], 'Book-Rating': ratings})
+    ratings_df.drop_duplicates(['User-ID', 'ISBN']).to_csv(os.path.join(path, 'ratings.csv'), index=False)
+
+    pd.DataFrame({'User-ID': user_ids, 'Location': 'synthetic, usa', 'Age': rng.integers(15, 80, n_users)}) \
+        .to_csv(os.path.join(path, 'users.csv'), index=False)
+
+# -------------------- Metrics --------------------
+
+def latency_summary(seconds):
+    milliseconds = np.asarray(seconds) * 1000
+    return {'requests': len(milliseconds), 'mean_ms': float(milliseconds.mean()),
+            **{f'p{q}_ms': float(np.percentile(milliseconds, q)) for q in (50, 95, 99)}}
+
+
+def ranking_metrics(recommended_lists, relevant_sets, k):
+    """Mean precision@k, recall@k and NDCG@k (binary relevance) over users"""
+    precision, recall, ndcg = [], [], []
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    for recommended, relevant in zip(recommended_lists, relevant_sets):
+        hits = np.array([book_id in relevant for book_id in list(recommended)[:k]], dtype=bool)
+        precision.append(hits.sum() / k)
+        recall.append(hits.sum() / len(relevant))
+        ideal = discounts[:min(len(relevant), k)].sum()
+        ndcg.append((discounts[:len(hits)][hits]).sum() / ideal)
+    return {f'precision@{k}': float(np.mean(precision)), f'recall@{k}': float(np.mean(recall)),
+            f'ndcg@{k}': float(np.mean(ndcg)), 'eval_users': len(relevant_sets)}
+
+
+def timed_requests(fn, args_list):
+    seconds = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        seconds.append(time.perf_counter() - started)
+    return latency_summary(seconds)
+
+# -------------------- Components --------------------
+
+def _evaluation_users(train_df, test_df, options):
+    """Sampled users with a train history and held-out books rated >= relevant_rating"""
+    relevant = test_df[test_df['rating'] >= options['relevant_rating']]
+    relevant = relevant[relevant['user_id'].isin(train_df['user_id'].unique())]
+    relevant_sets = {}
+    for user_id, book_id in zip(relevant['user_id'].to_numpy(), relevant['book_id'].to_numpy(dtype=object)):
+        relevant_sets.setdefault(user_id, set()).add(book_id)
+    rng = np.random.default_rng(options['seed'])
+    users = rng.permutation(np.array(sorted(relevant_sets), dtype=np.int64))[:options['eval_users']]
+    return users, [relevant_sets[user_id] for user_id in users]
+
+
+def _run_component(component, data_dir, options):
+    # Runs in a fresh process, so the data directory is also the working directory
+    os.chdir(data_dir)
+    import book_recommender_api as api
+    from benchmarks.trainer_benchmark import split_ratings, rmse
+
+    result = {}
+    books_df, ratings_df, _ = api.load_and_preprocess_data()
+    train_df, test_df = split_ratings(ratings_df, options['test_size'], seed=options['seed'])
+    result['load_peak_rss_mb'] = api._peak_rss_mb()
+    k = options['k']
+    users, relevant_sets = _evaluation_users(train_df, test_df, options)
+    rng = np.random.default_rng(options['seed'])
+    sample_books = books_df['book_id'].to_numpy()[rng.integers(0, len(books_df), options['requests'])]
+
+    started = time.perf_counter()
+    if component == 'content':
+        model = api.ContentBasedRecommender()
+        model.fit(books_df)
+        if options['content_index_k']:
+            model.build_similarity_index(k=options['content_index_k'])
+    elif component == 'collaborative':
+        model = api.CollaborativeRecommender(trainer=options['trainer'], implicit_zeros=options['implicit_zeros'])
+        model.fit(train_df, books_df)
+        if options['ann_index']:
+            model.build_ann_index()
+    elif component == 'hybrid':
+        model = api.build_hybrid_recommender(books_df, train_df, content_index_k=options['content_index_k'],
+                                             ann_index=options['ann_index'], trainer=options['trainer'],
+                                             implicit_zeros=options['implicit_zeros'])
+    else:
+        model = api.BookSearchIndex(books_df)
+    result['fit_seconds'] = time.perf_counter() - started
+    result['peak_rss_mb'] = api._peak_rss_mb()
+
+    if component == 'search':
+        # Through the real endpoint, with the result cache off so every request does the work
+        from fastapi.testclient import TestClient
+        from concurrent.futures import ThreadPoolExecutor
+        api.snapshot = api.ServingSnapshot(books_df, None, None, None, None, None, model,
+                                           api.BookSerializer(books_df), 'benchmark')
+        api.result_cache = None
+        api.snapshot.search_executor = api.BoundedExecutor(ThreadPoolExecutor(1), timeout=60)
+        titles = books_df['title'].to_numpy()[rng.integers(0, len(books_df), options['requests'])]
+        # A mix of whole words and type-ahead prefixes
+        queries = [title.split()[0] if i % 2 else title[:max(3, len(title) // 2)] for i, title in enumerate(titles)]
+        # Not entered as a context manager, so the startup event (which loads and trains) never runs
+        client = TestClient(api.app)
+        result['latency'] = timed_requests(
+            lambda query: client.get('/books/search/', params={'query': query}).raise_for_status(),
+            [(query,) for query in queries]
+        )
+        result['peak_rss_mb'] = api._peak_rss_mb()
+        return result
+
+    user_index = api.UserRatingIndex(train_df, books_df['book_id'].unique())
+    seeds = [user_index.top_rated_book(user_id) for user_id in users]
+    request_users = rng.choice(users, options['requests']) if len(users) else []
+    if component == 'content':
+        result['latency'] = timed_requests(model.recommend, [(book_id, k) for book_id in sample_books])
+        recommended = [model.recommend(seed, top_n=k)['book_id'] for seed in seeds]
+    elif component == 'collaborative':
+        result['latency'] = timed_requests(
+            model.recommend_for_user, [(user_id, user_index.rated_mask(user_id), k) for user_id in request_users]
+        )
+        recommended = [model.item_ids[model.top_positions_for_user(user_id, user_index.rated_mask(user_id), k)]
+                       for user_id in users]
+        predictions = model.predict_ratings(test_df['user_id'].to_numpy(), test_df['book_id'].to_numpy())
+        ratings = test_df['rating'].to_numpy(dtype=np.float64)
+        result['rmse'] = rmse(predictions, ratings)
+        result['rmse_explicit'] = rmse(predictions[ratings != 0], ratings[ratings != 0])
+    else:
+        result['latency'] = timed_requests(
+            model.recommend, [(user_id, user_index.top_rated_book(user_id), user_index.rated_mask(user_id), k)
+                              for user_id in request_users]
+        )
+        recommended = [model.recommend(user_id, seed, user_index.rated_mask(user_id), top_n=k)['book_id']
+                       for user_id, seed in zip(users, seeds)]
+    result['quality'] = ranking_metrics(recommended, relevant_sets, k) if relevant_sets else {}
+    result['peak_rss_mb'] = api._peak_rss_mb()
+    return result
+
+
+def run_scale(scale, n_books, n_users, n_ratings, workdir, components, options):
+    data_dir = os.path.join(workdir, f'{scale}-{n_books}-{n_users}-{n_ratings}')
+    run = {'scale': scale, 'n_books': n_books, 'n_users': n_users, 'n_ratings': n_ratings, 'components': {}}
+    if not os.path.exists(os.path.join(data_dir, 'users.csv')):
+        started = time.perf_counter()
+        generate_data(data_dir, n_books, n_users, n_ratings, seed=options['seed'])
+        run['generate_seconds'] = time.perf_counter() - started
+    context = multiprocessing.get_context('spawn')
+    for component in components:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            run['components'][component] = executor.submit(_run_component, component, data_dir, options).result()
+        print(f"  {component:<14} {format_component(run['components'][component])}", flush=True)
+    return run
+
+# -------------------- Reporting --------------------
+
+def format_component(result):
+    parts = [f"fit {result['fit_seconds']:.1f}s", f"peak {result['peak_rss_mb']} MB"]
+    latency = result.get('latency')
+    if latency:
+        parts.append(f"p50/p95/p99 {latency['p50_ms']:.1f}/{latency['p95_ms']:.1f}/{latency['p99_ms']:.1f} ms")
+    for name, value in sorted(result.get('quality', {}).items()):
+        if name != 'eval_users':
+            parts.append(f"{name} {value:.4f}")
+    if 'rmse' in result:
+        parts.append(f"rmse {result['rmse']:.4f}")
+    return '  '.join(parts)
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f'{prefix}.{key}' if prefix else str(key)))
+        return items
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(results, baseline):
+    """Relative change of every numeric result against a previous run, keyed by scale"""
+    def by_scale(data):
+        return {run['scale']: flatten(run['components']) for run in data['runs']}
+    old_runs, changes = by_scale(baseline), []
+    for scale, new in by_scale(results).items():
+        old = old_runs.get(scale, {})
+        for key in sorted(set(new) & set(old)):
+            if old[key]:
+                changes.append((scale, key, old[key], new[key], (new[key] - old[key]) / abs(old[key])))
+    return changes
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small'])
+    parser.add_argument('--size', nargs=3, type=int, metavar=('BOOKS', 'USERS', 'RATINGS'),
+                        help='Run one custom scale instead of --scales')
+    parser.add_argument('--components', nargs='+', choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument('--workdir', help='Where generated data is kept and reused (default: a temp dir)')
+    parser.add_argument('--requests', type=int, default=500, help='Timed requests per component')
+    parser.add_argument('--k', type=int, default=10, help='Cut-off for precision/recall/NDCG')
+    parser.add_argument('--eval-users', type=int, default=1000)
+    parser.add_argument('--relevant-rating', type=int, default=7,
+                        help='Held-out ratings at or above this count as relevant')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--trainer', default='svd', choices=('svd', 'als'))
+    parser.add_argument('--implicit-zeros', action='store_true')
+    parser.add_argument('--content-index-k', type=int, default=0)
+    parser.add_argument('--no-ann-index', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Results file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    options = {
+        'requests': args.requests, 'k': args.k, 'eval_users': args.eval_users,
+        'relevant_rating': args.relevant_rating, 'test_size': args.test_size, 'trainer': args.trainer,
+        'implicit_zeros': args.implicit_zeros, 'content_index_k': args.content_index_k,
+        'ann_index': not args.no_ann_index, 'seed': args.seed,
+    }
+    scales = [('custom', *args.size)] if args.size else [(scale, *SCALES[scale]) for scale in args.scales]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bookmatch-bench-')
+    results = {
+        'meta': {'git_commit': git_commit(), 'created_at': time.time(), 'python': sys.version.split()[0],
+                 'numpy': np.__version__, 'pandas': pd.__version__, 'platform': platform.platform(),
+                 'cpu_count': os.cpu_count(), 'options': options},
+        'runs': [],
+    }
+    for scale, n_books, n_users, n_ratings in scales:
+        print(f"{scale}: {n_books} books, {n_users} users, {n_ratings} ratings", flush=True)
+        results['runs'].append(run_scale(scale, n_books, n_users, n_ratings, workdir, args.components, options))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nChanges against {args.baseline} (commit {baseline['meta'].get('git_commit')}):")
+        for scale, key, old, new, change in compare(results, baseline):
+            print(f"{scale:<8} {key:<40} {old:>12.4g} -> {new:<12.4g} {change:+.1%}")
+
+
+if __name__ == '__main__':
+    main()
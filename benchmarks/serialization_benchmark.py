@@ -0,0 +1,121 @@
+"""
+Serialization cost per result row of book-list responses, before and after the
+BookSerializer fast path.
+
+Paths compared for the same rows and numbers:
+
+- dataframe+pydantic: the old path - DataFrame row copy, to_dict('records'),
+  RecommendationResponse validation, jsonable_encoder and json.dumps
+- records+dumps: to_dict('records') straight into serialization.dumps (orjson
+  when installed), to separate the encoder from the rest
+- fragments-json: BookSerializer joining its precomputed per-book fragments
+- fragments-arrow: BookSerializer writing an Arrow IPC stream
+
+Run from a directory holding books.csv, or on generated data:
+
+    python -m benchmarks.serialization_benchmark
+    python -m benchmarks.serialization_benchmark --synthetic 270000 --json serialization.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from book_recommender_api import RecommendationResponse, load_and_preprocess_data
+from serialization import HAVE_ORJSON, HAVE_PYARROW, BookSerializer, dumps
+
+SIZES = (10, 100, 1000, 5000)
+
+
+def dataframe_pydantic(books_df, rows, numbers):
+    result = books_df.iloc[rows][['book_id', 'title', 'authors', 'image_url']].copy()
+    for name, values in numbers.items():
+        result[name] = values
+    response = RecommendationResponse(recommendations=result.to_dict('records'))
+    return json.dumps(jsonable_encoder(response)).encode()
+
+
+def records_dumps(books_df, rows, numbers):
+    result = books_df.iloc[rows][['book_id', 'title', 'authors', 'image_url']].copy()
+    for name, values in numbers.items():
+        result[name] = values
+    return dumps({'recommendations': result.to_dict('records')})
+
+
+def per_row_us(fn, n_rows, min_seconds=0.5):
+    fn()
+    calls, started = 0, time.perf_counter()
+    while time.perf_counter() - started < min_seconds:
+        fn()
+        calls += 1
+    return (time.perf_counter() - started) / calls / n_rows * 1e6
+
+
+def run(books_df, sizes=SIZES, seed=0):
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    serializer = BookSerializer(books_df)
+    results = {
+        'n_books': len(books_df),
+        'orjson': HAVE_ORJSON,
+        'build_seconds': time.perf_counter() - started,
+        'fragments_mb': (len(serializer.text) + serializer.offsets.nbytes) / 2**20,
+        'sizes': [],
+    }
+    paths = {
+        'dataframe+pydantic': lambda rows, numbers: dataframe_pydantic(books_df, rows, numbers),
+        'records+dumps': lambda rows, numbers: records_dumps(books_df, rows, numbers),
+        'fragments-json': lambda rows, numbers: serializer.response('json', 'recommendations', rows, numbers),
+    }
+    if HAVE_PYARROW:
+        paths['fragments-arrow'] = lambda rows, numbers: serializer.response('arrow', 'recommendations', rows,
+                                                                             numbers)
+    for size in sizes:
+        rows = rng.choice(len(books_df), min(size, len(books_df)), replace=False)
+        numbers = {
+            'score': rng.random(len(rows)),
+            'average_rating': rng.random(len(rows)) * 10,
+            'rating_count': rng.integers(0, 1000, len(rows)),
+        }
+        # The fast path must produce the same document as the old one
+        assert json.loads(paths['fragments-json'](rows, numbers)) == json.loads(
+            paths['dataframe+pydantic'](rows, numbers))
+        row = {'rows': len(rows)}
+        for name, fn in paths.items():
+            row[name] = {'us_per_row': per_row_us(lambda: fn(rows, numbers), len(rows)),
+                         'bytes_per_row': len(fn(rows, numbers)) / len(rows)}
+        results['sizes'].append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, metavar='BOOKS', help='Generate a catalog of this many books')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from benchmarks.recommender_benchmark import generate_data
+        path = tempfile.mkdtemp(prefix='bookmatch-serialization-')
+        generate_data(path, args.synthetic, 1000, 1000)
+        os.chdir(path)
+    books_df, _, _ = load_and_preprocess_data()
+    results = run(books_df)
+
+    print(f"{results['n_books']} books, fragments built in {results['build_seconds']:.2f}s "
+          f"({results['fragments_mb']:.1f} MB), orjson {'on' if results['orjson'] else 'off'}")
+    for row in results['sizes']:
+        timings = '  '.join(f"{name} {value['us_per_row']:6.2f} us/row ({value['bytes_per_row']:.0f} B)"
+                            for name, value in row.items() if name != 'rows')
+        print(f"{row['rows']:>5} rows  {timings}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Throughput of the API as the catalog is split over more shards on one machine.
+
+Generates a synthetic catalog, builds one set of artifacts, then for each shard
+count starts that many book_recommender_api processes (BOOKMATCH_SHARD=i/n, all
+loading the same artifacts) behind a coordinator process, and drives recommendation
+and search requests at it from closed-loop client threads for a fixed time. A
+single unsharded API answering the clients directly is the baseline. Every API
+process runs one executor thread and the result cache is off, so each request
+does its full work and each shard adds one core's worth of request work.
+
+Shards only add throughput while there are idle cores for them: on a machine with
+fewer cores than shards plus the coordinator they compete for the same CPU, and
+the run reports the core count next to the results.
+
+    python -m benchmarks.shard_benchmark
+    python -m benchmarks.shard_benchmark --books 200000 --shards 1 2 4 8 --clients 32 --json shards.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from benchmarks.recommender_benchmark import WORDS, generate_data, latency_summary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(module, data_dir, env, health_path, startup_timeout=600):
+    """Start `uvicorn module:app` on a free port and wait until health_path answers 200; returns (process, url)"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{module}:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=data_dir, env={**os.environ, 'PYTHONPATH': REPO_ROOT, **env},
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{module} exited with {process.returncode} during startup")
+        try:
+            if requests.get(url + health_path, timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"{module} did not become healthy within {startup_timeout}s")
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def drive(url, make_request, clients, seconds):
+    """Closed-loop load: `clients` threads sending make_request(rng) for `seconds`; throughput and latency"""
+    latencies, errors, partial = [], [0], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        session = requests.Session()
+        own = []
+        while time.monotonic() < deadline:
+            path, params = make_request(rng)
+            started = time.perf_counter()
+            response = session.get(url + path, params=params, timeout=30)
+            own.append(time.perf_counter() - started)
+            with lock:
+                if response.status_code != 200:
+                    errors[0] += 1
+                elif response.json().get('partial'):
+                    partial[0] += 1
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {'requests_per_second': len(latencies) / elapsed, 'errors': errors[0], 'partial': partial[0],
+            **latency_summary(latencies)}
+
+
+def run(data_dir, user_ids, shard_counts=(1, 2, 4), clients=16, seconds=10, threads_per_shard=1):
+    artifacts = os.path.join(data_dir, 'artifacts')
+    api_env = {'BOOKMATCH_ARTIFACTS': artifacts, 'BOOKMATCH_CACHE_MB': '0', 'BOOKMATCH_REFIT_INTERVAL': '0',
+               'BOOKMATCH_EXECUTOR_THREADS': str(threads_per_shard), 'BOOKMATCH_MAX_PENDING': '1024',
+               'BOOKMATCH_REQUEST_TIMEOUT': '60'}
+    workloads = {
+        'recommendations': lambda rng: ('/recommendations/', {'user_id': int(rng.choice(user_ids)),
+                                                              'num_recommendations': 10}),
+        'search': lambda rng: ('/books/search/', {'query': str(rng.choice(WORDS)), 'limit': 20}),
+    }
+    results = {'cpu_count': os.cpu_count(), 'clients': clients, 'seconds': seconds, 'configs': []}
+    configs = [('unsharded', 0)] + [(f'{n} shard{"s" if n > 1 else ""}', n) for n in shard_counts]
+    for name, n_shards in configs:
+        processes = []
+        try:
+            if n_shards == 0:
+                process, url = start_server('book_recommender_api', data_dir, api_env, '/shard/health')
+                processes.append(process)
+            else:
+                shard_urls = []
+                for index in range(n_shards):
+                    process, shard_url = start_server('book_recommender_api', data_dir,
+                                                      {**api_env, 'BOOKMATCH_SHARD': f'{index}/{n_shards}'},
+                                                      '/shard/health')
+                    processes.append(process)
+                    shard_urls.append(shard_url)
+                process, url = start_server('coordinator', data_dir, {
+                    'BOOKMATCH_SHARDS': ','.join(shard_urls), 'BOOKMATCH_SHARD_TIMEOUT': '30',
+                    'BOOKMATCH_COORDINATOR_THREADS': str(max(clients, 8)),
+                }, '/health')
+                processes.append(process)
+            row = {'name': name, 'shards': n_shards}
+            for workload, make_request in workloads.items():
+                drive(url, make_request, clients, min(seconds, 2))  # warm-up
+                row[workload] = drive(url, make_request, clients, seconds)
+            results['configs'].append(row)
+        finally:
+            stop_servers(processes)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=50_000, help='Synthetic catalog size')
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--ratings', type=int, default=300_000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4], help='Shard counts to compare')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent closed-loop clients')
+    parser.add_argument('--seconds', type=float, default=10, help='Measured load time per workload')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='bookmatch-shards-')
+    generate_data(data_dir, args.books, args.users, args.ratings)
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'book_recommender_api.py'), 'build-artifacts',
+                    '--output', 'artifacts'], cwd=data_dir, check=True)
+    user_ids = pd.read_csv(os.path.join(data_dir, 'ratings.csv'), usecols=['User-ID'])['User-ID'].unique()
+    results = run(data_dir, user_ids, shard_counts=args.shards, clients=args.clients, seconds=args.seconds)
+
+    print(f"{args.books} books, {args.clients} clients, {results['cpu_count']} CPU cores")
+    baseline = {workload: results['configs'][0][workload]['requests_per_second']
+                for workload in ('recommendations', 'search')}
+    for row in results['configs']:
+        cells = '  '.join(
+            f"{workload} {row[workload]['requests_per_second']:7.1f} req/s "
+            f"(x{row[workload]['requests_per_second'] / baseline[workload]:.2f}, "
+            f"p50/p95 {row[workload]['p50_ms']:.0f}/{row[workload]['p95_ms']:.0f} ms)"
+            for workload in ('recommendations', 'search'))
+        print(f"{row['name']:<10} {cells}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
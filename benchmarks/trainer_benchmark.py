@@ -0,0 +1,79 @@
+"""
+Training wall-clock and held-out RMSE of the collaborative trainers (Surprise SVD
+and ALS) on the same train/test split of the ratings.
+
+Run from a directory holding books.csv, ratings.csv and users.csv:
+
+    python -m benchmarks.trainer_benchmark
+    python -m benchmarks.trainer_benchmark --sample 200000 --implicit-zeros --json trainers.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from book_recommender_api import COLLABORATIVE_TRAINERS, CollaborativeRecommender, load_and_preprocess_data
+
+
+def split_ratings(ratings_df, test_size=0.2, seed=42):
+    order = np.random.default_rng(seed).permutation(len(ratings_df))
+    n_test = int(round(len(ratings_df) * test_size))
+    return ratings_df.iloc[order[n_test:]], ratings_df.iloc[order[:n_test]]
+
+
+def rmse(predictions, ratings):
+    return float(np.sqrt(np.mean((predictions - ratings) ** 2))) if len(ratings) else float('nan')
+
+
+def run(books_df, ratings_df, trainers=COLLABORATIVE_TRAINERS, test_size=0.2, implicit_zeros=False, n_jobs=None):
+    train_df, test_df = split_ratings(ratings_df, test_size)
+    ratings = test_df['rating'].to_numpy(dtype=np.float64)
+    explicit = ratings != 0
+    results = {'n_train': len(train_df), 'n_test': len(test_df), 'n_test_explicit': int(explicit.sum()),
+               'trainers': []}
+    for trainer in trainers:
+        recommender = CollaborativeRecommender(trainer=trainer, implicit_zeros=implicit_zeros, n_jobs=n_jobs)
+        started = time.perf_counter()
+        recommender.fit(train_df, books_df)
+        fit_seconds = time.perf_counter() - started
+        predictions = recommender.predict_ratings(test_df['user_id'].to_numpy(), test_df['book_id'].to_numpy())
+        results['trainers'].append({
+            'trainer': trainer,
+            'implicit_zeros': implicit_zeros and trainer == 'als',
+            'fit_seconds': fit_seconds,
+            'rmse': rmse(predictions, ratings),
+            'rmse_explicit': rmse(predictions[explicit], ratings[explicit]),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trainers', nargs='+', choices=COLLABORATIVE_TRAINERS, default=list(COLLABORATIVE_TRAINERS))
+    parser.add_argument('--sample', type=int, help='Use a random sample of this many ratings')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--implicit-zeros', action='store_true', help='Fit ALS with 0 ratings as implicit feedback')
+    parser.add_argument('--jobs', type=int, help='ALS worker processes (default: all cores)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    books_df, ratings_df, _ = load_and_preprocess_data()
+    if args.sample and args.sample < len(ratings_df):
+        ratings_df = ratings_df.sample(args.sample, random_state=0)
+    results = run(books_df, ratings_df, trainers=args.trainers, test_size=args.test_size,
+                  implicit_zeros=args.implicit_zeros, n_jobs=args.jobs)
+
+    print(f"{results['n_train']} training ratings, {results['n_test']} held out "
+          f"({results['n_test_explicit']} explicit)")
+    for row in results['trainers']:
+        label = row['trainer'] + (' (implicit zeros)' if row['implicit_zeros'] else '')
+        print(f"{label:<22} fit {row['fit_seconds']:7.1f}s  rmse {row['rmse']:.4f}  "
+              f"rmse (explicit) {row['rmse_explicit']:.4f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,135 +2,1449 @@ import pandas as pd
 import numpy as np
 from surprise import SVD, Dataset, Reader, accuracy
 from surprise.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import (
+    ENGLISH_STOP_WORDS, TfidfTransformer, TfidfVectorizer
+)
+from sklearn.feature_extraction import FeatureHasher
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
-from fastapi import FastAPI, Query, HTTPException
-from pydantic import BaseModel
+import copy
+import re
+import json
+import hashlib
+import hmac
+import os
+import shutil
+import time
+import argparse
+import sys
+import warnings
+import asyncio
+import threading
+import gc
+import ctypes
+from contextlib import contextmanager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scipy import sparse
+from fastapi import FastAPI, Query, HTTPException, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
 
+from search_index import BookSearchIndex
+from ann_index import IVFIndex
+from als import ALSFactorizer
+from metrics import METRICS, SlowRequestProfiler
+from executors import BoundedExecutor, ExecutorSaturated
+from result_cache import TieredCache, parse_shared_address
+from popularity import BookAggregates
+from serialization import ARROW_MEDIA_TYPE, BookSerializer, dumps, response_format
+from sharding import parse_shard, shard_of, shard_rows
+from materialized import MaterializedRecommendations, save_materialized
+
+try:
+    import pyarrow  # noqa: F401  (only needed for the Parquet data cache)
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
 # -------------------- Data Loading and Preprocessing --------------------
 
-def load_and_preprocess_data():
+DATA_FILES = {
+    'books': 'books.csv',
+    'ratings': 'ratings.csv',
+    'users': 'users.csv',
+}
+
+# Rows parsed per read_csv chunk while ingesting the CSVs
+CSV_CHUNK_SIZE = 200_000
+
+BOOK_COLUMNS = {
+    "ISBN": "book_id",
+    "Book-Title": "title",
+    "Book-Author": "authors",
+    "Year-Of-Publication": "published_date",
+    "Image-URL-M": "image_url"
+}
+# ratings.csv / users.csv may use either our column names or the raw Book-Crossing ones
+RATING_COLUMNS = {"User-ID": "user_id", "ISBN": "book_id", "Book-Rating": "rating"}
+
+# Book-Rating values: 1-10 is an explicit rating, 0 an implicit one (the user read the book)
+RATING_RANGE = (0, 10)
+USER_COLUMNS = {"User-ID": "user_id"}
+
+def _read_csv_chunks(path, report, dtype=str, **kwargs):
     """
-    Load and preprocess the book dataset
-    Using books.csv, ratings.csv, and users.csv
+    Yield read_csv chunks, counting lines with the wrong number of fields in
+    report['bad_fields'] instead of failing on them.
     """
-    # Load datasets
-    books_df = pd.read_csv('books.csv', sep=';')
-    ratings_df = pd.read_csv('ratings.csv')
-    users_df = pd.read_csv('users.csv')
-
-    # Rename columns to match expected format
-    books_df = books_df.rename(columns={
-        "ISBN": "book_id",
-        "Book-Title": "title",
-        "Book-Author": "authors",
-        "Year-Of-Publication": "published_date",
-        "Image-URL-M": "image_url"
-    })
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        for chunk in pd.read_csv(path, dtype=dtype, chunksize=CSV_CHUNK_SIZE, on_bad_lines='warn', **kwargs):
+            yield chunk
+    report['bad_fields'] = sum(str(w.message).count('Skipping line') for w in caught)
 
-    # Fill missing values and create content column
+def _intern_codes(values, vocabulary):
+    """
+    Dense int32 ids for string values against a vocabulary Index.
+    Returns the codes and the vocabulary with unseen values appended.
+    """
+    codes, uniques = pd.factorize(values)
+    mapping = vocabulary.get_indexer(uniques)
+    unseen = mapping < 0
+    mapping[unseen] = len(vocabulary) + np.arange(int(unseen.sum()))
+    return mapping.astype(np.int32)[codes], vocabulary.append(pd.Index(uniques[unseen], dtype=object))
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / 2**20 if sys.platform == 'darwin' else peak / 2**10, 1)
+
+def _current_rss_mb():
+    """Resident set size right now (Linux only; None elsewhere)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+
+def _release_memory():
+    """Collect garbage and, on glibc, hand freed heap pages back to the OS"""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def _load_books(report):
+    chunks = []
+    # Every column is read and the unused ones dropped per chunk: with usecols the parser
+    # would keep lines with extra fields (a ';' inside a title) instead of reporting them
+    for chunk in _read_csv_chunks(DATA_FILES['books'], report, sep=';'):
+        chunk = chunk[[column for column in chunk.columns if column in BOOK_COLUMNS]].rename(columns=BOOK_COLUMNS)
+        missing_id = chunk['book_id'].isna()
+        report['missing_book_id'] = report.get('missing_book_id', 0) + int(missing_id.sum())
+        chunks.append(chunk[~missing_id])
+    books_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(BOOK_COLUMNS.values()))
+
+    # Fill missing values
     books_df.fillna({
         'title': 'Unknown Title',
         'authors': 'Unknown Author',
         'published_date': 'N/A',
         'image_url': 'https://via.placeholder.com/150x225'
     }, inplace=True)
+    books_df['published_date'] = books_df['published_date'].astype('category')
+    report['rows'] = len(books_df)
+    return books_df
+
+def _load_ratings(report, isbn_vocabulary):
+    user_ids, book_codes, ratings = [], [], []
+    # Numeric columns are left to the parser and coerced below, so a stray bad value
+    # only costs that chunk a slower conversion
+    isbn_dtype = {'book_id': str, 'ISBN': str}
+    for chunk in _read_csv_chunks(DATA_FILES['ratings'], report, dtype=isbn_dtype):
+        chunk = chunk.rename(columns=RATING_COLUMNS)
+        user_id = pd.to_numeric(chunk['user_id'], errors='coerce')
+        rating = pd.to_numeric(chunk['rating'], errors='coerce')
+        # Ratings outside RATING_RANGE or fractional (the column is int8) count as malformed
+        valid = (user_id.notna() & chunk['book_id'].notna() & rating.between(*RATING_RANGE)
+                 & (rating % 1 == 0) & (user_id.abs() < 2**31))
+        report['malformed_values'] = report.get('malformed_values', 0) + int((~valid).sum())
+        user_ids.append(user_id[valid].to_numpy(dtype=np.int32))
+        ratings.append(rating[valid].to_numpy(dtype=np.int8))
+        codes, isbn_vocabulary = _intern_codes(chunk['book_id'][valid], isbn_vocabulary)
+        book_codes.append(codes)
+
+    ratings_df = pd.DataFrame({
+        'user_id': np.concatenate(user_ids) if user_ids else np.array([], dtype=np.int32),
+        # ISBN codes come from one vocabulary seeded with books.csv, so catalog books
+        # keep the same dense id in both tables
+        'book_id': pd.Categorical.from_codes(
+            np.concatenate(book_codes) if book_codes else np.array([], dtype=np.int32),
+            categories=isbn_vocabulary
+        ),
+        'rating': np.concatenate(ratings) if ratings else np.array([], dtype=np.int8),
+    })
+    report['rows'] = len(ratings_df)
+    return ratings_df
+
+def _load_users(report):
+    chunks = []
+    for chunk in _read_csv_chunks(DATA_FILES['users'], report):
+        chunk = chunk.rename(columns=USER_COLUMNS)
+        user_id = pd.to_numeric(chunk['user_id'], errors='coerce')
+        valid = user_id.notna()
+        report['malformed_values'] = report.get('malformed_values', 0) + int((~valid).sum())
+        chunk = chunk[valid].copy()
+        chunk['user_id'] = user_id[valid].astype(np.int32)
+        if 'Age' in chunk:
+            chunk['Age'] = pd.to_numeric(chunk['Age'], errors='coerce').astype(np.float32)
+        if 'Location' in chunk:
+            chunk['Location'] = chunk['Location'].astype('category')
+        chunks.append(chunk)
+    users_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=['user_id'])
+    if 'Location' in users_df:
+        users_df['Location'] = users_df['Location'].astype('category')
+    report['rows'] = len(users_df)
+    return users_df
+
+# Bumped whenever parsing or validation rules change, so caches parsed by older rules are re-read
+DATA_CACHE_FORMAT_VERSION = 2
+
+def _cache_stamps():
+    stamps = {name: {k: v for k, v in stamp.items() if k != 'path'}
+              for name, stamp in data_file_stamps().items()}
+    stamps['format_version'] = DATA_CACHE_FORMAT_VERSION
+    return stamps
+
+def _cache_is_fresh(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'stamps.json')) as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stamps == _cache_stamps()
 
-    books_df['content'] = books_df['title'] + ' ' + books_df['authors']
+def _write_cache(cache_dir, books_df, ratings_df, users_df):
+    os.makedirs(cache_dir, exist_ok=True)
+    books_df.to_parquet(os.path.join(cache_dir, 'books.parquet'))
+    ratings_df.to_parquet(os.path.join(cache_dir, 'ratings.parquet'))
+    users_df.to_parquet(os.path.join(cache_dir, 'users.parquet'))
+    with open(os.path.join(cache_dir, 'stamps.json'), 'w') as f:
+        json.dump(_cache_stamps(), f)
 
+def load_and_preprocess_data(cache_dir=None, report=None):
+    """
+    Load and preprocess the book dataset
+    Using books.csv, ratings.csv, and users.csv
+
+    The CSVs are read in chunks into compact dtypes: int32 user ids, int8 ratings
+    and ISBNs interned into a categorical whose codes are dense int32 ids shared by
+    the books and ratings tables. Malformed rows are dropped and counted in
+    `report` (a dict, filled in if given) along with the load time and peak RSS.
+    With cache_dir and pyarrow installed, the parsed tables are also cached as
+    Parquet and reused while the CSVs are unchanged.
+    """
+    report = {} if report is None else report
+    started = time.perf_counter()
+
+    if cache_dir and HAVE_PYARROW and _cache_is_fresh(cache_dir):
+        books_df = pd.read_parquet(os.path.join(cache_dir, 'books.parquet'))
+        ratings_df = pd.read_parquet(os.path.join(cache_dir, 'ratings.parquet'))
+        users_df = pd.read_parquet(os.path.join(cache_dir, 'users.parquet'))
+        report['source'] = 'parquet'
+    else:
+        report['books'], report['ratings'], report['users'] = {}, {}, {}
+        books_df = _load_books(report['books'])
+        isbn_vocabulary = pd.Index(pd.unique(books_df['book_id']), dtype=object)
+        ratings_df = _load_ratings(report['ratings'], isbn_vocabulary)
+        users_df = _load_users(report['users'])
+        report['source'] = 'csv'
+        if cache_dir and HAVE_PYARROW:
+            _write_cache(cache_dir, books_df, ratings_df, users_df)
+
+    report['load_seconds'] = time.perf_counter() - started
+    report['peak_rss_mb'] = _peak_rss_mb()
+    report['memory_mb'] = {
+        name: float(df.memory_usage(deep=True).sum()) / 2**20
+        for name, df in (('books', books_df), ('ratings', ratings_df), ('users', users_df))
+    }
     return books_df, ratings_df, users_df
 
+def append_ratings(ratings_df, rows):
+    """
+    ratings_df with (user_id, book_id, rating) rows appended, keeping its dtypes.
+    A later rating of the same book by the same user replaces the earlier one.
+    """
+    new = pd.DataFrame(rows, columns=['user_id', 'book_id', 'rating'])
+    new = new.astype({'user_id': ratings_df['user_id'].dtype, 'rating': ratings_df['rating'].dtype})
+    book_ids = ratings_df['book_id']
+    if isinstance(book_ids.dtype, pd.CategoricalDtype):
+        unseen = pd.Index(new['book_id'].unique()).difference(book_ids.cat.categories)
+        dtype = pd.CategoricalDtype(book_ids.cat.categories.append(unseen))
+        ratings_df = ratings_df.assign(book_id=book_ids.astype(dtype))
+        new['book_id'] = new['book_id'].astype(dtype)
+    combined = pd.concat([ratings_df, new], ignore_index=True)
+    return combined.drop_duplicates(['user_id', 'book_id'], keep='last').reset_index(drop=True)
+
+def append_books(books_df, new_books_df):
+    """books_df with new_books_df's rows appended, keeping the categorical published_date"""
+    dates = books_df['published_date']
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        unseen = pd.Index(new_books_df['published_date'].unique()).difference(dates.cat.categories)
+        dtype = pd.CategoricalDtype(dates.cat.categories.append(unseen))
+        books_df = books_df.assign(published_date=dates.astype(dtype))
+        new_books_df = new_books_df.assign(published_date=new_books_df['published_date'].astype(dtype))
+    return pd.concat([books_df, new_books_df], ignore_index=True)
+
+def book_content_texts(books_df):
+    """Title and author text fed to the TF-IDF vectorizer, built lazily rather than stored as a column"""
+    return (f"{title} {authors}" for title, authors in zip(books_df['title'], books_df['authors']))
+
+class BookFeatureAnalyzer:
+    """
+    Weighted features of a book for the hashing content vectors, as (name, weight)
+    pairs: title and author words as TfidfVectorizer would split them, the whole
+    author name as one feature, and character n-grams of the title, which also
+    match word variants and misspellings that whole words miss. A title has many
+    more n-grams than words, so they get a small weight to keep them from
+    drowning out the words and the author.
+    """
+
+    token_pattern = re.compile(r"(?u)\b\w\w+\b")
+
+    def __init__(self, ngram_range=(3, 4), author_weight=1.0, ngram_weight=0.1):
+        self.ngram_range = ngram_range
+        self.author_weight = author_weight
+        self.ngram_weight = ngram_weight
+
+    def __call__(self, title, authors):
+        title, authors = str(title).lower(), str(authors).lower()
+        author_words = self.token_pattern.findall(authors)
+        features = [(word, 1.0) for word in self.token_pattern.findall(title) + author_words
+                    if word not in ENGLISH_STOP_WORDS]
+        features.append(('author:' + ' '.join(author_words), self.author_weight))
+        padded = f' {title} '
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            features.extend(('#' + padded[i:i + n], self.ngram_weight) for i in range(len(padded) - n + 1))
+        return features
+
+# -------------------- User Rating Index --------------------
+
+class UserRatingIndex:
+    """
+    CSR-style index of ratings grouped by user, built once at load time.
+
+    Ratings are sorted by user so that user row u owns the slice
+    offsets[u]:offsets[u + 1] of book_codes and ratings. book_codes index into
+    book_ids (every ISBN seen in the ratings); catalog_positions maps a code to its
+    position in the collaborative catalog (item_ids), or -1 when the book is not
+    in the catalog. Each user's highest-rated book is precomputed.
+
+    Ratings added after the build with add_rating live in a small per-user
+    overlay that every lookup merges in, until the index is rebuilt.
+    """
+
+    def __init__(self, ratings_df, item_ids):
+        book_codes, self.book_ids = pd.factorize(ratings_df['book_id'])
+        user_codes, self.user_ids = pd.factorize(ratings_df['user_id'])
+        # Sort by user, then highest rating first, keeping file order within ties
+        ratings = ratings_df['rating'].to_numpy()
+        order = np.lexsort((np.arange(len(ratings)), -ratings, user_codes))
+
+        self.book_codes = book_codes[order].astype(np.int32)
+        self.ratings = ratings[order].astype(np.float32)
+        counts = np.bincount(user_codes, minlength=len(self.user_ids))
+        self.offsets = np.zeros(len(self.user_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.user_rows = {user_id: row for row, user_id in enumerate(self.user_ids)}
+
+        self.item_index = pd.Index(item_ids)
+        self.catalog_positions = self.item_index.get_indexer(self.book_ids).astype(np.int32)
+        self.n_items = len(item_ids)
+        # The slice is sorted by rating, so each user's first entry is their top-rated book
+        self.top_rated_codes = self.book_codes[self.offsets[:-1]]
+        self.updates = {}
+        self.revisions = {}
+
+    def add_rating(self, user_id, book_id, rating):
+        user_updates = dict(self.updates.get(user_id, {}))
+        user_updates[book_id] = rating
+        self.updates[user_id] = user_updates
+        self.revisions[user_id] = self.revisions.get(user_id, 0) + 1
+
+    def revision(self, user_id):
+        """Number of ratings added for the user since the build, for cache keys"""
+        return self.revisions.get(user_id, 0)
+
+    def __contains__(self, user_id):
+        return user_id in self.user_rows or user_id in self.updates
+
+    def _slice(self, user_id):
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return slice(0, 0)
+        return slice(self.offsets[row], self.offsets[row + 1])
+
+    def history(self, user_id):
+        """(book_ids, ratings) rated by the user, highest rating first"""
+        user_slice = self._slice(user_id)
+        book_ids = np.asarray(self.book_ids[self.book_codes[user_slice]], dtype=object)
+        ratings = self.ratings[user_slice]
+        user_updates = self.updates.get(user_id)
+        if user_updates:
+            merged = dict(zip(book_ids, ratings))
+            merged.update(user_updates)
+            book_ids = np.array(list(merged), dtype=object)
+            ratings = np.array(list(merged.values()), dtype=np.float32)
+            order = np.argsort(-ratings, kind='stable')
+            book_ids, ratings = book_ids[order], ratings[order]
+        return book_ids, ratings
+
+    def rating(self, user_id, book_id):
+        """The user's current rating of book_id, or None"""
+        book_ids, ratings = self.history(user_id)
+        match = np.flatnonzero(book_ids == book_id)
+        return float(ratings[match[0]]) if len(match) else None
+
+    def catalog_history(self, user_id):
+        """(collaborative catalog positions, ratings) of the user's ratings of catalog books"""
+        book_ids, ratings = self.history(user_id)
+        positions = self.item_index.get_indexer(book_ids)
+        return positions[positions >= 0], ratings[positions >= 0]
+
+    def rated_books(self, user_id):
+        rated = set(self.book_ids[self.book_codes[self._slice(user_id)]])
+        return rated | set(self.updates.get(user_id, ()))
+
+    def rated_mask(self, user_id):
+        """Boolean mask over the collaborative catalog of the books this user rated"""
+        mask = np.zeros(self.n_items, dtype=bool)
+        positions = self.catalog_positions[self.book_codes[self._slice(user_id)]]
+        mask[positions[positions >= 0]] = True
+        user_updates = self.updates.get(user_id)
+        if user_updates:
+            positions = self.item_index.get_indexer(list(user_updates))
+            mask[positions[positions >= 0]] = True
+        return mask
+
+    def top_rated_book(self, user_id):
+        if user_id in self.updates:
+            return self.history(user_id)[0][0]
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return None
+        return self.book_ids[self.top_rated_codes[row]]
+
+def top_n_positions(scores, top_n, exclude=None):
+    """
+    Positions of the top_n highest scores, best first.
+
+    Uses argpartition to find the cut-off score and only sorts the candidates at or
+    above it. Ties are broken by position, which matches a stable sort of the full array.
+    """
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+        n_available = len(scores) - int(exclude.sum())
+    else:
+        n_available = len(scores)
+    top_n = min(top_n, n_available)
+    if top_n <= 0:
+        return np.array([], dtype=np.intp)
+    threshold = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+    candidates = np.flatnonzero(scores >= threshold)
+    order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order][:top_n]
+
+def sparse_rows_top_n(sims, idxs, top_n):
+    """
+    Top-n (positions, scores) for each row of a sparse similarity matrix, best first,
+    skipping the seed book itself. Rows with fewer than top_n overlapping books are
+    padded with zero-similarity books like the dense path.
+    """
+    n_books = sims.shape[1]
+    results = []
+    for row, idx in enumerate(idxs):
+        start, stop = sims.indptr[row], sims.indptr[row + 1]
+        positions = sims.indices[start:stop]
+        scores = sims.data[start:stop]
+        keep = (positions != idx) & (scores > 0)
+        positions, scores = positions[keep], scores[keep]
+        order = top_n_positions(scores, top_n)
+        positions, scores = positions[order], scores[order]
+        if len(positions) < top_n:
+            taken = np.zeros(n_books, dtype=bool)
+            taken[positions] = True
+            taken[idx] = True
+            padding = np.flatnonzero(~taken)[:top_n - len(positions)]
+            positions = np.concatenate([positions, padding])
+            scores = np.concatenate([scores, np.zeros(len(padding), dtype=scores.dtype)])
+        results.append((positions, scores))
+    return results
+
+# Similarity-index workers keep the content matrix in a module global so it is
+# sent to each worker process once rather than with every chunk.
+_similarity_matrix = None
+_similarity_k = None
+
+def _init_similarity_worker(matrix, k):
+    global _similarity_matrix, _similarity_k
+    _similarity_matrix = matrix
+    _similarity_k = k
+
+def _similarity_index_chunk(bounds):
+    start, stop = bounds
+    sims = (_similarity_matrix[start:stop] @ _similarity_matrix.T).tocsr()
+    top = sparse_rows_top_n(sims, range(start, stop), _similarity_k)
+    neighbor_ids = np.array([positions for positions, _ in top], dtype=np.int32)
+    neighbor_scores = np.array([scores for _, scores in top], dtype=np.float32)
+    return start, neighbor_ids, neighbor_scores
+
 # -------------------- Content-Based Filtering --------------------
 
+# Content vector modes: TF-IDF over a fitted 5000-word vocabulary, or features hashed
+# into a fixed number of columns, which needs no vocabulary so new books can be added
+CONTENT_VECTOR_MODES = ('tfidf', 'hashing')
+
 class ContentBasedRecommender:
-    def __init__(self):
-        self.tfidf_vectorizer = TfidfVectorizer(
-            stop_words='english',
-            max_features=5000
-        )
+    def __init__(self, vectors='tfidf', n_features=2**18, dtype=np.float32):
+        if vectors not in CONTENT_VECTOR_MODES:
+            raise ValueError(f"Unknown content vectors {vectors!r}, expected one of {CONTENT_VECTOR_MODES}")
+        self.vectors = vectors
+        self.tfidf_vectorizer = None
+        self.feature_analyzer = None
+        self.hashing_vectorizer = None
+        self.idf_transformer = None
+        if vectors == 'hashing':
+            self.feature_analyzer = BookFeatureAnalyzer()
+            self.hashing_vectorizer = FeatureHasher(
+                n_features=n_features, input_type='pair', alternate_sign=False, dtype=dtype
+            )
+            # IDF weights are learned once at fit time and reused for books added later
+            self.idf_transformer = TfidfTransformer()
+        else:
+            self.tfidf_vectorizer = TfidfVectorizer(
+                stop_words='english',
+                max_features=5000,
+                dtype=dtype
+            )
         self.book_content_matrix = None
         self.books_df = None
         self.book_indices = None
+        # Optional precomputed top-K neighbours, see build_similarity_index
+        self.neighbor_ids = None
+        self.neighbor_scores = None
 
     def fit(self, books_df):
         self.books_df = books_df
-        self.book_content_matrix = self.tfidf_vectorizer.fit_transform(books_df['content'])
+        if self.vectors == 'hashing':
+            self.book_content_matrix = self.idf_transformer.fit_transform(self._hashed_features(books_df))
+        else:
+            self.book_content_matrix = self.tfidf_vectorizer.fit_transform(book_content_texts(books_df))
         self.book_indices = pd.Series(books_df.index, index=books_df['book_id']).drop_duplicates()
+        self.neighbor_ids = None
+        self.neighbor_scores = None
 
-    def recommend(self, book_id, top_n=10):
+    def word_analyzer(self):
+        """Word tokenizer matching the content vectors, for BookSearchIndex"""
+        if self.tfidf_vectorizer is not None:
+            return self.tfidf_vectorizer.build_analyzer()
+        return TfidfVectorizer(stop_words='english').build_analyzer()
+
+    def _hashed_features(self, books_df):
+        return self.hashing_vectorizer.transform(
+            self.feature_analyzer(title, authors) for title, authors in zip(books_df['title'], books_df['authors'])
+        )
+
+    def vectorize(self, books_df):
+        """Content vectors of books using what fit learned, without refitting"""
+        if self.vectors == 'hashing':
+            return self.idf_transformer.transform(self._hashed_features(books_df))
+        return self.tfidf_vectorizer.transform(book_content_texts(books_df))
+
+    def add_books(self, new_books_df):
+        """
+        Append books to the catalog without refitting. They are vectorized with the
+        fitted features (in tfidf mode words outside the vocabulary are dropped;
+        hashing mode has no vocabulary) and, if the similarity index is built, get
+        their own neighbour lists and enter existing books' lists where they rank.
+
+        HybridRecommender.add_books calls this and extends the rest of the hybrid.
+        """
+        new_books_df = new_books_df.reset_index(drop=True)
+        start = self.book_content_matrix.shape[0]
+        new_rows = self.vectorize(new_books_df).astype(self.book_content_matrix.dtype)
+        self.book_content_matrix = sparse.vstack([self.book_content_matrix, new_rows], format='csr')
+        self.books_df = append_books(self.books_df, new_books_df)
+        new_indices = pd.Series(np.arange(start, start + len(new_books_df)), index=new_books_df['book_id'])
+        self.book_indices = pd.concat([self.book_indices, new_indices[~new_indices.index.isin(self.book_indices.index)]])
+        if self.neighbor_ids is not None:
+            self._add_to_similarity_index(start)
+
+    def _add_to_similarity_index(self, start):
+        k = self.neighbor_ids.shape[1]
+        n_books = self.book_content_matrix.shape[0]
+        sims = (self.book_content_matrix[start:] @ self.book_content_matrix.T).tocsr()
+        top = sparse_rows_top_n(sims, range(start, n_books), k)
+        new_ids = np.array([positions for positions, _ in top], dtype=np.int32).reshape(-1, k)
+        new_scores = np.array([scores for _, scores in top], dtype=np.float32).reshape(-1, k)
+
+        # Existing books whose k-th neighbour is less similar than one of the new books.
+        # The index may be memory-mapped read-only, so work on copies.
+        neighbor_ids = np.array(self.neighbor_ids)
+        neighbor_scores = np.array(self.neighbor_scores)
+        reverse = sims[:, :start].T.tocsr()
+        for row in np.flatnonzero(np.diff(reverse.indptr)):
+            lo, hi = reverse.indptr[row], reverse.indptr[row + 1]
+            better = reverse.data[lo:hi] > neighbor_scores[row, -1]
+            if not better.any():
+                continue
+            positions = np.concatenate([neighbor_ids[row], reverse.indices[lo:hi][better] + start])
+            scores = np.concatenate([neighbor_scores[row], reverse.data[lo:hi][better]])
+            order = top_n_positions(scores, k)
+            neighbor_ids[row], neighbor_scores[row] = positions[order], scores[order]
+        self.neighbor_ids = np.vstack([neighbor_ids, new_ids])
+        self.neighbor_scores = np.vstack([neighbor_scores, new_scores])
+
+    def build_similarity_index(self, k=50, chunk_size=1024, n_jobs=None):
+        """
+        Precompute every book's top-k neighbours (int32 row positions and float32 scores).
+
+        Rows are processed in chunks of sparse matrix products spread over a process
+        pool. Once built, similar_positions answers top_n <= k with an O(k) lookup.
+        """
+        n_books = self.book_content_matrix.shape[0]
+        k = min(k, n_books - 1)
+        bounds = [(start, min(start + chunk_size, n_books)) for start in range(0, n_books, chunk_size)]
+        neighbor_ids = np.empty((n_books, k), dtype=np.int32)
+        neighbor_scores = np.empty((n_books, k), dtype=np.float32)
+        n_jobs = n_jobs or os.cpu_count() or 1
+        if n_jobs == 1 or len(bounds) == 1:
+            _init_similarity_worker(self.book_content_matrix, k)
+            for start, ids, scores in map(_similarity_index_chunk, bounds):
+                neighbor_ids[start:start + len(ids)] = ids
+                neighbor_scores[start:start + len(ids)] = scores
+            _init_similarity_worker(None, None)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_similarity_worker,
+                                     initargs=(self.book_content_matrix, k)) as executor:
+                for start, ids, scores in executor.map(_similarity_index_chunk, bounds):
+                    neighbor_ids[start:start + len(ids)] = ids
+                    neighbor_scores[start:start + len(ids)] = scores
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+
+    def similar_positions(self, book_id, top_n=10):
         idx = self.book_indices[book_id]
+        if self.neighbor_ids is not None and top_n <= self.neighbor_ids.shape[1]:
+            METRICS.increment('content_index_hits_total')
+            return self.neighbor_ids[idx, :top_n]
+        METRICS.increment('content_index_misses_total')
         sim_scores = cosine_similarity(
             self.book_content_matrix[idx].reshape(1, -1),
             self.book_content_matrix
         ).flatten()
         sim_scores_indices = sim_scores.argsort()[::-1]
-        sim_scores_indices = sim_scores_indices[sim_scores_indices != idx][:top_n]
-        return self.books_df.iloc[sim_scores_indices]
+        return sim_scores_indices[sim_scores_indices != idx][:top_n]
+
+    def similar_to_vector(self, vector, top_n=10, exclude_row=None):
+        """Row positions of the top_n books most similar to a content vector (a 1 x n_features row)"""
+        # Rows are L2-normalised, so the product is the cosine similarity
+        sims = (self.book_content_matrix @ vector.T).toarray().ravel()
+        exclude = None
+        if exclude_row is not None:
+            exclude = np.zeros(len(sims), dtype=bool)
+            exclude[exclude_row] = True
+        return top_n_positions(sims, top_n, exclude=exclude)
+
+    def recommend(self, book_id, top_n=10):
+        return self.books_df.iloc[self.similar_positions(book_id, top_n=top_n)]
 
 # -------------------- Collaborative Filtering --------------------
 
+# Collaborative trainers: Surprise's per-rating SGD, or blocked ALS over a sparse matrix
+COLLABORATIVE_TRAINERS = ('svd', 'als')
+
 class CollaborativeRecommender:
-    def __init__(self):
-        self.model = SVD(n_factors=100, n_epochs=20, random_state=42)
-        self.reader = Reader(rating_scale=(1, 5))
+    def __init__(self, trainer='svd', implicit_zeros=False, n_jobs=None):
+        if trainer not in COLLABORATIVE_TRAINERS:
+            raise ValueError(f"Unknown trainer {trainer!r}, expected one of {COLLABORATIVE_TRAINERS}")
+        self.trainer = trainer
+        if trainer == 'als':
+            self.model = ALSFactorizer(n_factors=100, implicit_zeros=implicit_zeros, n_jobs=n_jobs)
+        else:
+            self.model = SVD(n_factors=100, n_epochs=20, random_state=42)
+        self.reader = Reader(rating_scale=RATING_RANGE)
         self.data = None
         self.book_mapping = None
         self.books_df = None
+        # Scoring arrays pulled out of the trained SVD model (see _build_scoring_arrays)
+        self.item_ids = None
+        self.item_positions = None
+        self.item_factors = None
+        self.item_bias = None
+        self.user_factors = None
+        self.user_bias = None
+        self.user_inner_ids = None
+        self.global_mean = 0.0
+        self.item_norms = None
+        self.testset = None
+        # (bias, factors) of users re-fitted online by fold_in_user; they take
+        # precedence over user_factors/user_bias until the next full fit
+        self.folded_users = {}
+        # Optional approximate nearest-neighbour index over item_factors, see build_ann_index
+        self.ann_index = None
+
+    def fit(self, ratings_df, books_df, test_size=None, warm_start=None):
+        """
+        Train on every rating, or with test_size hold that fraction out in self.testset
+        for evaluation instead of training on it.
 
-    def fit(self, ratings_df, books_df):
+        warm_start is an ALS recommender fitted earlier over books_df: this one starts
+        from its item factors and biases. Surprise's SVD always initialises its factors
+        randomly in fit, so the SVD trainer ignores warm_start and trains from scratch.
+        """
         self.books_df = books_df
         self.book_mapping = {idx: book_id for idx, book_id in enumerate(books_df['book_id'].unique())}
+        if self.trainer == 'als':
+            self._fit_als(ratings_df, test_size, warm_start)
+            return
         self.data = Dataset.load_from_df(
             ratings_df[['user_id', 'book_id', 'rating']],
             self.reader
         )
-        trainset, _ = train_test_split(self.data, test_size=0.2)
+        if test_size:
+            trainset, self.testset = train_test_split(self.data, test_size=test_size, random_state=42)
+        else:
+            trainset, self.testset = self.data.build_full_trainset(), None
         self.model.fit(trainset)
+        self._build_scoring_arrays(trainset)
+
+    def evaluate(self):
+        """RMSE on the ratings fit(test_size=...) held out in self.testset"""
+        if not self.testset:
+            raise ValueError("Nothing was held out; fit with test_size to evaluate")
+        if self.trainer == 'svd':
+            return accuracy.rmse(self.model.test(self.testset), verbose=False)
+        user_ids, book_ids, ratings = zip(*self.testset)
+        predictions = self.predict_ratings(np.asarray(user_ids), np.asarray(book_ids, dtype=object))
+        return float(np.sqrt(np.mean((predictions - np.asarray(ratings, dtype=np.float64)) ** 2)))
+
+    def _fit_als(self, ratings_df, test_size, warm_start=None):
+        if test_size:
+            order = np.random.default_rng(42).permutation(len(ratings_df))
+            n_test = int(round(len(ratings_df) * test_size))
+            test_rows = ratings_df.iloc[order[:n_test]]
+            self.testset = list(zip(test_rows['user_id'], test_rows['book_id'], test_rows['rating']))
+            ratings_df = ratings_df.iloc[order[n_test:]]
+        else:
+            self.testset = None
+        self.item_ids = np.asarray(self.books_df['book_id'].unique())
+        # The rating index already holds the ratings grouped by user, i.e. in CSR layout
+        index = UserRatingIndex(ratings_df, self.item_ids)
+        matrix = sparse.csr_matrix((index.ratings, index.book_codes, index.offsets),
+                                   shape=(len(index.user_ids), len(index.book_ids)))
+        in_catalog = index.catalog_positions >= 0
+        if (warm_start is not None and warm_start.trainer == 'als'
+                and np.array_equal(warm_start.item_ids, self.item_ids)
+                and warm_start.item_factors.shape[1] == self.model.n_factors):
+            # Columns outside the catalog have no earlier factors and start at zero
+            initial_factors = np.zeros((len(index.book_ids), self.model.n_factors))
+            initial_bias = np.zeros(len(index.book_ids))
+            initial_factors[in_catalog] = warm_start.item_factors[index.catalog_positions[in_catalog]]
+            initial_bias[in_catalog] = warm_start.item_bias[index.catalog_positions[in_catalog]]
+            self.model.fit(matrix, item_factors=initial_factors, item_bias=initial_bias)
+        else:
+            self.model.fit(matrix)
+
+        self.item_positions = {book_id: pos for pos, book_id in enumerate(self.item_ids)}
+        self.item_factors = np.zeros((len(self.item_ids), self.model.n_factors))
+        self.item_bias = np.zeros(len(self.item_ids))
+        self.item_factors[index.catalog_positions[in_catalog]] = self.model.item_factors[in_catalog]
+        self.item_bias[index.catalog_positions[in_catalog]] = self.model.item_bias[in_catalog]
+        self.user_factors = self.model.user_factors
+        self.user_bias = self.model.user_bias
+        self.user_inner_ids = dict(index.user_rows)
+        self.global_mean = self.model.global_mean
+        self.item_norms = None
+        self.ann_index = None
+        self.folded_users = {}
+
+    def _build_scoring_arrays(self, trainset):
+        """
+        Copy the SVD factors into NumPy arrays aligned with the book catalog,
+        so a user can be scored against every book with one matrix-vector product.
+        Books unknown to the trainset get zero factors and zero bias, which is
+        exactly what SVD.estimate does for them.
+        """
+        self.item_ids = np.asarray(self.books_df['book_id'].unique())
+        self.item_positions = {book_id: pos for pos, book_id in enumerate(self.item_ids)}
+        n_factors = self.model.qi.shape[1]
+        self.item_factors = np.zeros((len(self.item_ids), n_factors))
+        self.item_bias = np.zeros(len(self.item_ids))
+        for pos, book_id in enumerate(self.item_ids):
+            inner_id = trainset._raw2inner_id_items.get(book_id)
+            if inner_id is not None:
+                self.item_factors[pos] = self.model.qi[inner_id]
+                self.item_bias[pos] = self.model.bi[inner_id]
+        self.user_factors = np.asarray(self.model.pu)
+        self.user_bias = np.asarray(self.model.bu)
+        self.user_inner_ids = dict(trainset._raw2inner_id_users)
+        self.global_mean = trainset.global_mean
+        self.item_norms = None
+        self.ann_index = None
+        self.folded_users = {}
+
+    def add_items(self, books_df):
+        """
+        Extend the catalog arrays to the books of books_df that are not in it yet.
+        Nobody has rated them, so they get zero factors and bias, as unrated books do
+        at fit time, until a refit learns theirs. The ANN index leaves zero vectors
+        out, so it stays valid.
+        """
+        self.books_df = books_df
+        new_ids = pd.Index(books_df['book_id'].unique()).difference(pd.Index(self.item_ids), sort=False)
+        if not len(new_ids):
+            return
+        start = len(self.item_ids)
+        self.item_ids = np.concatenate([self.item_ids, np.asarray(new_ids, dtype=self.item_ids.dtype)])
+        self.item_positions = {**self.item_positions,
+                               **{book_id: start + i for i, book_id in enumerate(new_ids)}}
+        self.item_factors = np.vstack([self.item_factors,
+                                       np.zeros((len(new_ids), self.item_factors.shape[1]), self.item_factors.dtype)])
+        self.item_bias = np.concatenate([self.item_bias, np.zeros(len(new_ids), self.item_bias.dtype)])
+        self.item_norms = None
+
+    def build_ann_index(self, n_lists=None, n_probe=8):
+        """Index the item factors for fast approximate similar-item queries"""
+        self.ann_index = IVFIndex(n_lists=n_lists, n_probe=n_probe).fit(self.item_factors)
+
+    def user_params(self, user_id):
+        """(bias, factors) of a user, or None for users the model has never seen"""
+        folded = self.folded_users.get(user_id)
+        if folded is not None:
+            return folded
+        inner_uid = self.user_inner_ids.get(user_id)
+        if inner_uid is None:
+            return None
+        return self.user_bias[inner_uid], self.user_factors[inner_uid]
+
+    def fold_in_user(self, user_id, positions, ratings, reg=0.02):
+        """
+        Re-fit one user's bias and factors on their ratings (catalog positions and
+        values) against the frozen item factors. Solves the regularised least
+        squares that Surprise's SVD descends on, sum of (err^2 + reg * (bias^2 + |factors|^2))
+        over the ratings, in closed form: one small linear solve instead of SGD epochs.
+        """
+        design = np.empty((len(positions), self.item_factors.shape[1] + 1))
+        design[:, 0] = 1.0
+        design[:, 1:] = self.item_factors[positions]
+        targets = np.asarray(ratings, dtype=np.float64) - self.global_mean - self.item_bias[positions]
+        gram = design.T @ design
+        gram[np.diag_indices_from(gram)] += reg * max(len(positions), 1)
+        solution = np.linalg.solve(gram, design.T @ targets)
+        bias, factors = float(solution[0]), solution[1:]
+        # Replace the entry rather than mutating it so concurrent readers see old or new, never half
+        self.folded_users[user_id] = (bias, factors)
+
+    def score_user(self, user_id):
+        """Predicted rating of every catalog book for one user, same as model.predict(...).est"""
+        scores = self.global_mean + self.item_bias
+        params = self.user_params(user_id)
+        if params is not None:
+            scores = scores + params[0] + self.item_factors @ params[1]
+        lower, upper = self.reader.rating_scale
+        return np.clip(scores, lower, upper)
+
+    def rated_mask(self, rated_books):
+        """rated_books is either an iterable of book ids or an already-built boolean catalog mask"""
+        if isinstance(rated_books, np.ndarray) and rated_books.dtype == bool:
+            return rated_books
+        mask = np.zeros(len(self.item_ids), dtype=bool)
+        positions = [self.item_positions[book_id] for book_id in rated_books if book_id in self.item_positions]
+        mask[positions] = True
+        return mask
+
+    def score_users(self, user_ids, positions=None):
+        """
+        Predicted ratings for several users at once, one row per user: row i equals
+        score_items(user_ids[i], positions), or score_user(user_ids[i]) without positions
+        """
+        item_factors, item_bias = self.item_factors, self.item_bias
+        if positions is not None:
+            item_factors, item_bias = item_factors[positions], item_bias[positions]
+        user_factors = np.zeros((len(user_ids), item_factors.shape[1]))
+        user_bias = np.zeros(len(user_ids))
+        for row, user_id in enumerate(user_ids):
+            params = self.user_params(user_id)
+            if params is not None:
+                user_bias[row], user_factors[row] = params
+        scores = (self.global_mean + item_bias) + user_bias[:, None]
+        scores += user_factors @ item_factors.T
+        lower, upper = self.reader.rating_scale
+        return np.clip(scores, lower, upper, out=scores)
+
+    def score_items(self, user_id, positions):
+        """Predicted ratings of the books at the given catalog positions only"""
+        scores = self.global_mean + self.item_bias[positions]
+        params = self.user_params(user_id)
+        if params is not None:
+            scores = scores + params[0] + self.item_factors[positions] @ params[1]
+        lower, upper = self.reader.rating_scale
+        return np.clip(scores, lower, upper)
+
+    def predict_ratings(self, user_ids, book_ids):
+        """Predicted ratings for (user, book) pairs; unknown users and books get the baseline terms only"""
+        positions = pd.Index(self.item_ids).get_indexer(book_ids)
+        rows = pd.Series(user_ids).map(self.user_inner_ids).to_numpy()
+        scores = np.full(len(positions), self.global_mean)
+        known_items = positions >= 0
+        known_users = ~pd.isna(rows)
+        scores[known_items] += self.item_bias[positions[known_items]]
+        user_rows = rows[known_users].astype(np.int64)
+        scores[known_users] += self.user_bias[user_rows]
+        both = known_items & known_users
+        scores[both] += np.einsum('ij,ij->i', self.user_factors[rows[both].astype(np.int64)],
+                                  self.item_factors[positions[both]])
+        lower, upper = self.reader.rating_scale
+        return np.clip(scores, lower, upper)
+
+    def similar_item_positions(self, position, top_n=10):
+        """Catalog positions of the books nearest to `position` by cosine of their latent factors"""
+        return self._similar_items(position, top_n)[0]
+
+    def _similar_items(self, position, top_n):
+        return self.similar_to_factors(self.item_factors[position], top_n, exclude=position)
+
+    def similar_to_factors(self, query, top_n=10, exclude=None):
+        """
+        (catalog positions, cosines) of the books nearest to a latent-factor vector,
+        which need not belong to a catalog book; `exclude` is a position to leave out
+        """
+        if self.ann_index is not None:
+            return self.ann_index.search(query, k=top_n, exclude=exclude)
+        if self.item_norms is None or len(self.item_norms) != len(self.item_factors):
+            self.item_norms = np.linalg.norm(self.item_factors, axis=1)
+        query = np.asarray(query, dtype=np.float64)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return np.array([], dtype=np.intp), np.array([])
+        sims = (self.item_factors @ query) / (np.maximum(self.item_norms, 1e-12) * query_norm)
+        excluded = None
+        if exclude is not None:
+            excluded = np.zeros(len(sims), dtype=bool)
+            excluded[exclude] = True
+        top = top_n_positions(sims, top_n, exclude=excluded)
+        return top, sims[top]
+
+    def similar_items(self, book_id, k=10):
+        """Books whose readers rated like readers of `book_id`, best first, with a 'score' column"""
+        positions, scores = self._similar_items(self.item_positions[book_id], k)
+        similar_ids = pd.Index(self.item_ids[positions])
+        books = self.books_df.drop_duplicates('book_id')
+        books = books[books['book_id'].isin(similar_ids)].copy()
+        books['score'] = scores[similar_ids.get_indexer(books['book_id'])]
+        return books.sort_values('score', ascending=False, kind='stable')
+
+    def top_positions_for_user(self, user_id, rated_books, top_n=10):
+        return top_n_positions(self.score_user(user_id), top_n, exclude=self.rated_mask(rated_books))
 
     def recommend_for_user(self, user_id, rated_books, top_n=10):
-        all_books = self.books_df['book_id'].unique()
-        books_to_recommend = [book_id for book_id in all_books if book_id not in rated_books]
-        predictions = [
-            (book_id, self.model.predict(user_id, book_id).est)
-            for book_id in books_to_recommend
-        ]
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        top_recommendations = [book_id for book_id, _ in predictions[:top_n]]
+        top_recommendations = self.item_ids[self.top_positions_for_user(user_id, rated_books, top_n)]
         return self.books_df[self.books_df['book_id'].isin(top_recommendations)]
 
 # -------------------- Hybrid Recommender --------------------
 
 class HybridRecommender:
-    def __init__(self, content_weight=0.3, collaborative_weight=0.7):
-        self.content_recommender = ContentBasedRecommender()
-        self.collaborative_recommender = CollaborativeRecommender()
+    def __init__(self, content_weight=0.3, collaborative_weight=0.7,
+                 candidate_budget=300, content_candidates=100, collaborative_candidates=100,
+                 trainer='svd', implicit_zeros=False, content_vectors='tfidf'):
+        self.content_recommender = ContentBasedRecommender(vectors=content_vectors)
+        self.collaborative_recommender = CollaborativeRecommender(trainer=trainer, implicit_zeros=implicit_zeros)
         self.content_weight = content_weight
         self.collaborative_weight = collaborative_weight
+        # Candidate generation caps: per-request re-ranking work is bounded by candidate_budget
+        self.candidate_budget = candidate_budget
+        self.content_candidates = content_candidates
+        self.collaborative_candidates = collaborative_candidates
         self.books_df = None
+        self.row_item_positions = None
+        self.item_rows = None
+        self.popular_rows = None
 
     def fit(self, books_df, ratings_df):
         self.books_df = books_df
         self.content_recommender.fit(books_df)
         self.collaborative_recommender.fit(ratings_df, books_df)
+        self.prepare_candidates(ratings_df)
+
+    def add_books(self, new_books_df, ratings_df):
+        """
+        Append books to the catalog without refitting: content vectors and neighbours
+        as ContentBasedRecommender.add_books gives them, zero collaborative factors,
+        and the candidate tables rebuilt over the longer books_df. Existing books keep
+        their rows. This replaces attributes rather than mutating them, but one at a
+        time, so extend a copy of a recommender that is serving, never the live one.
+        """
+        self.content_recommender.add_books(new_books_df)
+        self.books_df = self.content_recommender.books_df
+        self.collaborative_recommender.add_items(self.books_df)
+        self.prepare_candidates(ratings_df)
+
+    def refit_collaborative(self, ratings_df, ann_index=True, trainer='svd', implicit_zeros=False):
+        """
+        A copy of this recommender with only the collaborative model retrained on
+        ratings_df, warm-started from the current one (see CollaborativeRecommender.fit).
+        The content model and its similarity index are shared, not rebuilt.
+        """
+        hybrid = copy.copy(self)
+        hybrid.collaborative_recommender = CollaborativeRecommender(trainer=trainer, implicit_zeros=implicit_zeros)
+        hybrid.collaborative_recommender.fit(ratings_df, self.books_df, warm_start=self.collaborative_recommender)
+        if ann_index:
+            hybrid.collaborative_recommender.build_ann_index()
+        hybrid.prepare_candidates(ratings_df)
+        return hybrid
+
+    def prepare_candidates(self, ratings_df):
+        """
+        Build the lookup tables used by candidate generation: books_df row <->
+        collaborative catalog position, and the catalog rows ordered by rating count.
+        """
+        item_index = pd.Index(self.collaborative_recommender.item_ids)
+        self.row_item_positions = item_index.get_indexer(self.books_df['book_id'])
+        # First books_df row of every catalog item (item_ids are in first-seen order)
+        _, self.item_rows = np.unique(self.row_item_positions, return_index=True)
+
+        rated_positions = item_index.get_indexer(ratings_df['book_id'])
+        counts = np.bincount(rated_positions[rated_positions >= 0], minlength=len(item_index))
+        popular_items = np.argsort(-counts, kind='stable')[:self.candidate_budget]
+        self.popular_rows = self.item_rows[popular_items[counts[popular_items] > 0]]
+
+    def generate_candidates(self, book_id):
+        """
+        Cheap first stage: books_df rows from the seed book's content neighbours,
+        its nearest items in latent-factor space and the most-rated books, in that
+        priority, deduplicated and capped at candidate_budget.
+        """
+        seed_row = self.content_recommender.book_indices[book_id]
+        n_content = self.content_candidates
+        if self.content_recommender.neighbor_ids is not None:
+            # Stay on the O(K) index lookup rather than falling back to the exact scan
+            n_content = min(n_content, self.content_recommender.neighbor_ids.shape[1])
+        with METRICS.time_stage('content_candidates'):
+            content_rows = self.content_recommender.similar_positions(book_id, top_n=n_content)
+        with METRICS.time_stage('collaborative_candidates'):
+            collab_rows = self.item_rows[self.collaborative_recommender.similar_item_positions(
+                self.row_item_positions[seed_row], top_n=self.collaborative_candidates
+            )]
+        return self._merge_candidates(content_rows, collab_rows, seed_row)
+
+    def seed_candidates(self, seed_vector, seed_factors, seed_row=None):
+        """
+        generate_candidates for a seed book given by its content vector and item
+        factors, as a catalog shard gets them for a book another shard may own.
+        seed_row is the seed's own row when it is in this catalog.
+        """
+        with METRICS.time_stage('content_candidates'):
+            content_rows = self.content_recommender.similar_to_vector(
+                seed_vector, top_n=self.content_candidates, exclude_row=seed_row
+            )
+        with METRICS.time_stage('collaborative_candidates'):
+            collab_positions, _ = self.collaborative_recommender.similar_to_factors(
+                seed_factors, top_n=self.collaborative_candidates
+            )
+            collab_rows = self.item_rows[collab_positions]
+        return self._merge_candidates(content_rows, collab_rows, seed_row)
+
+    def _merge_candidates(self, content_rows, collab_rows, seed_row=None):
+        candidates = np.concatenate([content_rows, collab_rows, self.popular_rows]).astype(np.intp)
+        _, first_seen = np.unique(candidates, return_index=True)
+        candidates = candidates[np.sort(first_seen)]
+        return candidates[candidates != seed_row][:self.candidate_budget]
+
+    def seed_vector(self, book_id):
+        """Content vector of a catalog book, as a 1 x n_features sparse row"""
+        return self.content_recommender.book_content_matrix[self.content_recommender.book_indices[book_id]]
+
+    def score_candidates(self, user_id, seed_vector, candidate_rows):
+        """Second stage: weighted content similarity + normalised predicted rating for the candidates"""
+        candidate_vectors = self.content_recommender.book_content_matrix[candidate_rows]
+        # Sum each similarity in feature order, as recommend_batch does
+        candidate_vectors.sort_indices()
+        content_scores = (candidate_vectors @ seed_vector.T).toarray().ravel()
+        lower, upper = self.collaborative_recommender.reader.rating_scale
+        predicted = self.collaborative_recommender.score_items(user_id, self.row_item_positions[candidate_rows])
+        collab_scores = (predicted - lower) / (upper - lower)
+        return self.content_weight * content_scores + self.collaborative_weight * collab_scores
 
     def recommend(self, user_id, book_id, rated_books, top_n=10):
-        content_recs = self.content_recommender.recommend(book_id, top_n=top_n*2)
-        collab_recs = self.collaborative_recommender.recommend_for_user(user_id, rated_books, top_n=top_n*2)
-        content_scores = {row['book_id']: self.content_weight * (1 - i/len(content_recs))
-                          for i, (_, row) in enumerate(content_recs.iterrows())}
-        collab_scores = {row['book_id']: self.collaborative_weight * (1 - i/len(collab_recs))
-                         for i, (_, row) in enumerate(collab_recs.iterrows())}
-        all_recommended_books = set(content_scores.keys()) | set(collab_scores.keys())
-        combined_scores = {
-            book_id: content_scores.get(book_id, 0) + collab_scores.get(book_id, 0)
-            for book_id in all_recommended_books
-        }
-        sorted_books = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        recommended_book_ids = [book_id for book_id, _ in sorted_books]
-        return self.books_df[self.books_df['book_id'].isin(recommended_book_ids)]
+        """Top books for a user and seed book, best first, with their hybrid score in a 'score' column"""
+        rows, scores = self.recommend_rows(user_id, book_id, rated_books, top_n=top_n)
+        recommendations = self.books_df.iloc[rows].copy()
+        recommendations['score'] = scores
+        return recommendations
+
+    def recommend_rows(self, user_id, book_id, rated_books, top_n=10):
+        """(books_df rows, hybrid scores) of the top books for a user and seed book, best first"""
+        return self._rerank(user_id, self.seed_vector(book_id), self.generate_candidates(book_id), rated_books,
+                            top_n)
+
+    def recommend_rows_for_seed(self, user_id, seed_vector, seed_factors, rated_books, top_n=10, seed_row=None):
+        """recommend_rows for a seed book given by its vectors, see seed_candidates"""
+        return self._rerank(user_id, seed_vector, self.seed_candidates(seed_vector, seed_factors, seed_row),
+                            rated_books, top_n)
+
+    def _rerank(self, user_id, seed_vector, candidates, rated_books, top_n):
+        rated = self.collaborative_recommender.rated_mask(rated_books)
+        candidates = candidates[~rated[self.row_item_positions[candidates]]]
+        METRICS.increment('candidates_scored_total', len(candidates))
+        with METRICS.time_stage('rerank'):
+            scores = self.score_candidates(user_id, seed_vector, candidates)
+            order = top_n_positions(scores, top_n)
+        return candidates[order], scores[order]
+
+    def cold_start_rows(self, aggregates, rated_books, top_n=10):
+        """
+        Fallback for users with no ratings and no seed book: (books_df rows, smoothed
+        ratings) of the best-rated books in `aggregates` that the user has not rated
+        """
+        rows, scores = aggregates.top('rating')
+        positions = self.row_item_positions[rows]
+        unrated = (positions < 0) | ~rated_books[np.maximum(positions, 0)]
+        return rows[unrated][:top_n], scores[unrated][:top_n]
+
+    def similar_rows(self, book_id, k=10):
+        """(books_df rows, cosine scores) of the books nearest to book_id in the collaborative latent space"""
+        collab = self.collaborative_recommender
+        positions, scores = collab._similar_items(collab.item_positions[book_id], k)
+        return self.item_rows[positions], scores
+
+    def recommend_batch(self, user_ids, book_ids, rated_books_lists, top_ns):
+        """
+        recommend_rows for a chunk of users, as one (books_df rows, hybrid scores) pair
+        per user. Candidates are generated per user, then all of them are scored at
+        once: one score_users product over the chunk's stacked user factors and one
+        sparse product against its stacked seed vectors. Each score is computed as
+        score_candidates computes it, so a batch returns exactly what the same single
+        requests would.
+        """
+        collab, content = self.collaborative_recommender, self.content_recommender
+        candidate_lists = []
+        for book_id, rated_books in zip(book_ids, rated_books_lists):
+            candidates = self.generate_candidates(book_id)
+            rated = collab.rated_mask(rated_books)
+            candidate_lists.append(candidates[~rated[self.row_item_positions[candidates]]])
+        counts = np.array([len(candidates) for candidates in candidate_lists], dtype=np.intp)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        candidates = np.concatenate(candidate_lists).astype(np.intp)
+        owners = np.repeat(np.arange(len(candidate_lists)), counts)
+        METRICS.increment('candidates_scored_total', len(candidates))
+        with METRICS.time_stage('rerank'):
+            seeds = content.book_content_matrix[content.book_indices[list(book_ids)].to_numpy()]
+            seeds.sort_indices()
+            candidate_vectors = content.book_content_matrix[candidates]
+            candidate_vectors.sort_indices()
+            # Each candidate's products with its own user's seed only, summed in feature order
+            products = candidate_vectors.multiply(seeds[owners]).tocsr()
+            content_scores = products @ np.ones(products.shape[1], dtype=products.dtype)
+            positions, columns = np.unique(self.row_item_positions[candidates], return_inverse=True)
+            predicted = collab.score_users(user_ids, positions)[owners, columns]
+            lower, upper = collab.reader.rating_scale
+            collab_scores = (predicted - lower) / (upper - lower)
+            scores = self.content_weight * content_scores + self.collaborative_weight * collab_scores
+        results = []
+        for i, top_n in enumerate(top_ns):
+            user_candidates, user_scores = candidates[offsets[i]:offsets[i + 1]], scores[offsets[i]:offsets[i + 1]]
+            order = top_n_positions(user_scores, top_n)
+            results.append((user_candidates[order], user_scores[order]))
+        return results
+
+def build_hybrid_recommender(books_df, ratings_df, content_index_k=0, ann_index=True,
+                             trainer='svd', implicit_zeros=False, content_vectors='tfidf'):
+    """Fit a HybridRecommender and build the optional serving indexes"""
+    hybrid = HybridRecommender(trainer=trainer, implicit_zeros=implicit_zeros, content_vectors=content_vectors)
+    hybrid.fit(books_df, ratings_df)
+    if content_index_k:
+        hybrid.content_recommender.build_similarity_index(k=content_index_k)
+    if ann_index:
+        hybrid.collaborative_recommender.build_ann_index()
+    return hybrid
+
+# -------------------- Model Artifacts --------------------
+
+# Bump whenever the on-disk layout below changes; older artifacts are refused at load time
+ARTIFACT_FORMAT_VERSION = 2
+
+def data_file_stamps():
+    """Size and modification time of each source CSV, used to detect stale artifacts"""
+    stamps = {}
+    for name, path in DATA_FILES.items():
+        stat = os.stat(path)
+        stamps[name] = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+    return stamps
+
+def save_artifacts(path, books_df, ratings_df, users_df, hybrid):
+    """
+    Write a fitted HybridRecommender and its tables to the directory `path`.
+
+    Numeric arrays go to raw .npy files so load_artifacts can memory-map them;
+    tables, the TF-IDF vectorizer and the id mappings are pickled. The directory is
+    built next to `path` and renamed into place so readers never see a partial write.
+    """
+    content = hybrid.content_recommender
+    collab = hybrid.collaborative_recommender
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    matrix = content.book_content_matrix.tocsr()
+    arrays = {
+        'tfidf_data': matrix.data,
+        'tfidf_indices': matrix.indices,
+        'tfidf_indptr': matrix.indptr,
+        'item_factors': collab.item_factors,
+        'item_bias': collab.item_bias,
+        'user_factors': collab.user_factors,
+        'user_bias': collab.user_bias,
+    }
+    if content.neighbor_ids is not None:
+        arrays['neighbor_ids'] = content.neighbor_ids
+        arrays['neighbor_scores'] = content.neighbor_scores
+    if collab.ann_index is not None:
+        arrays['ann_centroids'] = collab.ann_index.centroids
+        arrays['ann_list_offsets'] = collab.ann_index.list_offsets
+        arrays['ann_list_members'] = collab.ann_index.list_members
+        arrays['ann_list_vectors'] = collab.ann_index.list_vectors
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+
+    with open(os.path.join(tmp_path, 'objects.pkl'), 'wb') as f:
+        pickle.dump({
+            'books_df': books_df,
+            'ratings_df': ratings_df,
+            'users_df': users_df,
+            'tfidf_vectorizer': content.tfidf_vectorizer,
+            'feature_analyzer': content.feature_analyzer,
+            'hashing_vectorizer': content.hashing_vectorizer,
+            'idf_transformer': content.idf_transformer,
+            'item_ids': collab.item_ids,
+            'user_inner_ids': collab.user_inner_ids,
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created_at': time.time(),
+        'data_files': data_file_stamps(),
+        'arrays': sorted(arrays),
+        'tfidf_shape': list(matrix.shape),
+        'global_mean': collab.global_mean,
+        'rating_scale': list(collab.reader.rating_scale),
+        'trainer': collab.trainer,
+        'content_vectors': content.vectors,
+        'content_weight': hybrid.content_weight,
+        'collaborative_weight': hybrid.collaborative_weight,
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+def data_version():
+    """Short hash of the source CSV stamps; identical in every worker serving the same data"""
+    stamps = {name: {k: v for k, v in stamp.items() if k != 'path'} for name, stamp in data_file_stamps().items()}
+    return 'data-' + hashlib.sha1(json.dumps(stamps, sort_keys=True).encode()).hexdigest()[:12]
+
+def stale_data_files(manifest):
+    """Names of the source CSVs that changed since the artifacts were built"""
+    stale = []
+    for name, recorded in manifest['data_files'].items():
+        try:
+            stat = os.stat(DATA_FILES[name])
+        except OSError:
+            stale.append(name)
+            continue
+        if stat.st_size != recorded['size'] or stat.st_mtime > recorded['mtime']:
+            stale.append(name)
+    return stale
+
+def load_artifacts(path, check_stale=True, mmap_mode='r'):
+    """
+    Load artifacts written by save_artifacts without retraining.
+
+    Arrays are memory-mapped read-only by default, so several uvicorn workers
+    loading the same directory share the same pages. Raises RuntimeError if the
+    format version does not match or, with check_stale, if any source CSV changed.
+    """
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != ARTIFACT_FORMAT_VERSION:
+        raise RuntimeError(
+            f"Artifacts in {path} have format version {manifest['format_version']}, "
+            f"expected {ARTIFACT_FORMAT_VERSION}; rebuild them with build-artifacts"
+        )
+    if check_stale:
+        stale = stale_data_files(manifest)
+        if stale:
+            raise RuntimeError(f"Artifacts in {path} are stale, changed since build: {', '.join(stale)}")
+
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+              for name in manifest['arrays']}
+    with open(os.path.join(path, 'objects.pkl'), 'rb') as f:
+        objects = pickle.load(f)
+    books_df = objects['books_df']
+
+    hybrid = HybridRecommender(manifest['content_weight'], manifest['collaborative_weight'])
+    hybrid.books_df = books_df
+
+    content = hybrid.content_recommender
+    content.books_df = books_df
+    content.vectors = manifest['content_vectors']
+    content.tfidf_vectorizer = objects['tfidf_vectorizer']
+    content.feature_analyzer = objects['feature_analyzer']
+    content.hashing_vectorizer = objects['hashing_vectorizer']
+    content.idf_transformer = objects['idf_transformer']
+    content.book_content_matrix = sparse.csr_matrix(
+        (arrays['tfidf_data'], arrays['tfidf_indices'], arrays['tfidf_indptr']),
+        shape=tuple(manifest['tfidf_shape']), copy=False
+    )
+    content.book_indices = pd.Series(books_df.index, index=books_df['book_id']).drop_duplicates()
+    content.neighbor_ids = arrays.get('neighbor_ids')
+    content.neighbor_scores = arrays.get('neighbor_scores')
+
+    collab = hybrid.collaborative_recommender
+    collab.trainer = manifest['trainer']
+    collab.books_df = books_df
+    collab.reader = Reader(rating_scale=tuple(manifest['rating_scale']))
+    collab.item_ids = objects['item_ids']
+    collab.item_positions = {book_id: pos for pos, book_id in enumerate(collab.item_ids)}
+    collab.book_mapping = dict(enumerate(collab.item_ids))
+    collab.item_factors = arrays['item_factors']
+    collab.item_bias = arrays['item_bias']
+    collab.user_factors = arrays['user_factors']
+    collab.user_bias = arrays['user_bias']
+    collab.user_inner_ids = objects['user_inner_ids']
+    collab.global_mean = manifest['global_mean']
+    if 'ann_centroids' in arrays:
+        collab.ann_index = IVFIndex(n_lists=len(arrays['ann_centroids']))
+        collab.ann_index.centroids = arrays['ann_centroids']
+        collab.ann_index.list_offsets = arrays['ann_list_offsets']
+        collab.ann_index.list_members = arrays['ann_list_members']
+        collab.ann_index.list_vectors = arrays['ann_list_vectors']
+        collab.ann_index.n_vectors = len(collab.item_factors)
+
+    hybrid.prepare_candidates(objects['ratings_df'])
+    return books_df, objects['ratings_df'], objects['users_df'], hybrid
+
+def build_artifacts(path, content_index_k=0, ann_index=True, trainer='svd', implicit_zeros=False,
+                    content_vectors='tfidf'):
+    books_df, ratings_df, users_df = load_and_preprocess_data()
+    hybrid = build_hybrid_recommender(books_df, ratings_df, content_index_k=content_index_k, ann_index=ann_index,
+                                      trainer=trainer, implicit_zeros=implicit_zeros,
+                                      content_vectors=content_vectors)
+    save_artifacts(path, books_df, ratings_df, users_df, hybrid)
+
+# -------------------- Catalog Sharding --------------------
+
+def shard_books(books_df, rows):
+    """The books_df rows of a shard, renumbered from 0, with their full-catalog positions in catalog_row"""
+    shard_df = books_df.iloc[rows].reset_index(drop=True)
+    shard_df['catalog_row'] = rows
+    return shard_df
+
+def catalog_rows(books_df, rows):
+    """Full-catalog positions of books_df rows; the rows themselves unless books_df is a shard's"""
+    if 'catalog_row' in books_df:
+        return books_df['catalog_row'].to_numpy()[rows]
+    return np.asarray(rows)
+
+def partition_catalog(books_df, ratings_df, hybrid, index, count):
+    """
+    Cut a loaded catalog down to shard `index` of `count`: the books shard_of
+    assigns to it, their content rows, item factors and biases, with the ANN
+    index rebuilt over them. Memory-mapped arrays are copied for the shard's rows
+    only. The user side (factors, ratings) stays whole, as every shard scores
+    every user. Returns (shard books_df, rows of the full books_df it holds).
+    """
+    rows = shard_rows(books_df['book_id'].to_numpy(), index, count)
+    shard_df = shard_books(books_df, rows)
+    hybrid.books_df = shard_df
+
+    content = hybrid.content_recommender
+    content.book_content_matrix = content.book_content_matrix.tocsr()[rows]
+    content.books_df = shard_df
+    content.book_indices = pd.Series(shard_df.index, index=shard_df['book_id']).drop_duplicates()
+    # Neighbour lists point at full-catalog rows; shards scan their own rows instead
+    content.neighbor_ids = None
+    content.neighbor_scores = None
+
+    collab = hybrid.collaborative_recommender
+    item_ids = np.asarray(shard_df['book_id'].unique())
+    positions = pd.Index(collab.item_ids).get_indexer(item_ids)
+    collab.item_factors = np.asarray(collab.item_factors[positions])
+    collab.item_bias = np.asarray(collab.item_bias[positions])
+    collab.item_ids = item_ids
+    collab.item_positions = {book_id: pos for pos, book_id in enumerate(item_ids)}
+    collab.book_mapping = dict(enumerate(item_ids))
+    collab.books_df = shard_df
+    collab.item_norms = None
+    if collab.ann_index is not None:
+        collab.build_ann_index(n_probe=collab.ann_index.n_probe)
+
+    hybrid.prepare_candidates(ratings_df)
+    return shard_df, rows
+
+# -------------------- Recommendation Materialization --------------------
+
+# Materialization workers keep the models and user index in module globals so they
+# are sent to each worker process once rather than with every chunk of users.
+_materialize_hybrid = None
+_materialize_user_index = None
+_materialize_top_n = None
+
+def _init_materialize_worker(hybrid, user_index, top_n):
+    global _materialize_hybrid, _materialize_user_index, _materialize_top_n
+    _materialize_hybrid = hybrid
+    _materialize_user_index = user_index
+    _materialize_top_n = top_n
+
+def _materialize_chunk(bounds):
+    """
+    Live recommendations (what GET /recommendations/ answers without a book_id)
+    of the user index rows start:stop, padded with -1; users whose top-rated book
+    is not in the catalog get none
+    """
+    start, stop = bounds
+    rows = np.full((stop - start, _materialize_top_n), -1, dtype=np.int32)
+    scores = np.zeros((stop - start, _materialize_top_n), dtype=np.float32)
+    book_indices = _materialize_hybrid.content_recommender.book_indices
+    for i, user_id in enumerate(_materialize_user_index.user_ids[start:stop]):
+        book_id = _materialize_user_index.top_rated_book(user_id)
+        if book_id not in book_indices:
+            continue
+        user_rows, user_scores = _materialize_hybrid.recommend_rows(
+            user_id, book_id, _materialize_user_index.rated_mask(user_id), top_n=_materialize_top_n
+        )
+        rows[i, :len(user_rows)] = user_rows
+        scores[i, :len(user_scores)] = user_scores
+    return start, rows, scores
+
+def materialize_recommendations(path, hybrid, user_index, version, top_n=50, chunk_size=1024, n_jobs=None):
+    """
+    Compute the top_n hybrid recommendations of every user in user_index, in
+    chunks of users spread over a process pool, and write them to `path` as a
+    MaterializedRecommendations store tagged with the serving version. Returns
+    the number of users covered.
+    """
+    started = time.perf_counter()
+    n_users = len(user_index.user_ids)
+    bounds = [(start, min(start + chunk_size, n_users)) for start in range(0, n_users, chunk_size)]
+    rows = np.full((n_users, top_n), -1, dtype=np.int32)
+    scores = np.zeros((n_users, top_n), dtype=np.float32)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(bounds) <= 1:
+        _init_materialize_worker(hybrid, user_index, top_n)
+        for start, chunk_rows, chunk_scores in map(_materialize_chunk, bounds):
+            rows[start:start + len(chunk_rows)] = chunk_rows
+            scores[start:start + len(chunk_scores)] = chunk_scores
+        _init_materialize_worker(None, None, None)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_materialize_worker,
+                                 initargs=(hybrid, user_index, top_n)) as executor:
+            for start, chunk_rows, chunk_scores in executor.map(_materialize_chunk, bounds):
+                rows[start:start + len(chunk_rows)] = chunk_rows
+                scores[start:start + len(chunk_scores)] = chunk_scores
+    save_materialized(path, user_index.user_ids, rows, scores, version, active_users=n_users,
+                      build_seconds=time.perf_counter() - started)
+    return int((rows[:, 0] >= 0).sum()) if top_n else 0
 
 # -------------------- FastAPI Implementation --------------------
 
@@ -139,61 +1453,1090 @@ app = FastAPI(title="Book Recommendation API", description="API for recommending
 class BookRecommendationRequest(BaseModel):
     user_id: int
     book_id: Optional[str] = None
-    num_recommendations: int = 10
+    num_recommendations: int = Field(10, ge=1)
 
 class BookResponse(BaseModel):
     book_id: str
     title: str
     authors: str
     average_rating: Optional[float] = 0.0
+    rating_count: Optional[int] = None
     image_url: str
+    score: Optional[float] = None
 
 class RecommendationResponse(BaseModel):
     recommendations: List[BookResponse]
 
-books_df = None
-ratings_df = None
-users_df = None
-hybrid_recommender = None
+class BookListResponse(BaseModel):
+    books: List[BookResponse]
+    year: Optional[str] = None
+
+class RatingRequest(BaseModel):
+    user_id: int
+    book_id: str
+    rating: float
+
+class NewBook(BaseModel):
+    book_id: str
+    title: str
+    authors: str
+    published_date: str = 'N/A'
+    image_url: str = 'https://via.placeholder.com/150x225'
+
+class AddBooksRequest(BaseModel):
+    books: List[NewBook]
+
+# Directory for the Parquet cache of the parsed CSVs (needs pyarrow); unset disables it
+DATA_CACHE_PATH = os.environ.get('BOOKMATCH_DATA_CACHE')
+
+# Neighbours per book in the precomputed content similarity index. Candidate generation takes
+# its content candidates from it, so per-request work stays bounded by the candidate budget;
+# 0 skips building it and every request scans the whole catalog for them instead.
+CONTENT_INDEX_K = int(os.environ.get('BOOKMATCH_CONTENT_INDEX_K', '100'))
+
+# Build the IVF nearest-neighbour index over item factors at startup ('0' falls back to brute force)
+ANN_INDEX = os.environ.get('BOOKMATCH_ANN_INDEX', '1') != '0'
+
+# Collaborative trainer ('svd' or 'als'); with BOOKMATCH_IMPLICIT_ZEROS=1 ALS treats
+# 0 ratings as confidence-weighted implicit feedback rather than ratings of 0
+COLLABORATIVE_TRAINER = os.environ.get('BOOKMATCH_TRAINER', 'svd')
+IMPLICIT_ZEROS = os.environ.get('BOOKMATCH_IMPLICIT_ZEROS', '0') != '0'
+
+# Content vectors: 'tfidf' (fitted 5000-word vocabulary) or 'hashing' (hashed words,
+# author and title character n-grams)
+CONTENT_VECTORS = os.environ.get('BOOKMATCH_CONTENT_VECTORS', 'tfidf')
+
+# Directory written by `python book_recommender_api.py build-artifacts`; when set the
+# API loads it at startup instead of retraining, and refuses to start if it is stale
+ARTIFACTS_PATH = os.environ.get('BOOKMATCH_ARTIFACTS')
+
+# 'index/count' (e.g. '2/4') to serve only that shard of the catalog behind coordinator.py;
+# needs BOOKMATCH_ARTIFACTS, so every shard loads the same models. Every shard keeps every
+# user's history, but only its own books' factors, so on a shard online ratings update
+# the rated-book exclusions and rails but are not folded into user factors, and there
+# are no background refits: rebuild the artifacts instead and let the shards reload.
+SHARD = parse_shard(os.environ['BOOKMATCH_SHARD']) if os.environ.get('BOOKMATCH_SHARD') else None
+
+# Directory written by `python book_recommender_api.py materialize` from BOOKMATCH_ARTIFACTS;
+# requests without a book_id are answered from it for users with no online ratings since.
+# It is only served while it matches the loaded artifacts and data, and not on shards.
+MATERIALIZED_PATH = os.environ.get('BOOKMATCH_MATERIALIZED')
+
+# Keep sampled stacks of this many slowest requests for GET /metrics/slowest; 0 disables profiling
+PROFILE_SLOWEST = int(os.environ.get('BOOKMATCH_PROFILE_SLOWEST', '0'))
+
+# Worker threads for recommendation work (NumPy/BLAS paths release the GIL)
+EXECUTOR_THREADS = int(os.environ.get('BOOKMATCH_EXECUTOR_THREADS', str(os.cpu_count() or 4)))
+
+# Worker processes for search, whose substring checks are pure Python; 0 runs search on the threads.
+# Forked workers share the parent's search index copy-on-write; spawned ones rebuild it from
+# the memory-mapped BOOKMATCH_ARTIFACTS.
+SEARCH_PROCESSES = int(os.environ.get('BOOKMATCH_SEARCH_PROCESSES', '0'))
+
+# Jobs queued or running per executor before requests are refused with 429
+EXECUTOR_MAX_PENDING = int(os.environ.get('BOOKMATCH_MAX_PENDING', '64'))
+
+# Seconds a request may wait for its executor job before answering 504
+REQUEST_TIMEOUT = float(os.environ.get('BOOKMATCH_REQUEST_TIMEOUT', '10'))
+
+# Result cache: in-process budget (MB) and entry lifetime (seconds); 0 MB disables caching
+CACHE_MB = float(os.environ.get('BOOKMATCH_CACHE_MB', '64'))
+CACHE_TTL = float(os.environ.get('BOOKMATCH_CACHE_TTL', '300'))
+
+# Loopback "host:port" or a unix socket path of the local cache server shared by all workers
+# on the machine (the first worker to start launches it); unset keeps the cache per-process.
+# The server trusts whoever holds BOOKMATCH_CACHE_AUTHKEY, a secret every worker must be
+# given: it unpickles what clients send.
+CACHE_SHARED_ADDRESS = os.environ.get('BOOKMATCH_CACHE_ADDRESS')
+CACHE_SHARED_MB = float(os.environ.get('BOOKMATCH_CACHE_SHARED_MB', '256'))
+CACHE_AUTHKEY = os.environ.get('BOOKMATCH_CACHE_AUTHKEY')
+
+# Seconds between background full refits that fold online ratings into the model; 0 disables them
+REFIT_INTERVAL = float(os.environ.get('BOOKMATCH_REFIT_INTERVAL', '3600'))
+
+# Seconds between checks of the data files (or BOOKMATCH_ARTIFACTS) for changes that trigger
+# a hot reload; a change must look the same on two checks in a row. 0 disables the watcher.
+WATCH_INTERVAL = float(os.environ.get('BOOKMATCH_WATCH_INTERVAL', '0'))
+
+# Secret the admin endpoints (POST /admin/reload, /admin/books) require in the X-Admin-Token
+# header; unset disables them
+ADMIN_TOKEN = os.environ.get('BOOKMATCH_ADMIN_TOKEN')
+
+# Popularity rails: pseudo-ratings at the global mean added to every book's mean for the
+# smoothed rating, the trending half-life in days, and the length of each precomputed list
+POPULARITY_PRIOR = float(os.environ.get('BOOKMATCH_POPULARITY_PRIOR', '10'))
+TRENDING_HALF_LIFE_DAYS = float(os.environ.get('BOOKMATCH_TRENDING_HALF_LIFE_DAYS', '7'))
+RAIL_SIZE = int(os.environ.get('BOOKMATCH_RAIL_SIZE', '100'))
+
+# Ratings waiting to be applied before POST /ratings starts answering 429
+RATING_QUEUE_SIZE = 10_000
+
+# Online ratings kept for replay onto reloaded snapshots when no refit folds them into
+# ratings_df (BOOKMATCH_REFIT_INTERVAL=0, or a shard); past it the oldest are dropped
+# from the log, and a reload no longer brings them back.
+RATING_LOG_LIMIT = int(os.environ.get('BOOKMATCH_RATING_LOG_LIMIT', '1000000'))
+
+# Users scored per chunk by /recommendations/batch; a chunk's predicted ratings are one
+# float64 row per user over every catalog position among the chunk's candidates
+BATCH_CHUNK_SIZE = 64
+
+class ServingSnapshot:
+    """
+    Everything requests read - tables, models, indexes and the version used in
+    cache keys - built together and published by rebinding the `snapshot` global.
+
+    Request code reads `snapshot` once and uses only that object, so a reload or
+    refit never mixes old and new state inside one request, and in-flight requests
+    finish on the snapshot they started with. Nothing but the online-rating overlay
+    (user_index updates, aggregates and folded-in users) changes after it is published.
+    """
+
+    def __init__(self, books_df, ratings_df, users_df, hybrid, user_index, aggregates, search_index, serializer,
+                 version, materialized=None):
+        self.books_df = books_df
+        self.ratings_df = ratings_df
+        self.users_df = users_df
+        self.hybrid = hybrid
+        self.user_index = user_index
+        self.aggregates = aggregates
+        self.search_index = search_index
+        self.serializer = serializer
+        self.version = version
+        self.materialized = materialized
+        # Executor its searches run on, set before it is published: the recommend threads, or
+        # a process pool whose workers hold their own copy of this snapshot
+        self.search_executor = None
+
+def make_snapshot(books_df, ratings_df, users_df, hybrid, version, search_index=None, aggregates=None,
+                  serializer=None, materialized=None):
+    """Build the per-snapshot indexes around a fitted hybrid recommender"""
+    user_index = UserRatingIndex(ratings_df, hybrid.collaborative_recommender.item_ids)
+    if aggregates is None:
+        aggregates = BookAggregates(books_df, ratings_df, prior_count=POPULARITY_PRIOR,
+                                    half_life_days=TRENDING_HALF_LIFE_DAYS, top_n=RAIL_SIZE)
+    if search_index is None:
+        search_index = BookSearchIndex(
+            books_df, analyzer=hybrid.content_recommender.word_analyzer()
+        )
+    if serializer is None:
+        serializer = BookSerializer(books_df)
+    return ServingSnapshot(books_df, ratings_df, users_df, hybrid, user_index, aggregates, search_index, serializer,
+                           version, materialized)
+
+def serving_version(artifacts_path=ARTIFACTS_PATH):
+    """Cache-key version of freshly loaded data: the data stamps, plus the artifacts' build time"""
+    version = data_version()
+    if artifacts_path:
+        with open(os.path.join(artifacts_path, 'manifest.json')) as f:
+            version += f".{json.load(f)['created_at']:.0f}"
+    return version
+
+def load_materialized(version):
+    """
+    The BOOKMATCH_MATERIALIZED store if it was built from the data and artifacts
+    of `version`, else None; materialized_status records which and why
+    """
+    global materialized_status
+    if not MATERIALIZED_PATH or SHARD is not None:
+        materialized_status = {'state': 'disabled'}
+        return None
+    if not ARTIFACTS_PATH:
+        # Models trained at startup differ from the ones the store was computed with
+        materialized_status = {'state': 'disabled', 'reason': "needs BOOKMATCH_ARTIFACTS"}
+        return None
+    try:
+        store = MaterializedRecommendations.load(MATERIALIZED_PATH)
+    except FileNotFoundError:
+        materialized_status = {'state': 'missing', 'path': MATERIALIZED_PATH}
+        return None
+    except Exception as e:
+        materialized_status = {'state': 'error', 'path': MATERIALIZED_PATH, 'error': str(e)}
+        return None
+    if store.version != version:
+        materialized_status = {'state': 'stale', 'path': MATERIALIZED_PATH,
+                               'reason': f"built from {store.version}, serving {version}"}
+        return None
+    materialized_status = {'state': 'serving', 'path': MATERIALIZED_PATH}
+    return store
+
+def load_snapshot():
+    """Load BOOKMATCH_ARTIFACTS, or the CSVs and train, into a new snapshot"""
+    version = serving_version()
+    if SHARD is not None:
+        if not ARTIFACTS_PATH:
+            raise RuntimeError("A catalog shard (BOOKMATCH_SHARD) needs BOOKMATCH_ARTIFACTS, so that every "
+                               "shard serves the same models")
+        # Shards answer the same keys with their own books, so a cache shared between them
+        # must tell them apart
+        version += f".shard{SHARD[0]}of{SHARD[1]}"
+        books_df, ratings_df, users_df, hybrid = load_artifacts(ARTIFACTS_PATH)
+        n_books = len(books_df)
+        search_index = BookSearchIndex(books_df, analyzer=hybrid.content_recommender.word_analyzer(),
+                                       rows=shard_rows(books_df['book_id'].to_numpy(), *SHARD))
+        # Smooth towards the whole catalog's mean rating so every shard's scores compare
+        explicit = ratings_df['book_id'].isin(books_df['book_id']).to_numpy() & (ratings_df['rating'].to_numpy() > 0)
+        global_mean = float(ratings_df['rating'].to_numpy()[explicit].mean()) if explicit.any() else 0.0
+        books_df, _ = partition_catalog(books_df, ratings_df, hybrid, *SHARD)
+        aggregates = BookAggregates(books_df, ratings_df, prior_count=POPULARITY_PRIOR,
+                                    half_life_days=TRENDING_HALF_LIFE_DAYS, top_n=RAIL_SIZE, global_mean=global_mean)
+        print(f"Serving shard {SHARD[0]}/{SHARD[1]} of {ARTIFACTS_PATH}: {len(books_df)} of {n_books} books")
+        return make_snapshot(books_df, ratings_df, users_df, hybrid, version, search_index=search_index,
+                             aggregates=aggregates, materialized=load_materialized(version))
+    if ARTIFACTS_PATH:
+        books_df, ratings_df, users_df, hybrid = load_artifacts(ARTIFACTS_PATH)
+        print(f"Loaded model artifacts from {ARTIFACTS_PATH}")
+        if CONTENT_INDEX_K and hybrid.content_recommender.neighbor_ids is None:
+            print("These artifacts have no content similarity index, so every recommendation scans the "
+                  "whole catalog; rebuild them with build-artifacts to add it")
+    else:
+        ingestion_report = {}
+        books_df, ratings_df, users_df = load_and_preprocess_data(DATA_CACHE_PATH, report=ingestion_report)
+        print(f"Loaded data from {ingestion_report['source']} in {ingestion_report['load_seconds']:.1f}s, "
+              f"peak RSS {ingestion_report['peak_rss_mb']} MB")
+        for name in ('books', 'ratings', 'users'):
+            if ingestion_report.get(name):
+                print(f"  {name}: {ingestion_report[name]}")
+        hybrid = build_hybrid_recommender(
+            books_df, ratings_df, content_index_k=CONTENT_INDEX_K, ann_index=ANN_INDEX,
+            trainer=COLLABORATIVE_TRAINER, implicit_zeros=IMPLICIT_ZEROS,
+            content_vectors=CONTENT_VECTORS
+        )
+    materialized = load_materialized(version)
+    if materialized_status['state'] not in ('serving', 'disabled'):
+        print(f"Not serving materialized recommendations: {materialized_status}")
+    return make_snapshot(books_df, ratings_df, users_df, hybrid, version, materialized=materialized)
+
+snapshot = None
+
+# Online ratings: POST /ratings queues them, _rating_writer applies them in batches.
+# rating_log keeps every applied rating, as (user_id, book_id, rating, time), until a
+# refit has folded it into ratings_df; without refits it keeps the last RATING_LOG_LIMIT.
+rating_queue = None
+rating_log = []
+rating_lock = threading.Lock()
+background_tasks = []
+
+profiler = SlowRequestProfiler(n_slowest=PROFILE_SLOWEST) if PROFILE_SLOWEST else None
+
+recommend_executor = None
+
+# Refits, reloads and catalog additions build a new snapshot one at a time, off the request path
+rebuild_lock = threading.Lock()
+refit_count = 0
+reload_count = 0
+books_added_count = 0
+# Outcome of the last POST /admin/reload or watcher reload, served by GET /admin/reload
+reload_status = {'state': 'idle'}
+# Whether the live snapshot serves BOOKMATCH_MATERIALIZED, and why not, for GET /recommendations/materialized
+materialized_status = {'state': 'disabled'}
+
+def make_result_cache():
+    if not CACHE_MB:
+        return None
+    shared_address = None
+    if CACHE_SHARED_ADDRESS:
+        if not CACHE_AUTHKEY:
+            raise RuntimeError("BOOKMATCH_CACHE_ADDRESS needs BOOKMATCH_CACHE_AUTHKEY, a secret shared by the workers")
+        shared_address = parse_shared_address(CACHE_SHARED_ADDRESS)
+    return TieredCache(local_bytes=int(CACHE_MB * 2**20), ttl=CACHE_TTL, shared_address=shared_address,
+                       shared_bytes=int(CACHE_SHARED_MB * 2**20),
+                       authkey=CACHE_AUTHKEY.encode() if CACHE_AUTHKEY else None)
+
+result_cache = make_result_cache()
+
+def cached_response(key, compute, fmt='json', local_only=False):
+    """
+    Response for `key` from the result cache, or from compute() (the encoded body)
+    on a miss. The key must include fmt, the body's format. Keys holding counters
+    of this process's online ratings (user or aggregates revisions) mean different
+    answers in other workers, so those entries pass local_only and stay out of
+    the shared tier.
+    """
+    media_type = ARROW_MEDIA_TYPE if fmt == 'arrow' else "application/json"
+    if result_cache is not None:
+        body = result_cache.get(key, local_only=local_only)
+        if body is not None:
+            METRICS.increment('cache_hits_total')
+            return Response(body, media_type=media_type)
+        METRICS.increment('cache_misses_total')
+    body = compute()
+    if result_cache is not None:
+        result_cache.set(key, body, local_only=local_only)
+    return Response(body, media_type=media_type)
+
+@contextmanager
+def track_request(stage):
+    """Time a whole request under `stage`, and sample its stacks when profiling is on"""
+    METRICS.increment(f'{stage}_requests_total')
+    with METRICS.time_stage(stage):
+        if profiler is None:
+            yield
+        else:
+            with profiler.track(stage):
+                yield
 
 @app.on_event("startup")
 async def startup_event():
-    global books_df, ratings_df, users_df, hybrid_recommender
-    books_df, ratings_df, users_df = load_and_preprocess_data()
-    hybrid_recommender = HybridRecommender()
-    hybrid_recommender.fit(books_df, ratings_df)
+    global snapshot
+    snapshot = load_snapshot()
+    start_rating_tasks()
+    start_executors()
+    if WATCH_INTERVAL:
+        background_tasks.append(asyncio.create_task(_watch_data_files()))
+    if profiler is not None:
+        profiler.start()
     print("Models loaded and ready for recommendations!")
 
-@app.get("/recommendations/", response_model=RecommendationResponse)
-async def get_recommendations(user_id: int, book_id: Optional[str] = None, num_recommendations: int = 10):
+def _init_search_worker(artifacts_path, version, forked_snapshot=None):
+    global snapshot, result_cache
+    # A fresh cache rather than the forked one, whose lock may have been held mid-fork
+    result_cache = make_result_cache()
+    if forked_snapshot is not None:
+        # Forked from the API process: the snapshot is already here, shared copy-on-write
+        snapshot = forked_snapshot
+        return
+    books_df, _, _, hybrid = load_artifacts(artifacts_path, check_stale=False)
+    rows = None if SHARD is None else shard_rows(books_df['book_id'].to_numpy(), *SHARD)
+    search_index = BookSearchIndex(books_df, analyzer=hybrid.content_recommender.word_analyzer(), rows=rows)
+    if rows is not None:
+        books_df = shard_books(books_df, rows)
+    snapshot = ServingSnapshot(books_df, None, None, hybrid, None, None, search_index, BookSerializer(books_df), version)
+
+def _search_process_executor(serving):
+    """
+    Search processes for the snapshot `serving`. Forked workers inherit it with the
+    initargs, which fork passes without pickling; spawned ones load the artifacts.
+    """
+    forked_snapshot = serving if multiprocessing.get_start_method() == 'fork' else None
+    return BoundedExecutor(
+        ProcessPoolExecutor(max_workers=SEARCH_PROCESSES, initializer=_init_search_worker,
+                            initargs=(ARTIFACTS_PATH, serving.version, forked_snapshot)),
+        max_pending=EXECUTOR_MAX_PENDING, timeout=REQUEST_TIMEOUT
+    )
+
+def start_executors():
+    global recommend_executor
+    recommend_executor = BoundedExecutor(
+        ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix='recommend'),
+        max_pending=EXECUTOR_MAX_PENDING, timeout=REQUEST_TIMEOUT
+    )
+    snapshot.search_executor = recommend_executor
+    if SEARCH_PROCESSES:
+        if multiprocessing.get_start_method() != 'fork' and not ARTIFACTS_PATH:
+            print("Search processes need fork or BOOKMATCH_ARTIFACTS; running search on threads")
+            return
+        snapshot.search_executor = _search_process_executor(snapshot)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    for executor in {recommend_executor, snapshot.search_executor} - {None}:
+        executor.shutdown()
+    if result_cache is not None:
+        result_cache.close()
+
+async def run_blocking(executor, fn, *args):
+    """Await fn(*args) on an executor, mapping saturation to 429 and timeouts to 504"""
     try:
-        user_ratings = ratings_df[ratings_df['user_id'] == user_id]
-        rated_books = user_ratings['book_id'].tolist()
-        if book_id is None and rated_books:
-            highest_rated = user_ratings.sort_values('rating', ascending=False).iloc[0]
-            book_id = highest_rated['book_id']
-        elif book_id is None:
-            raise HTTPException(status_code=400, detail="No book_id provided and user has no ratings")
-        recommendations = hybrid_recommender.recommend(
-            user_id, book_id, rated_books, top_n=num_recommendations
-        )
-        result = recommendations[['book_id', 'title', 'authors', 'image_url']].copy()
-        result['average_rating'] = 0.0  # Placeholder if not in your CSV
-        return {"recommendations": result.to_dict('records')}
+        return await executor.run(fn, *args)
+    except ExecutorSaturated:
+        METRICS.increment('rejected_requests_total')
+        raise HTTPException(status_code=429, detail="Server busy, retry shortly")
+    except asyncio.TimeoutError:
+        METRICS.increment('timed_out_requests_total')
+        raise HTTPException(status_code=504, detail="Request timed out")
+
+def record_rating(target, user_id, book_id, rating, timestamp, aggregates=True):
+    """Add an online rating to a snapshot's user index and, unless told not to, its aggregates"""
+    if aggregates:
+        target.aggregates.add_rating(book_id, rating, timestamp, previous=target.user_index.rating(user_id, book_id))
+    target.user_index.add_rating(user_id, book_id, rating)
+
+def apply_ratings(batch):
+    """
+    Add a batch of queued ratings to the user index and aggregates, and fold each
+    affected user in once, however many of their ratings the batch holds.
+    """
+    with rating_lock:
+        current = snapshot
+        now = time.time()
+        for rating in batch:
+            record_rating(current, rating.user_id, rating.book_id, rating.rating, now)
+            rating_log.append((rating.user_id, rating.book_id, rating.rating, now))
+        if (not REFIT_INTERVAL or SHARD is not None) and len(rating_log) > RATING_LOG_LIMIT:
+            dropped = len(rating_log) - RATING_LOG_LIMIT
+            del rating_log[:dropped]
+            METRICS.increment('rating_log_dropped_total', dropped)
+        if SHARD is not None:
+            # A shard has only its own books' factors to fold users in against
+            return
+        collab = current.hybrid.collaborative_recommender
+        for user_id in {rating.user_id for rating in batch}:
+            collab.fold_in_user(user_id, *current.user_index.catalog_history(user_id))
+
+def publish_snapshot(new_snapshot, n_folded):
+    """
+    Make new_snapshot the live one. Online ratings after the first n_folded of
+    rating_log are not part of its training data, so they are replayed onto its
+    overlay first; the folded ones are dropped from the log.
+    """
+    global snapshot
+    old_executor = snapshot.search_executor
+    new_snapshot.search_executor = old_executor
+    if old_executor is not recommend_executor:
+        # Search processes hold their own copy of the snapshot, so the new one gets fresh ones
+        new_snapshot.search_executor = _search_process_executor(new_snapshot)
+    with rating_lock:
+        pending = rating_log[n_folded:]
+        # A refit hands over the live aggregates, which have every rating already
+        replay_aggregates = new_snapshot.aggregates is not snapshot.aggregates
+        for user_id, book_id, rating, timestamp in pending:
+            record_rating(new_snapshot, user_id, book_id, rating, timestamp, aggregates=replay_aggregates)
+        if SHARD is None:
+            for user_id in {user_id for user_id, _, _, _ in pending}:
+                new_snapshot.hybrid.collaborative_recommender.fold_in_user(
+                    user_id, *new_snapshot.user_index.catalog_history(user_id)
+                )
+        snapshot = new_snapshot
+        del rating_log[:n_folded]
+    if result_cache is not None:
+        result_cache.local.clear()
+    if old_executor is not recommend_executor:
+        # Let the old pool finish the searches it already has
+        old_executor.shutdown(cancel_futures=False)
+
+def refit_models():
+    """
+    Retrain the collaborative model on ratings_df plus every online rating so far and
+    publish the result. Only ratings changed, so the content model and its indexes
+    carry over; ALS starts from the current factors, SVD trains from scratch. Ratings
+    that arrive during training are replayed onto the new model before it goes live.
+    """
+    global refit_count, materialized_status
+    with rebuild_lock:
+        with rating_lock:
+            current = snapshot
+            n_folded = len(rating_log)
+            new_ratings_df = append_ratings(current.ratings_df, [row[:3] for row in rating_log[:n_folded]])
+        new_hybrid = current.hybrid.refit_collaborative(new_ratings_df, ann_index=ANN_INDEX,
+                                                        trainer=COLLABORATIVE_TRAINER,
+                                                        implicit_zeros=IMPLICIT_ZEROS)
+        refit_count += 1
+        # Refits are per process, trained on that process's online ratings, so the version
+        # is too: entries it puts in the shared cache tier are never read by other workers.
+        # The catalog is unchanged, so the search index and serializer carry over, and so
+        # do the aggregates, which already count every online rating at the time it arrived. Materialized
+        # recommendations were computed with the old models, so they are dropped.
+        version = f"{current.version}.refit{refit_count}.{os.getpid()}"
+        publish_snapshot(make_snapshot(current.books_df, new_ratings_df, current.users_df, new_hybrid, version,
+                                       search_index=current.search_index, aggregates=current.aggregates,
+                                       serializer=current.serializer), n_folded)
+        if current.materialized is not None:
+            materialized_status = {'state': 'stale', 'path': MATERIALIZED_PATH,
+                                   'reason': f"models refit since build, serving {version}"}
+
+def reload_snapshot(trigger):
+    """
+    Rebuild everything from the data files (or BOOKMATCH_ARTIFACTS) and publish it,
+    recording the duration and memory change in reload_status. Online ratings are
+    not in the files, so all of them are replayed onto the new snapshot.
+    """
+    global reload_count, reload_status
+    started = time.perf_counter()
+    rss_before = _current_rss_mb()
+    reload_status = {'state': 'running', 'trigger': trigger, 'started_at': time.time(),
+                     'version': snapshot.version}
+    try:
+        new_snapshot = load_snapshot()
+        reload_count += 1
+        new_snapshot.version += f".reload{reload_count}.{os.getpid()}"
+        publish_snapshot(new_snapshot, 0)
+        del new_snapshot
+        # The old snapshot is freed once the last in-flight request holding it finishes
+        _release_memory()
     except Exception as e:
+        METRICS.increment('reload_failures_total')
+        reload_status = {**reload_status, 'state': 'failed', 'error': str(e),
+                         'duration_seconds': time.perf_counter() - started}
+        raise
+    duration = time.perf_counter() - started
+    METRICS.increment('reloads_total')
+    METRICS.observe_stage('reload', duration)
+    rss_after = _current_rss_mb()
+    reload_status = {
+        **reload_status, 'state': 'succeeded', 'duration_seconds': duration, 'version': snapshot.version,
+        'rss_before_mb': rss_before, 'rss_after_mb': rss_after, 'peak_rss_mb': _peak_rss_mb(),
+        'rss_delta_mb': None if rss_before is None or rss_after is None else round(rss_after - rss_before, 1),
+    }
+    print(f"Reloaded ({trigger}) in {duration:.1f}s, RSS {rss_before} -> {rss_after} MB")
+
+def try_reload(trigger):
+    """reload_snapshot unless a refit or reload is already running; returns whether it ran"""
+    if not rebuild_lock.acquire(blocking=False):
+        return False
+    try:
+        reload_snapshot(trigger)
+    finally:
+        rebuild_lock.release()
+    return True
+
+def add_books_to_catalog(new_books_df):
+    """
+    Publish a snapshot whose catalog also has new_books_df, without refitting: see
+    HybridRecommender.add_books, which runs on a copy of the live hybrid. The search
+    index, serializer, user index and aggregates are rebuilt over the new catalog and
+    online ratings replayed onto them. Materialized recommendations still hold for
+    the existing books and stay. The books are not written to the data files, so a
+    reload from them drops the books again; refits keep them.
+    """
+    global books_added_count
+    with rebuild_lock:
+        current = snapshot
+        hybrid = copy.copy(current.hybrid)
+        hybrid.content_recommender = copy.copy(hybrid.content_recommender)
+        hybrid.collaborative_recommender = copy.copy(hybrid.collaborative_recommender)
+        hybrid.collaborative_recommender.folded_users = dict(hybrid.collaborative_recommender.folded_users)
+        hybrid.add_books(new_books_df, current.ratings_df)
+        books_added_count += 1
+        version = f"{current.version}.books{books_added_count}.{os.getpid()}"
+        publish_snapshot(make_snapshot(hybrid.books_df, current.ratings_df, current.users_df, hybrid, version,
+                                       materialized=current.materialized), 0)
+        return version
+
+def watched_stamps():
+    """
+    What the watcher compares between checks: the artifacts manifest, or the data
+    files, plus the materialized recommendations' manifest so a nightly rebuild is picked up
+    """
+    if ARTIFACTS_PATH:
+        stat = os.stat(os.path.join(ARTIFACTS_PATH, 'manifest.json'))
+        stamps = {'manifest': (stat.st_size, stat.st_mtime)}
+    else:
+        stamps = {name: (stamp['size'], stamp['mtime']) for name, stamp in data_file_stamps().items()}
+    if MATERIALIZED_PATH and SHARD is None:
+        manifest_path = os.path.join(MATERIALIZED_PATH, 'manifest.json')
+        stat = os.stat(manifest_path) if os.path.exists(manifest_path) else None
+        stamps['materialized'] = stat and (stat.st_size, stat.st_mtime)
+    return stamps
+
+async def _watch_data_files():
+    loop = asyncio.get_running_loop()
+    loaded = seen = await loop.run_in_executor(None, watched_stamps)
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        try:
+            stamps = await loop.run_in_executor(None, watched_stamps)
+        except OSError:
+            # Mid-replace (e.g. the artifacts directory being renamed into place)
+            continue
+        # Wait for a change to settle before reloading, so a file still being written is not read
+        if stamps != loaded and stamps == seen:
+            try:
+                if await loop.run_in_executor(None, try_reload, 'watcher'):
+                    loaded = stamps
+            except Exception as e:
+                print(f"Reload after data change failed: {e}")
+                loaded = stamps
+        seen = stamps
+
+async def _rating_writer():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await rating_queue.get()]
+        # Coalesce everything that queued up meanwhile into one batch
+        while not rating_queue.empty():
+            batch.append(rating_queue.get_nowait())
+        try:
+            await loop.run_in_executor(None, apply_ratings, batch)
+        except Exception as e:
+            print(f"Failed to apply {len(batch)} ratings: {e}")
+
+async def _periodic_refit():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(REFIT_INTERVAL)
+        if rating_log:
+            try:
+                await loop.run_in_executor(None, refit_models)
+            except Exception as e:
+                print(f"Background refit failed: {e}")
+
+def start_rating_tasks():
+    global rating_queue
+    rating_queue = asyncio.Queue(maxsize=RATING_QUEUE_SIZE)
+    background_tasks.append(asyncio.create_task(_rating_writer()))
+    if REFIT_INTERVAL and SHARD is None:
+        background_tasks.append(asyncio.create_task(_periodic_refit()))
+
+def check_admin_token(x_admin_token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set BOOKMATCH_ADMIN_TOKEN")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _log_reload_result(task):
+    background_tasks.remove(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"Reload failed: {task.exception()}")
+    elif not task.result():
+        print("Reload skipped: a reload or refit was already running")
+
+@app.post("/admin/reload", status_code=202)
+async def reload_data(wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Rebuild the data and models in the background and swap them in atomically.
+    With wait=true, answer once the reload has finished, with its report.
+    """
+    check_admin_token(x_admin_token)
+    if rebuild_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload or refit is already running")
+    task = asyncio.get_running_loop().run_in_executor(None, try_reload, 'api')
+    if not wait:
+        # Hold on to the reload so it is not collected mid-run, and report how it ended
+        background_tasks.append(task)
+        task.add_done_callback(_log_reload_result)
+        return {"status": "started"}
+    try:
+        started = await task
+    except Exception:
+        raise HTTPException(status_code=500, detail=reload_status)
+    if not started:
+        raise HTTPException(status_code=409, detail="A reload or refit is already running")
+    return reload_status
+
+@app.get("/admin/reload")
+async def get_reload_status():
+    """State, duration and memory change of the last reload"""
+    return {"current_version": snapshot.version, **reload_status}
+
+@app.post("/admin/books", status_code=201)
+async def add_books(request: AddBooksRequest, x_admin_token: Optional[str] = Header(None)):
+    """Add books to the live catalog without a refit; they are served once this answers"""
+    check_admin_token(x_admin_token)
+    if SHARD is not None:
+        raise HTTPException(status_code=400, detail="Catalog shards get new books from their data on reload")
+    if snapshot.search_executor is not recommend_executor and multiprocessing.get_start_method() != 'fork':
+        # Spawned search processes load their catalog from BOOKMATCH_ARTIFACTS, which lacks the new books
+        raise HTTPException(status_code=400, detail="Search processes serve the artifacts' catalog; "
+                                                    "rebuild the artifacts instead")
+    book_ids = pd.Index([book.book_id for book in request.books])
+    if not len(book_ids):
+        raise HTTPException(status_code=400, detail="No books given")
+    clashes = book_ids[book_ids.duplicated() | book_ids.isin(snapshot.hybrid.content_recommender.book_indices.index)]
+    if len(clashes):
+        raise HTTPException(status_code=400, detail=f"Books already in the catalog or given twice: "
+                                                    f"{list(clashes.unique()[:10])}")
+    if rebuild_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload or refit is already running")
+    new_books_df = pd.DataFrame({column: [getattr(book, column) for book in request.books]
+                                 for column in BOOK_COLUMNS.values()})
+    try:
+        version = await asyncio.get_running_loop().run_in_executor(None, add_books_to_catalog, new_books_df)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error adding books: {str(e)}")
+    return {"added": len(book_ids), "version": version}
+
+@app.post("/ratings", status_code=202)
+async def add_rating(rating: RatingRequest):
+    """Record a rating; it is applied to the user's recommendations within milliseconds"""
+    lower, upper = RATING_RANGE
+    # ratings_df stores whole numbers, so a refit would truncate anything else
+    if not (lower <= rating.rating <= upper and float(rating.rating).is_integer()):
+        raise HTTPException(status_code=400, detail=f"rating must be a whole number from {lower} to {upper}")
+    try:
+        rating_queue.put_nowait(rating)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many pending ratings, retry shortly")
+    return {"status": "accepted"}
+
+def aggregates_revision(current):
+    """Online ratings counted in the snapshot's rating stats; search workers have none"""
+    return 0 if current.aggregates is None else current.aggregates.revision
+
+def book_numbers(current, rows, score=None):
+    """Per-row numbers of a book list response: score if given, then average_rating and rating_count"""
+    numbers = {} if score is None else {'score': score}
+    if current.aggregates is None:
+        # Search workers loaded from artifacts have no ratings to aggregate
+        numbers['average_rating'] = np.zeros(len(rows))
+    else:
+        numbers['average_rating'], numbers['rating_count'] = current.aggregates.rating_stats(rows)
+    return numbers
+
+def _recommend(user_id, book_id, num_recommendations, fmt='json'):
+    current = snapshot
+    try:
+        with track_request('recommendations'):
+            # Every answer carries rating stats from the aggregates, and cold-start ones are
+            # picked from them, so they change with any user's rating as well as this user's
+            revisions = (current.user_index.revision(user_id), aggregates_revision(current))
+            key = ('recommendations', current.version, user_id, book_id, num_recommendations, fmt, *revisions)
+            return cached_response(
+                key, lambda: _compute_recommendations(current, user_id, book_id, num_recommendations, fmt), fmt,
+                local_only=any(revisions)
+            )
+    except Exception as e:
+        METRICS.increment('recommendation_errors_total')
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
 
+def _compute_recommendations(current, user_id, book_id, num_recommendations, fmt='json'):
+    user_index = current.user_index
+    if book_id is None and current.materialized is not None:
+        # Precomputed lists hold no online ratings, so users with any are scored live
+        found = current.materialized.lookup(user_id, num_recommendations) if not user_index.revision(user_id) else None
+        if found is not None:
+            METRICS.increment('materialized_hits_total')
+            rows, scores = found
+            with METRICS.time_stage('serialization'):
+                return current.serializer.response(fmt, 'recommendations', rows, book_numbers(current, rows, scores))
+        METRICS.increment('materialized_misses_total')
+    with METRICS.time_stage('user_history'):
+        if book_id is None and user_id in user_index:
+            book_id = user_index.top_rated_book(user_id)
+        rated = user_index.rated_mask(user_id)
+    if book_id is None:
+        METRICS.increment('cold_start_recommendations_total')
+        rows, scores = current.hybrid.cold_start_rows(current.aggregates, rated, top_n=num_recommendations)
+    else:
+        with METRICS.time_stage('hybrid_recommend'):
+            rows, scores = current.hybrid.recommend_rows(user_id, book_id, rated, top_n=num_recommendations)
+    with METRICS.time_stage('serialization'):
+        return current.serializer.response(fmt, 'recommendations', rows, book_numbers(current, rows, scores))
+
+@app.get("/recommendations/", response_model=RecommendationResponse)
+async def get_recommendations(user_id: int, book_id: Optional[str] = None,
+                              num_recommendations: int = Query(10, ge=1),
+                              accept: Optional[str] = Header(None)):
+    return await run_blocking(recommend_executor, _recommend, user_id, book_id, num_recommendations,
+                              response_format(accept))
+
+@app.get("/recommendations/materialized")
+async def get_materialized_status():
+    """
+    Whether precomputed recommendations are served, how old they are, the share
+    of rated users they cover, and how many requests they answered
+    """
+    current = snapshot
+    with METRICS.lock:
+        hits = METRICS.counters.get('materialized_hits_total', 0)
+        misses = METRICS.counters.get('materialized_misses_total', 0)
+    status = {**materialized_status, 'current_version': current.version, 'hits': hits, 'misses': misses,
+              'hit_rate': hits / (hits + misses) if hits + misses else None}
+    store = current.materialized
+    if store is None:
+        return status
+    user_index = current.user_index
+    active_users = len(user_index.user_ids) + sum(user_id not in user_index.user_rows
+                                                  for user_id in user_index.updates)
+    # Covered users with online ratings since the build are scored live instead
+    changed = sum(store.lookup(user_id, 1) is not None for user_id in list(user_index.revisions))
+    return {**status, **store.stats(), 'active_users': active_users,
+            'coverage': (store.manifest['users'] - changed) / active_users if active_users else None,
+            'changed_users': changed}
+
+def _batch_chunk_lines(current, chunk):
+    """The NDJSON lines answering one chunk of /recommendations/batch requests"""
+    hybrid_recommender, user_index = current.hybrid, current.user_index
+
+    def encode_line(user_id, rows, scores):
+        books = current.serializer.json_array(rows, book_numbers(current, rows, scores))
+        return b'{"user_id":' + dumps(user_id) + b',"recommendations":' + books + b'}\n'
+
+    lines = []
+    valid = []
+    for req in chunk:
+        book_id = req.book_id if req.book_id is not None else user_index.top_rated_book(req.user_id)
+        if book_id is None:
+            METRICS.increment('cold_start_recommendations_total')
+            rows, scores = hybrid_recommender.cold_start_rows(
+                current.aggregates, user_index.rated_mask(req.user_id), top_n=req.num_recommendations
+            )
+            lines.append(encode_line(req.user_id, rows, scores))
+        elif book_id not in hybrid_recommender.content_recommender.book_indices:
+            lines.append(dumps({"user_id": req.user_id, "error": f"Unknown book_id {book_id}"}) + b'\n')
+        else:
+            valid.append((req, book_id))
+            lines.append(None)
+
+    if valid:
+        recommended = iter(hybrid_recommender.recommend_batch(
+            [req.user_id for req, _ in valid],
+            [book_id for _, book_id in valid],
+            [user_index.rated_mask(req.user_id) for req, _ in valid],
+            [req.num_recommendations for req, _ in valid],
+        ))
+        for i, line in enumerate(lines):
+            if line is not None:
+                continue
+            lines[i] = encode_line(chunk[i].user_id, *next(recommended))
+    return b''.join(lines)
+
+async def _stream_batch_recommendations(current, requests, first_lines):
+    """
+    Stream the first chunk's lines, then compute and stream each further chunk on
+    recommend_executor. The status line is already sent by then, so a chunk the
+    executor refuses or times out is answered in-band: an error line for every
+    request not yet answered, and the stream ends.
+    """
+    yield first_lines
+    for start in range(BATCH_CHUNK_SIZE, len(requests), BATCH_CHUNK_SIZE):
+        try:
+            yield await run_blocking(recommend_executor, _batch_chunk_lines, current,
+                                     requests[start:start + BATCH_CHUNK_SIZE])
+        except HTTPException as e:
+            yield b''.join(dumps({"user_id": req.user_id, "error": e.detail, "status": e.status_code}) + b'\n'
+                           for req in requests[start:])
+            return
+
+@app.post("/recommendations/batch")
+async def get_recommendations_batch(requests: List[BookRecommendationRequest]):
+    """
+    Recommendations for many users, streamed back as one NDJSON line per request.
+    Chunks run on recommend_executor; the first is computed before the response
+    starts, so a busy server answers 429 or 504 for the whole batch.
+    """
+    current = snapshot
+    first_lines = await run_blocking(recommend_executor, _batch_chunk_lines, current, requests[:BATCH_CHUNK_SIZE])
+    return StreamingResponse(_stream_batch_recommendations(current, requests, first_lines),
+                             media_type="application/x-ndjson")
+
+class SimilarBooksResponse(BaseModel):
+    book_id: str
+    similar: List[BookResponse]
+
+@app.get("/books/{book_id}/similar", response_model=SimilarBooksResponse)
+async def get_similar_books(book_id: str, k: int = Query(10, ge=1, le=100), accept: Optional[str] = Header(None)):
+    """Users who liked this book also liked: nearest books in the collaborative latent space"""
+    current = snapshot
+    if book_id not in current.hybrid.collaborative_recommender.item_positions:
+        raise HTTPException(status_code=404, detail=f"Unknown book_id {book_id}")
+    return await run_blocking(recommend_executor, _similar_books, current, book_id, k, response_format(accept))
+
+def _similar_books(current, book_id, k, fmt):
+    try:
+        rows, scores = current.hybrid.similar_rows(book_id, k=k)
+        body = current.serializer.response(fmt, 'similar', rows, book_numbers(current, rows, scores), book_id=book_id)
+        return Response(body, media_type=ARROW_MEDIA_TYPE if fmt == 'arrow' else "application/json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding similar books: {str(e)}")
+
+def _search(query, limit, offset, fmt='json'):
+    # Runs in a search worker process when BOOKMATCH_SEARCH_PROCESSES is set, so its stage
+    # timings land in that process; the handler records the end-to-end time
+    current = snapshot
+    revision = aggregates_revision(current)
+    return cached_response(('search', current.version, revision, query, limit, offset, fmt),
+                           lambda: _compute_search(current, query, limit, offset, fmt), fmt,
+                           local_only=bool(revision))
+
+def _compute_search(current, query, limit, offset, fmt='json'):
+    positions, total = current.search_index.search(query, limit=limit, offset=offset)
+    with METRICS.time_stage('serialization'):
+        return current.serializer.response(fmt, 'results', positions, book_numbers(current, positions), total=total)
+
 @app.get("/books/search/")
-async def search_books(query: str = Query(..., min_length=3)):
+async def search_books(query: str = Query(..., min_length=3),
+                       limit: int = Query(20, ge=1, le=1000),
+                       offset: int = Query(0, ge=0),
+                       accept: Optional[str] = Header(None)):
     try:
-        results = books_df[
-            books_df['title'].str.contains(query, case=False) | 
-            books_df['authors'].str.contains(query, case=False)
-        ]
-        results['average_rating'] = 0.0  # Placeholder
-        return {"results": results[['book_id', 'title', 'authors', 'average_rating', 'image_url']].to_dict('records')}
+        with METRICS.time_stage('search'):
+            METRICS.increment('search_requests_total')
+            return await run_blocking(snapshot.search_executor, _search, query, limit, offset, response_format(accept))
+    except HTTPException:
+        raise
     except Exception as e:
+        METRICS.increment('search_errors_total')
         raise HTTPException(status_code=500, detail=f"Error searching books: {str(e)}")
 
+def _popular_books(rail, key, limit, fmt='json'):
+    current = snapshot
+    with track_request('popular'):
+        cache_key = ('popular', current.version, current.aggregates.revision, rail, key, limit, fmt)
+        return cached_response(cache_key, lambda: _compute_popular(current, rail, key, limit, fmt), fmt,
+                               local_only=bool(current.aggregates.revision))
+
+def _compute_popular(current, rail, key, limit, fmt='json'):
+    if rail == 'year' and key is None:
+        key = current.aggregates.newest_year()
+    rows, scores = current.aggregates.top(rail, key)
+    rows = rows[:limit]
+    return current.serializer.response(fmt, 'books', rows, book_numbers(current, rows, scores[:limit]),
+                                       year=key if rail == 'year' else None)
+
+@app.get("/books/popular", response_model=BookListResponse)
+async def get_popular_books(limit: int = Query(10, ge=1, le=RAIL_SIZE),
+                            year: Optional[str] = None, author: Optional[str] = None,
+                            accept: Optional[str] = Header(None)):
+    """Best books by smoothed rating, overall or for one publication year or author"""
+    rail, key = ('year', year) if year is not None else ('author', author) if author is not None else ('rating', None)
+    return await run_blocking(recommend_executor, _popular_books, rail, key, limit, response_format(accept))
+
+@app.get("/books/trending", response_model=BookListResponse)
+async def get_trending_books(limit: int = Query(10, ge=1, le=RAIL_SIZE), accept: Optional[str] = Header(None)):
+    """Books with the most recent interactions, each weighted down by its age"""
+    return await run_blocking(recommend_executor, _popular_books, 'trending', None, limit, response_format(accept))
+
+@app.get("/books/new-releases", response_model=BookListResponse)
+async def get_new_releases(limit: int = Query(10, ge=1, le=RAIL_SIZE), accept: Optional[str] = Header(None)):
+    """Best books by smoothed rating from the latest publication year in the catalog"""
+    return await run_blocking(recommend_executor, _popular_books, 'year', None, limit, response_format(accept))
+
+class ShardRecommendationRequest(BaseModel):
+    user_id: int
+    book_id: Optional[str] = None
+    num_recommendations: int = Field(10, ge=1)
+    content_indices: List[int] = []
+    content_data: List[float] = []
+    factors: List[float] = []
+
+@app.get("/shard/health")
+async def get_shard_health():
+    """The shard slot this process serves, checked by the coordinator; an unsharded API is shard 0 of 1"""
+    index, count = SHARD or (0, 1)
+    current = snapshot
+    return {"shard": index, "shards": count, "version": current.version, "books": len(current.books_df)}
+
+@app.get("/shard/seed")
+async def get_shard_seed(user_id: int, book_id: Optional[str] = None):
+    """
+    Seed book of a recommendation - book_id, else the user's top-rated book - with
+    its content vector and item factors when this shard owns it
+    """
+    current = snapshot
+    if book_id is None and user_id in current.user_index:
+        book_id = current.user_index.top_rated_book(user_id)
+    if book_id is None:
+        return {"book_id": None}
+    if SHARD is not None and shard_of(book_id, SHARD[1]) != SHARD[0]:
+        return {"book_id": book_id}
+    hybrid = current.hybrid
+    if book_id not in hybrid.content_recommender.book_indices:
+        raise HTTPException(status_code=404, detail=f"Unknown book_id {book_id}")
+    vector = hybrid.seed_vector(book_id)
+    collab = hybrid.collaborative_recommender
+    return {"book_id": book_id, "content_indices": vector.indices.tolist(), "content_data": vector.data.tolist(),
+            "factors": collab.item_factors[collab.item_positions[book_id]].tolist()}
+
+@app.post("/shard/recommendations")
+async def get_shard_recommendations(request: ShardRecommendationRequest):
+    """
+    This shard's best books for a seed from /shard/seed, or its cold-start picks
+    without one, each with its catalog_row for the coordinator's merge
+    """
+    return await run_blocking(recommend_executor, _shard_recommend, request)
+
+def _shard_recommend(request):
+    current = snapshot
+    with track_request('shard_recommendations'):
+        revisions = (current.user_index.revision(request.user_id), aggregates_revision(current))
+        key = ('shard-recommendations', current.version, request.user_id, request.book_id,
+               request.num_recommendations, *revisions)
+        return cached_response(key, lambda: _compute_shard_recommendations(current, request),
+                               local_only=any(revisions))
+
+def _compute_shard_recommendations(current, request):
+    hybrid = current.hybrid
+    rated = current.user_index.rated_mask(request.user_id)
+    if request.book_id is None:
+        rows, scores = hybrid.cold_start_rows(current.aggregates, rated, top_n=request.num_recommendations)
+    else:
+        content_matrix = hybrid.content_recommender.book_content_matrix
+        seed_vector = sparse.csr_matrix(
+            (np.asarray(request.content_data, dtype=content_matrix.dtype), request.content_indices,
+             [0, len(request.content_indices)]), shape=(1, content_matrix.shape[1])
+        )
+        with METRICS.time_stage('hybrid_recommend'):
+            rows, scores = hybrid.recommend_rows_for_seed(
+                request.user_id, seed_vector, np.asarray(request.factors), rated, top_n=request.num_recommendations,
+                seed_row=hybrid.content_recommender.book_indices.get(request.book_id)
+            )
+    numbers = book_numbers(current, rows, scores)
+    numbers['catalog_row'] = catalog_rows(current.books_df, rows)
+    return current.serializer.response('json', 'recommendations', rows, numbers)
+
+@app.get("/shard/search")
+async def search_shard(query: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=10000)):
+    """This shard's first `limit` matches with their BM25 score and catalog_row, and its total matches"""
+    return await run_blocking(snapshot.search_executor, _shard_search, query, limit)
+
+def _shard_search(query, limit):
+    current = snapshot
+
+    def compute():
+        positions, scores, total = current.search_index.scored_search(query, limit=limit)
+        numbers = book_numbers(current, positions, scores)
+        numbers['catalog_row'] = catalog_rows(current.books_df, positions)
+        return current.serializer.response('json', 'results', positions, numbers, total=total)
+
+    revision = aggregates_revision(current)
+    return cached_response(('shard-search', current.version, revision, query, limit), compute,
+                           local_only=bool(revision))
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit, miss, eviction and size counts of the local and shared result cache tiers"""
+    if result_cache is None:
+        return {"enabled": False}
+    stats = await asyncio.get_running_loop().run_in_executor(None, result_cache.stats)
+    return {"enabled": True, "model_version": snapshot.version, **stats}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latency histograms and counters in the Prometheus text format"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slowest", response_class=PlainTextResponse)
+async def get_slowest_requests():
+    """Sampled stacks of the slowest requests, in collapsed format for flamegraph.pl or speedscope"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is off; set BOOKMATCH_PROFILE_SLOWEST")
+    return PlainTextResponse(profiler.folded())
+
 if __name__ == "__main__":
-    uvicorn.run("book_recommender_api:app", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Book Recommendation API")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("serve", help="Run the API server (default)")
+    build_parser = subparsers.add_parser("build-artifacts", help="Train the models and save them for fast startup")
+    build_parser.add_argument("--output", default="artifacts", help="Artifact directory to write")
+    build_parser.add_argument("--content-index-k", type=int, default=CONTENT_INDEX_K,
+                              help="Also precompute the top-K content similarity index")
+    build_parser.add_argument("--no-ann-index", action="store_true",
+                              help="Skip the approximate nearest-neighbour index over item factors")
+    build_parser.add_argument("--trainer", choices=COLLABORATIVE_TRAINERS, default=COLLABORATIVE_TRAINER,
+                              help="Collaborative filtering trainer")
+    build_parser.add_argument("--implicit-zeros", action="store_true", default=IMPLICIT_ZEROS,
+                              help="With --trainer als, treat 0 ratings as implicit feedback")
+    build_parser.add_argument("--content-vectors", choices=CONTENT_VECTOR_MODES, default=CONTENT_VECTORS,
+                              help="Content vectors: fitted TF-IDF vocabulary or feature hashing")
+    materialize_parser = subparsers.add_parser(
+        "materialize", help="Precompute every rated user's recommendations from the artifacts (e.g. nightly)"
+    )
+    materialize_parser.add_argument("--artifacts", default=ARTIFACTS_PATH or "artifacts",
+                                    help="Artifact directory the API serves")
+    materialize_parser.add_argument("--output", default=MATERIALIZED_PATH or "materialized",
+                                    help="Directory to write")
+    materialize_parser.add_argument("--top-n", type=int, default=50,
+                                    help="Recommendations stored per user; larger requests are scored live")
+    materialize_parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: all cores)")
+    materialize_parser.add_argument("--chunk-size", type=int, default=1024, help="Users per worker task")
+    args = parser.parse_args()
+
+    if args.command == "build-artifacts":
+        build_artifacts(args.output, content_index_k=args.content_index_k, ann_index=not args.no_ann_index,
+                        trainer=args.trainer, implicit_zeros=args.implicit_zeros,
+                        content_vectors=args.content_vectors)
+        print(f"Model artifacts written to {args.output}")
+    elif args.command == "materialize":
+        books_df, ratings_df, _, hybrid = load_artifacts(args.artifacts)
+        user_index = UserRatingIndex(ratings_df, hybrid.collaborative_recommender.item_ids)
+        started = time.perf_counter()
+        n_covered = materialize_recommendations(args.output, hybrid, user_index, serving_version(args.artifacts),
+                                                top_n=args.top_n, chunk_size=args.chunk_size, n_jobs=args.jobs)
+        print(f"Recommendations for {n_covered} of {len(user_index.user_ids)} users written to {args.output} "
+              f"in {time.perf_counter() - started:.1f}s")
+    else:
+        uvicorn.run("book_recommender_api:app", host="0.0.0.0", port=8000, reload=True)
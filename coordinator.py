@@ -0,0 +1,167 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel
+
+from executors import BoundedExecutor, ExecutorSaturated
+from metrics import METRICS
+from serialization import dumps
+from sharding import ShardCoordinator, ShardError, ShardUnavailable
+
+# -------------------- Scatter-Gather Coordinator API --------------------
+
+# Comma-separated base URLs of the catalog shards in shard order: the i-th is a
+# book_recommender_api started with BOOKMATCH_SHARD=i/<number of URLs>
+SHARD_URLS = [url.strip() for url in os.environ.get('BOOKMATCH_SHARDS', '').split(',') if url.strip()]
+
+# Seconds to wait for the shards; later ones are left out of a partial result
+SHARD_TIMEOUT = float(os.environ.get('BOOKMATCH_SHARD_TIMEOUT', '0.5'))
+
+# Seconds between shard health checks
+SHARD_HEALTH_INTERVAL = float(os.environ.get('BOOKMATCH_SHARD_HEALTH_INTERVAL', '5'))
+
+# Requests fanned out at once, each holding a thread while it waits for its shards
+COORDINATOR_THREADS = int(os.environ.get('BOOKMATCH_COORDINATOR_THREADS', '32'))
+
+# Book lists per rail the shards precompute (their BOOKMATCH_RAIL_SIZE)
+RAIL_SIZE = int(os.environ.get('BOOKMATCH_RAIL_SIZE', '100'))
+
+app = FastAPI(title="Book Recommendation Coordinator",
+              description="Fans requests out to the catalog shards and merges their answers")
+
+class RatingRequest(BaseModel):
+    user_id: int
+    book_id: str
+    rating: float
+
+coordinator = None
+executor = None
+background_tasks = []
+
+@app.on_event("startup")
+async def startup_event():
+    global coordinator, executor
+    if not SHARD_URLS:
+        raise RuntimeError("Set BOOKMATCH_SHARDS to the comma-separated shard URLs")
+    coordinator = ShardCoordinator(SHARD_URLS, timeout=SHARD_TIMEOUT, pool_size=COORDINATOR_THREADS)
+    # A recommendation waits for up to two seed lookups and the scatter, each bounded by SHARD_TIMEOUT
+    executor = BoundedExecutor(ThreadPoolExecutor(max_workers=COORDINATOR_THREADS, thread_name_prefix='coordinate'),
+                               max_pending=COORDINATOR_THREADS * 2, timeout=SHARD_TIMEOUT * 3 + 1.0)
+    for status in await asyncio.get_running_loop().run_in_executor(None, coordinator.check_health):
+        print(f"Shard {status.get('url')}: {status['state']} {status.get('error', '')}")
+    background_tasks.append(asyncio.create_task(_check_shards()))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    executor.shutdown()
+    coordinator.shutdown()
+
+async def _check_shards():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SHARD_HEALTH_INTERVAL)
+        try:
+            await loop.run_in_executor(None, coordinator.check_health)
+        except Exception as e:
+            print(f"Shard health check failed: {e}")
+
+async def run_coordinated(fn, *args):
+    """Await fn(*args) on the coordinator threads, mapping shard failures to HTTP errors"""
+    try:
+        return await executor.run(fn, *args)
+    except ExecutorSaturated:
+        METRICS.increment('rejected_requests_total')
+        raise HTTPException(status_code=429, detail="Server busy, retry shortly")
+    except asyncio.TimeoutError:
+        METRICS.increment('timed_out_requests_total')
+        raise HTTPException(status_code=504, detail="Request timed out")
+    except ShardError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def merged_response(list_name, books, missing, **fields):
+    """JSON body of a merged book list; 503 when no shard answered"""
+    if len(missing) == coordinator.n_shards:
+        raise HTTPException(status_code=503, detail="No shard answered in time")
+    content = {list_name: books, **fields, 'partial': bool(missing), 'missing_shards': missing}
+    return Response(dumps(content), media_type="application/json")
+
+def _recommend(user_id, book_id, num_recommendations):
+    with METRICS.time_stage('coordinator_recommendations'):
+        books, missing = coordinator.recommend(user_id, book_id, num_recommendations)
+    return merged_response('recommendations', books, missing)
+
+@app.get("/recommendations/")
+async def get_recommendations(user_id: int, book_id: Optional[str] = None,
+                              num_recommendations: int = Query(10, ge=1)):
+    """Each shard's top books for the user and seed book, merged by hybrid score"""
+    return await run_coordinated(_recommend, user_id, book_id, num_recommendations)
+
+def _search(query, limit, offset):
+    with METRICS.time_stage('coordinator_search'):
+        books, total, missing = coordinator.search(query, limit, offset)
+    return merged_response('results', books, missing, total=total)
+
+@app.get("/books/search/")
+async def search_books(query: str = Query(..., min_length=3),
+                       limit: int = Query(20, ge=1, le=1000),
+                       offset: int = Query(0, ge=0)):
+    """Every shard's matches merged by BM25 score, ties in catalog order"""
+    return await run_coordinated(_search, query, limit, offset)
+
+def _rail(path, limit, params):
+    with METRICS.time_stage('coordinator_rails'):
+        books, year, missing = coordinator.rail(path, limit, params)
+    return merged_response('books', books, missing, year=year)
+
+@app.get("/books/popular")
+async def get_popular_books(limit: int = Query(10, ge=1, le=RAIL_SIZE),
+                            year: Optional[str] = None, author: Optional[str] = None):
+    params = {name: value for name, value in (('year', year), ('author', author)) if value is not None}
+    return await run_coordinated(_rail, '/books/popular', limit, params)
+
+@app.get("/books/trending")
+async def get_trending_books(limit: int = Query(10, ge=1, le=RAIL_SIZE)):
+    return await run_coordinated(_rail, '/books/trending', limit, None)
+
+@app.get("/books/new-releases")
+async def get_new_releases(limit: int = Query(10, ge=1, le=RAIL_SIZE)):
+    return await run_coordinated(_rail, '/books/new-releases', limit, None)
+
+def _add_rating(rating):
+    queued = coordinator.add_rating(rating)
+    return {"status": "accepted", "queued_shards": queued}
+
+@app.post("/ratings", status_code=202)
+async def add_rating(rating: RatingRequest):
+    """
+    Record a rating on every shard, since each keeps every user's history; shards
+    that miss it get it replayed once they are healthy again
+    """
+    return await run_coordinated(_add_rating, {"user_id": rating.user_id, "book_id": rating.book_id,
+                                                  "rating": rating.rating})
+
+@app.get("/health")
+async def get_health():
+    """Last health check of every shard; 503 when none is up"""
+    shards = list(coordinator.status)
+    n_up = sum(status['state'] == 'up' for status in shards)
+    state = 'ok' if n_up == len(shards) else 'degraded' if n_up else 'down'
+    body = dumps({"status": state, "shards": shards})
+    return Response(body, status_code=503 if state == 'down' else 200, media_type="application/json")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Scatter latency, shard error, timeout and partial-response counters in the Prometheus text format"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    uvicorn.run("coordinator:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,41 @@
+import asyncio
+
+# -------------------- Request Executors --------------------
+
+class ExecutorSaturated(Exception):
+    """Raised when an executor already has max_pending jobs queued or running"""
+
+
+class BoundedExecutor:
+    """
+    Runs blocking request work on a thread or process pool from async handlers.
+
+    At most max_pending jobs may be queued or running at once; beyond that run()
+    raises ExecutorSaturated straight away so the handler can answer 429 instead
+    of letting the backlog grow. A job that does not finish within `timeout`
+    seconds raises asyncio.TimeoutError; if it had not started yet it is
+    cancelled, otherwise it keeps its slot until it completes.
+    """
+
+    def __init__(self, executor, max_pending=64, timeout=10.0):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def run(self, fn, *args):
+        # Only the event loop thread touches self.pending, so no lock is needed
+        if self.pending >= self.max_pending:
+            raise ExecutorSaturated()
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(fn, *args)
+        self.pending += 1
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def shutdown(self, cancel_futures=True):
+        """Stop taking jobs; queued ones are cancelled unless cancel_futures is False"""
+        self.executor.shutdown(wait=False, cancel_futures=cancel_futures)
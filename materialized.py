@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# -------------------- Materialized Recommendations --------------------
+
+MATERIALIZED_FORMAT_VERSION = 1
+
+# Largest user id the dense user table may cover: 4 bytes per id up to the maximum
+MAX_USER_ID = 2**26
+
+
+class MaterializedRecommendations:
+    """
+    Top-N recommendations precomputed offline for every active user, read from
+    memory-mapped arrays.
+
+    rows[i] holds one user's books_df rows, best first and padded with -1, and
+    scores[i] their hybrid scores. user_rows is a dense table indexed by user id
+    whose entry is that user's row i, or -1 for users without precomputed
+    recommendations, so a lookup is two array reads whatever the number of
+    users. The manifest records the serving version (data and artifacts) the
+    recommendations were computed from and when.
+    """
+
+    def __init__(self, rows, scores, user_rows, manifest):
+        self.rows = rows
+        self.scores = scores
+        self.user_rows = user_rows
+        self.manifest = manifest
+        self.top_n = rows.shape[1]
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['format_version'] != MATERIALIZED_FORMAT_VERSION:
+            raise RuntimeError(f"Materialized recommendations in {path} have format version "
+                               f"{manifest['format_version']}, expected {MATERIALIZED_FORMAT_VERSION}")
+        arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in ('rows', 'scores', 'user_rows')]
+        return cls(*arrays, manifest)
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    def lookup(self, user_id, top_n):
+        """(books_df rows, scores) of the user's top_n, or None if not precomputed for this user or this many"""
+        if not 1 <= top_n <= self.top_n or not 0 <= user_id < len(self.user_rows):
+            return None
+        row = self.user_rows[user_id]
+        if row < 0:
+            return None
+        rows = np.asarray(self.rows[row, :top_n])
+        found = rows >= 0
+        return rows[found], np.asarray(self.scores[row, :top_n])[found]
+
+    def stats(self):
+        """What the store holds and how old it is, for the status endpoint"""
+        return {
+            'version': self.version,
+            'created_at': self.manifest['created_at'],
+            'age_seconds': time.time() - self.manifest['created_at'],
+            'build_seconds': self.manifest.get('build_seconds'),
+            'top_n': self.top_n,
+            'users': self.manifest['users'],
+            'active_users': self.manifest['active_users'],
+            'bytes': self.rows.nbytes + self.scores.nbytes + self.user_rows.nbytes,
+        }
+
+
+def save_materialized(path, user_ids, rows, scores, version, active_users, build_seconds=None):
+    """
+    Write a MaterializedRecommendations directory: rows and scores are
+    (len(user_ids), top_n) arrays, rows padded with -1 where a user has fewer
+    recommendations. Users whose row is all -1 are left out of the user table.
+    Written next to `path` and renamed into place, so readers never see a partial store.
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    if len(user_ids) and (user_ids.min() < 0 or user_ids.max() >= MAX_USER_ID):
+        raise ValueError(f"User ids must be in [0, {MAX_USER_ID}) for the dense user table")
+    covered = rows[:, 0] >= 0 if rows.shape[1] else np.zeros(len(user_ids), dtype=bool)
+    user_rows = np.full(int(user_ids.max()) + 1 if len(user_ids) else 0, -1, dtype=np.int32)
+    user_rows[user_ids[covered]] = np.flatnonzero(covered)
+
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'rows.npy'), np.ascontiguousarray(rows, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'scores.npy'), np.ascontiguousarray(scores, dtype=np.float32))
+    np.save(os.path.join(tmp_path, 'user_rows.npy'), user_rows)
+    manifest = {
+        'format_version': MATERIALIZED_FORMAT_VERSION,
+        'created_at': time.time(),
+        'version': version,
+        'top_n': rows.shape[1],
+        'users': int(covered.sum()),
+        'active_users': int(active_users),
+        'build_seconds': build_seconds,
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
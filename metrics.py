@@ -0,0 +1,181 @@
+import heapq
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# -------------------- Metrics --------------------
+
+# Upper bounds (seconds) of the latency histogram buckets; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram: observe() is a bisect and two additions under a lock"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and named counters for the request hot path,
+    rendered in the Prometheus text exposition format by render().
+    """
+
+    def __init__(self, prefix='bookmatch'):
+        self.prefix = prefix
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.stages.setdefault(stage, Histogram())
+        return histogram
+
+    def time_stage(self, stage):
+        """Context manager recording the wall time of the block under `stage`"""
+        return _StageTimer(self._histogram(stage))
+
+    def observe_stage(self, stage, seconds):
+        self._histogram(stage).observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def render(self):
+        name = f'{self.prefix}_stage_seconds'
+        lines = [f'# HELP {name} Time spent in each request stage.', f'# TYPE {name} histogram']
+        for stage, histogram in sorted(self.stages.items()):
+            with histogram.lock:
+                counts, total = list(histogram.counts), histogram.sum
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for counter, value in counters:
+            lines.append(f'# TYPE {self.prefix}_{counter} counter')
+            lines.append(f'{self.prefix}_{counter} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+# -------------------- Sampling Profiler --------------------
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler that keeps the stacks of the slowest N requests.
+
+    A single daemon thread samples the Python stacks of the threads currently
+    inside track() every `interval` seconds. folded() renders the kept requests
+    in the collapsed-stack format read by flamegraph.pl and speedscope, with each
+    request's label and duration as the root frame.
+    """
+
+    def __init__(self, n_slowest=10, interval=0.005):
+        self.n_slowest = n_slowest
+        self.interval = interval
+        self.active = {}
+        self.slowest = []  # min-heap of (duration, sequence, label, stacks)
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._sample_loop, name='slow-request-profiler', daemon=True)
+            self.thread.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in list(self.active.items()):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                    frame = frame.f_back
+                if stack:
+                    stacks[';'.join(reversed(stack))] += 1
+
+    def track(self, label):
+        return _TrackedRequest(self, label)
+
+    def _finish(self, label, duration, stacks):
+        with self.lock:
+            self.sequence += 1
+            entry = (duration, self.sequence, label, stacks)
+            if len(self.slowest) < self.n_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def folded(self):
+        with self.lock:
+            entries = sorted(self.slowest, reverse=True)
+        lines = []
+        for duration, _, label, stacks in entries:
+            root = f'{label} ({duration * 1000:.1f}ms)'.replace(';', ',')
+            lines.extend(f'{root};{stack} {count}' for stack, count in stacks.items())
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.folded())
+
+
+class _TrackedRequest:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.profiler.active[self.thread_id] = self.stacks
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.active.pop(self.thread_id, None)
+        self.profiler._finish(self.label, time.perf_counter() - self.started, self.stacks)
+        return False
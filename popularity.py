@@ -0,0 +1,184 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# -------------------- Popularity Aggregates --------------------
+
+def _ranked(primary, secondary, positions, top_n=None):
+    """positions ordered by primary then secondary score, both descending, ties by position"""
+    if top_n is not None and len(positions) > top_n:
+        # Only candidates at or above the top_n-th primary score can make the list
+        cutoff = np.partition(primary[positions], len(positions) - top_n)[len(positions) - top_n]
+        positions = positions[primary[positions] >= cutoff]
+    order = np.lexsort((positions, -secondary[positions], -primary[positions]))
+    return positions[order][:top_n]
+
+
+class BookAggregates:
+    """
+    Per-book rating aggregates and precomputed top-N lists for the popularity,
+    trending and cold-start rails.
+
+    Built once from ratings_df and updated in O(1) per rating with add_rating.
+    Book-Crossing 0 ratings ("interacted, did not rate") count as interactions but
+    not towards the mean. The smoothed rating is the Bayesian mean: prior_count
+    pseudo-ratings at the global mean are added to every book, so one 10 does not
+    outrank a hundred 9s. Trending counts interactions with weights that halve
+    every half_life_days; the data files carry no times, so loaded ratings count
+    as of the build. The prior mean is the mean explicit rating of books_df's books
+    unless global_mean is given, as catalog shards give the whole catalog's.
+
+    Lists are kept overall (by smoothed rating and by trending), per publication
+    year and per author; a lookup is a slice of a cached array. add_rating marks
+    the lists the book is on stale, and the next lookup re-sorts only those.
+    """
+
+    def __init__(self, books_df, ratings_df, prior_count=10, half_life_days=7, top_n=100, now=None,
+                 global_mean=None):
+        self.prior_count = prior_count
+        self.half_life = half_life_days * 86400
+        self.top_n = top_n
+        # Trending weights are stored relative to the build time, so aging every book
+        # is one shared factor applied at read time rather than an update per book
+        self.epoch = time.time() if now is None else now
+        self.lock = threading.Lock()
+        self.revision = 0
+
+        first = ~books_df['book_id'].duplicated().to_numpy()
+        self.rows = np.flatnonzero(first)
+        self.book_index = pd.Index(books_df['book_id'].to_numpy()[first])
+        # Position of every books_df row's book, duplicates included
+        self.row_positions = self.book_index.get_indexer(books_df['book_id'])
+        n_books = len(self.book_index)
+
+        positions = self._positions(ratings_df['book_id'])
+        ratings = ratings_df['rating'].to_numpy()
+        known = positions >= 0
+        positions, ratings = positions[known], ratings[known]
+        explicit = ratings > 0
+        self.interaction_counts = np.bincount(positions, minlength=n_books).astype(np.int64)
+        self.rating_counts = np.bincount(positions[explicit], minlength=n_books).astype(np.int64)
+        self.rating_sums = np.bincount(positions[explicit], weights=ratings[explicit], minlength=n_books)
+        self.trending_weights = self.interaction_counts.astype(np.float64)
+        n_explicit = self.rating_counts.sum()
+        if global_mean is None:
+            global_mean = float(self.rating_sums.sum() / n_explicit) if n_explicit else 0.0
+        self.global_mean = global_mean
+        self.smoothed = self._smoothed(slice(None))
+
+        # Year and author groups, CSR-style: group g owns members[offsets[g]:offsets[g + 1]],
+        # kept sorted best first
+        books = books_df.iloc[self.rows]
+        group_values = {
+            'year': books['published_date'].astype(str).str.strip(),
+            'author': books['authors'].astype(str).str.strip().str.lower(),
+        }
+        self.groups = {}
+        all_positions = np.arange(n_books)
+        for rail, values in group_values.items():
+            codes, keys = pd.factorize(values)
+            order = np.lexsort((all_positions, -self.interaction_counts, -self.smoothed, codes))
+            offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=len(keys)), out=offsets[1:])
+            self.groups[rail] = {
+                'codes': codes, 'offsets': offsets, 'members': order,
+                'keys': {key: code for code, key in enumerate(keys)},
+            }
+        self.lists = {
+            'rating': _ranked(self.smoothed, self.interaction_counts, all_positions, top_n),
+            'trending': _ranked(self.trending_weights, self.smoothed, all_positions, top_n),
+        }
+        self.stale = set()
+
+    def _positions(self, book_ids):
+        """Positions of book ids in book_index, -1 for books outside the catalog"""
+        if isinstance(book_ids.dtype, pd.CategoricalDtype):
+            # Map each category once; code -1 (missing) picks the appended -1
+            category_positions = self.book_index.get_indexer(book_ids.cat.categories)
+            return np.append(category_positions, -1)[book_ids.cat.codes.to_numpy()]
+        return self.book_index.get_indexer(book_ids)
+
+    def _smoothed(self, positions):
+        prior = self.prior_count
+        return (self.rating_sums[positions] + prior * self.global_mean) / (self.rating_counts[positions] + prior)
+
+    def add_rating(self, book_id, rating, timestamp=None, previous=None):
+        """
+        Count a new rating of book_id. previous is the same user's earlier rating of
+        the book, if any, which the new one replaces.
+        """
+        position = self.book_index.get_indexer([book_id])[0]
+        if position < 0:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if previous is None:
+                self.interaction_counts[position] += 1
+            elif previous > 0:
+                self.rating_counts[position] -= 1
+                self.rating_sums[position] -= previous
+            if rating > 0:
+                self.rating_counts[position] += 1
+                self.rating_sums[position] += rating
+            self.trending_weights[position] += 2.0 ** ((timestamp - self.epoch) / self.half_life)
+            self.smoothed[position] = self._smoothed(position)
+            self.stale.update([('rating', None), ('trending', None),
+                               ('year', self.groups['year']['codes'][position]),
+                               ('author', self.groups['author']['codes'][position])])
+            self.revision += 1
+
+    def _refresh(self):
+        positions = np.arange(len(self.book_index))
+        for rail, code in self.stale:
+            if rail == 'rating':
+                self.lists[rail] = _ranked(self.smoothed, self.interaction_counts, positions, self.top_n)
+            elif rail == 'trending':
+                self.lists[rail] = _ranked(self.trending_weights, self.smoothed, positions, self.top_n)
+            else:
+                group = self.groups[rail]
+                members = slice(group['offsets'][code], group['offsets'][code + 1])
+                group['members'][members] = _ranked(self.smoothed, self.interaction_counts,
+                                                     np.sort(group['members'][members]))
+        self.stale.clear()
+
+    def trending_scores(self, positions, now=None):
+        """Decayed interaction counts as of now"""
+        now = time.time() if now is None else now
+        return self.trending_weights[positions] * 2.0 ** (-(now - self.epoch) / self.half_life)
+
+    def top(self, rail='rating', key=None):
+        """
+        (books_df rows, scores) of the rail's top books, best first: 'rating' and
+        'trending' overall, or 'year' / 'author' for one key (empty if unknown).
+        Scores are smoothed ratings, or decayed interaction counts for 'trending'.
+        """
+        with self.lock:
+            if self.stale:
+                self._refresh()
+            if rail in self.lists:
+                positions = self.lists[rail]
+            else:
+                group = self.groups[rail]
+                code = group['keys'].get(str(key).strip().lower() if rail == 'author' else str(key).strip())
+                if code is None:
+                    positions = np.array([], dtype=np.int64)
+                else:
+                    start = group['offsets'][code]
+                    positions = group['members'][start:min(start + self.top_n, group['offsets'][code + 1])].copy()
+            scores = self.trending_scores(positions) if rail == 'trending' else self.smoothed[positions]
+        return self.rows[positions], scores
+
+    def newest_year(self, now=None):
+        """Latest publication year in the catalog that is not in the future, or None"""
+        this_year = time.localtime(time.time() if now is None else now).tm_year
+        years = [int(key) for key in self.groups['year']['keys'] if key.isdigit() and 0 < int(key) <= this_year]
+        return str(max(years)) if years else None
+
+    def rating_stats(self, rows):
+        """(mean explicit rating, explicit rating count) of the books at books_df rows; 0.0 for unrated books"""
+        positions = self.row_positions[rows]
+        counts = self.rating_counts[positions]
+        sums = self.rating_sums[positions]
+        return np.divide(sums, counts, out=np.zeros(len(counts)), where=counts > 0), counts
@@ -0,0 +1,249 @@
+import fcntl
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+# -------------------- Result Cache --------------------
+
+class ResultCache:
+    """
+    LRU cache of serialized responses (bytes) with a memory budget and a TTL.
+
+    Entries are evicted least-recently-used first once the stored bytes exceed
+    max_bytes, and expire ttl seconds after being set. Keys should include the
+    model/data version so a refit or reload makes old entries unreachable; they
+    then age out through LRU and TTL.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.size -= len(value)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+            }
+
+# -------------------- Shared Cache Tier --------------------
+
+_shared_cache = None
+
+def _shared_result_cache(max_bytes, ttl):
+    # Runs inside the cache server process: every client gets the same instance
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResultCache(max_bytes=max_bytes, ttl=ttl)
+    return _shared_cache
+
+
+class CacheManager(BaseManager):
+    pass
+
+
+CacheManager.register('result_cache', callable=_shared_result_cache)
+
+
+# The cache server unpickles what its clients send, so it only listens on loopback or a unix socket
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+def parse_shared_address(address):
+    """
+    (host, port) of a loopback "host:port", or a unix socket path as given;
+    ValueError for any other host
+    """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        host = host.strip('[]')
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"Shared cache address {address!r} must be a loopback host:port or a unix socket path")
+        return host, int(port)
+    return address
+
+
+def connect_shared_cache(address, authkey, max_bytes, ttl):
+    """
+    (manager, proxy, whether this call started the server) for the ResultCache
+    held by the local cache server at `address`, starting the server in a child
+    process if nobody is serving there yet. The child is spawned rather than
+    forked, so it holds none of the worker's sockets (such as the port it serves
+    on) open.
+    """
+    if not isinstance(address, str):
+        return _connect_or_start(address, authkey, max_bytes, ttl)
+    # Workers take turns, so only one starts a server or clears a dead one's socket file
+    with open(address + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _connect_or_start(address, authkey, max_bytes, ttl)
+
+
+def _connect_or_start(address, authkey, max_bytes, ttl):
+    manager = CacheManager(address=address, authkey=authkey, ctx=multiprocessing.get_context('spawn'))
+    try:
+        manager.connect()
+        return manager, manager.result_cache(max_bytes, ttl), False
+    except (ConnectionRefusedError, FileNotFoundError) as e:
+        if isinstance(address, str) and isinstance(e, ConnectionRefusedError):
+            # Socket file left by a server that died with the worker that started it
+            os.unlink(address)
+    try:
+        manager.start()
+    except (EOFError, OSError):
+        # Another worker won the race to bind the address
+        manager = CacheManager(address=address, authkey=authkey)
+        manager.connect()
+        return manager, manager.result_cache(max_bytes, ttl), False
+    if isinstance(address, str):
+        os.chmod(address, 0o600)
+    return manager, manager.result_cache(max_bytes, ttl), True
+
+
+class TieredCache:
+    """
+    In-process ResultCache in front of an optional ResultCache shared by every
+    worker through a local cache server. Failures of the shared tier are counted
+    and otherwise ignored, so it can never take requests down: the connection is
+    dropped and reopened at most every retry_interval seconds, starting a new
+    server if the worker that ran the old one has died.
+
+    shared_address is a loopback (host, port) or a unix socket path, and authkey
+    a secret every worker shares; entries with local_only keys never leave the
+    process.
+    """
+
+    def __init__(self, local_bytes=64 * 2**20, ttl=300.0, shared_address=None,
+                 shared_bytes=256 * 2**20, authkey=None, retry_interval=5.0):
+        if shared_address is not None and not authkey:
+            raise ValueError("A shared cache tier needs a secret authkey")
+        self.local = ResultCache(max_bytes=local_bytes, ttl=ttl)
+        self.ttl = ttl
+        self.shared_address = shared_address
+        self.shared_bytes = shared_bytes
+        self.authkey = authkey
+        self.retry_interval = retry_interval
+        self.shared_errors = 0
+        self._shared = None
+        self._shared_pid = None
+        self._retry_at = 0.0
+        self._manager = None
+        self._owns_server = False
+        self._shared_lock = threading.Lock()
+
+    def _shared_cache(self):
+        if self.shared_address is None:
+            return None
+        # Proxies cannot cross a fork, so each process opens its own connection
+        if self._shared_pid != os.getpid():
+            with self._shared_lock:
+                if self._shared_pid != os.getpid():
+                    if time.monotonic() < self._retry_at:
+                        return None
+                    try:
+                        self._manager, self._shared, self._owns_server = connect_shared_cache(
+                            self.shared_address, self.authkey, self.shared_bytes, self.ttl
+                        )
+                    except Exception:
+                        self._retry_at = time.monotonic() + self.retry_interval
+                        raise
+                    self._shared_pid = os.getpid()
+        return self._shared
+
+    def _shared_failed(self):
+        """Count a shared-tier failure and drop the connection, so the next call past the retry delay reconnects"""
+        with self._shared_lock:
+            self.shared_errors += 1
+            self._shared = self._manager = self._shared_pid = None
+            self._retry_at = time.monotonic() + self.retry_interval
+
+    def get(self, key, local_only=False):
+        value = self.local.get(key)
+        if value is not None or local_only:
+            return value
+        try:
+            shared = self._shared_cache()
+            value = shared.get(key) if shared is not None else None
+        except Exception:
+            self._shared_failed()
+            return None
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value, local_only=False):
+        self.local.set(key, value)
+        if local_only:
+            return
+        try:
+            shared = self._shared_cache()
+            if shared is not None:
+                shared.set(key, value)
+        except Exception:
+            self._shared_failed()
+
+    def stats(self):
+        stats = {'local': self.local.stats()}
+        try:
+            shared = self._shared_cache()
+            if shared is not None:
+                stats['shared'] = shared.stats()
+        except Exception:
+            self._shared_failed()
+        stats['shared_errors'] = self.shared_errors
+        return stats
+
+    def close(self):
+        """
+        Stop the cache server if this process started it; the other workers start
+        a new one on their next miss. For shutdown paths that skip atexit
+        handlers, such as uvicorn re-raising SIGTERM.
+        """
+        with self._shared_lock:
+            if self._owns_server and self._shared_pid == os.getpid():
+                self._manager.shutdown()
+            self._shared = self._manager = self._shared_pid = None
+            self._owns_server = False
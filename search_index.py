@@ -0,0 +1,156 @@
+import numpy as np
+from bisect import bisect_left
+from sklearn.feature_extraction.text import CountVectorizer
+
+# -------------------- Inverted Index Search --------------------
+
+class BookSearchIndex:
+    """
+    In-process full-text search over book titles and authors.
+
+    Two inverted indexes are built once from the catalog, both stored CSR-style as
+    sorted int32 document (row position) arrays per term:
+
+    - a token index, tokenised with the ContentBasedRecommender analyzer so search
+      and content similarity agree on terms (the vocabulary is this index's own),
+      used for BM25 ranking and prefix (type-ahead) matching of the last query word;
+    - a character-trigram index used to find case-insensitive substring matches,
+      which keeps the behaviour of the old str.contains search.
+    """
+
+    def __init__(self, books_df, analyzer=None, k1=1.2, b=0.75, rows=None):
+        """
+        With `rows`, only those books_df rows are indexed (document i is rows[i]),
+        but the BM25 statistics still come from the whole of books_df, so shards
+        indexing different rows of one catalog give comparable scores.
+        """
+        self.k1 = k1
+        self.b = b
+        # Title and author joined by '\0', which no field contains: a substring of a document
+        # without '\0' is a substring of one of its fields
+        documents = [str(title).lower() + '\0' + str(author).lower()
+                     for title, author in zip(books_df['title'], books_df['authors'])]
+
+        token_vectorizer = CountVectorizer(analyzer=analyzer) if analyzer else CountVectorizer()
+        self.analyzer = token_vectorizer.build_analyzer()
+        token_counts = token_vectorizer.fit_transform(documents).tocsr()
+        n_catalog = token_counts.shape[0]
+        doc_freq = np.bincount(token_counts.indices, minlength=token_counts.shape[1])
+        catalog_lengths = np.asarray(token_counts.sum(axis=1)).ravel()
+        self.avg_doc_length = max(float(catalog_lengths.mean()), 1.0) if n_catalog else 1.0
+        if rows is not None:
+            token_counts = token_counts[rows]
+            documents = [documents[row] for row in rows]
+        self.documents = documents
+        self.n_docs = len(documents)
+        token_counts = token_counts.tocsc()
+        token_counts.sort_indices()
+        # get_feature_names_out is sorted, which is what prefix lookups need
+        self.tokens = list(token_vectorizer.get_feature_names_out())
+        self.token_offsets = token_counts.indptr.astype(np.int64)
+        self.token_docs = token_counts.indices.astype(np.int32)
+        self.token_tfs = token_counts.data.astype(np.float32)
+        self.doc_lengths = np.asarray(token_counts.sum(axis=1)).ravel().astype(np.float32)
+        self.idf = np.log(1 + (n_catalog - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+        trigram_vectorizer = CountVectorizer(analyzer='char', ngram_range=(3, 3), lowercase=False)
+        trigram_counts = trigram_vectorizer.fit_transform(documents).tocsc()
+        trigram_counts.sort_indices()
+        self.trigram_rows = trigram_vectorizer.vocabulary_
+        self.trigram_offsets = trigram_counts.indptr.astype(np.int64)
+        self.trigram_docs = trigram_counts.indices.astype(np.int32)
+
+    def _token_rows(self, token, prefix=False):
+        start = bisect_left(self.tokens, token)
+        if prefix:
+            return range(start, bisect_left(self.tokens, token + '\uffff', lo=start))
+        if start < len(self.tokens) and self.tokens[start] == token:
+            return range(start, start + 1)
+        return range(0)
+
+    def _token_postings(self, row):
+        start, stop = self.token_offsets[row], self.token_offsets[row + 1]
+        return self.token_docs[start:stop], self.token_tfs[start:stop]
+
+    def _substring_matches(self, query, known_matches=None):
+        needle = query.lower()
+        trigrams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+        if not trigrams or '\0' in needle:
+            return np.array([], dtype=np.int32)
+        postings = []
+        for trigram in trigrams:
+            row = self.trigram_rows.get(trigram)
+            if row is None:
+                return np.array([], dtype=np.int32)
+            postings.append(self.trigram_docs[self.trigram_offsets[row]:self.trigram_offsets[row + 1]])
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                break
+        if known_matches is not None:
+            candidates = np.setdiff1d(candidates, known_matches, assume_unique=True)
+        if len(needle) == 3 and not any(char.isspace() for char in needle):
+            # The needle is its own trigram (the index only rewrites whitespace runs), so
+            # its posting list is exactly the books containing it
+            return candidates
+        # Otherwise trigrams only narrow the candidates; confirm the substring is really there
+        documents = self.documents
+        found = np.fromiter((needle in documents[doc] for doc in candidates), dtype=bool, count=len(candidates))
+        return candidates[found]
+
+    def search(self, query, limit=20, offset=0):
+        """Return (row positions, total matches) for a query, best match first; see scored_search"""
+        positions, _, total = self.scored_search(query, limit=limit, offset=offset)
+        return positions, total
+
+    def scored_search(self, query, limit=20, offset=0):
+        """
+        Return (row positions, BM25 scores, total matches) for a query, best match first.
+
+        A book matches if the query is a substring of its title or author, or if it
+        contains every query term, the last term matched as a prefix unless the
+        query ends with a space. Matches are ranked by BM25 over the query terms,
+        ties in catalog order, and paged with limit/offset.
+        """
+        terms = self.analyzer(query)
+        prefix_last = bool(terms) and not query[-1:].isspace()
+        # Only books in the query terms' posting lists are touched, never a per-catalog array
+        scored_docs, contributions = [], []
+        term_matches = None
+        for i, term in enumerate(terms):
+            term_docs = []
+            for row in self._token_rows(term, prefix=prefix_last and i == len(terms) - 1):
+                docs, tfs = self._token_postings(row)
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+                scored_docs.append(docs)
+                contributions.append(self.idf[row] * tfs * (self.k1 + 1) / (tfs + norm))
+                term_docs.append(docs)
+            # A prefix expands to several tokens, whose posting lists can share books
+            if len(term_docs) == 1:
+                term_docs = term_docs[0]
+            else:
+                term_docs = np.unique(np.concatenate(term_docs)) if term_docs else np.array([], dtype=np.int32)
+            if term_matches is None:
+                term_matches = term_docs
+            else:
+                term_matches = np.intersect1d(term_matches, term_docs, assume_unique=True)
+
+        matches = self._substring_matches(query, known_matches=term_matches)
+        if term_matches is not None:
+            matches = np.union1d(matches, term_matches)
+        scores = self._match_scores(matches, scored_docs, contributions)
+        order = np.lexsort((matches, -scores))[offset:offset + limit]
+        return matches[order], scores[order], len(matches)
+
+    @staticmethod
+    def _match_scores(matches, scored_docs, contributions):
+        """BM25 score of each book in the sorted `matches`, summed over the postings it appears in"""
+        if not scored_docs or not len(matches):
+            return np.zeros(len(matches), dtype=np.float32)
+        docs = np.concatenate(scored_docs)
+        positions = np.minimum(np.searchsorted(matches, docs), len(matches) - 1)
+        found = matches[positions] == docs
+        return np.bincount(positions[found], weights=np.concatenate(contributions)[found],
+                           minlength=len(matches)).astype(np.float32)
@@ -0,0 +1,100 @@
+import json
+from itertools import repeat
+from json.encoder import encode_basestring_ascii
+
+import numpy as np
+
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:
+    HAVE_ORJSON = False
+
+try:
+    import pyarrow as pa
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+# -------------------- Response Serialization --------------------
+
+# Fixed fields of every book in a response, encoded once per book
+BOOK_FIELDS = ('book_id', 'title', 'authors', 'image_url')
+
+# Columnar responses for internal clients that send this in their Accept header
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(content):
+    """Compact JSON bytes of plain Python and NumPy values, with orjson when it is installed"""
+    if HAVE_ORJSON:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, separators=(',', ':'), default=_json_default).encode()
+
+def loads(body):
+    """Parse JSON bytes or text, with orjson when it is installed"""
+    if HAVE_ORJSON:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def response_format(accept):
+    """'arrow' if the Accept header asks for Arrow and pyarrow is installed, else 'json'"""
+    return 'arrow' if HAVE_PYARROW and accept and ARROW_MEDIA_TYPE in accept else 'json'
+
+
+class BookSerializer:
+    """
+    Bodies of book-list responses built straight from arrays of books_df rows,
+    without DataFrame copies or a Pydantic model per row.
+
+    The JSON of each book's fixed fields is encoded once, into one ASCII buffer
+    with an offset per books_df row, so a response is its rows' fragments joined
+    with the per-response numbers (score, average rating, ...). The same rows
+    can be written as an Arrow IPC stream instead.
+    """
+
+    def __init__(self, books_df):
+        self.columns = {field: books_df[field].astype(str).to_numpy() for field in BOOK_FIELDS}
+        template = '{' + ','.join(f'"{field}":%s' for field in BOOK_FIELDS)
+        fragments = [template % tuple(map(encode_basestring_ascii, values))
+                     for values in zip(*self.columns.values())]
+        self.offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, fragments), dtype=np.int64, count=len(fragments)), out=self.offsets[1:])
+        self.text = ''.join(fragments)
+
+    def json_array(self, rows, numbers):
+        """JSON array of the books at `rows`; numbers maps extra field names to one finite value per row"""
+        rows = np.asarray(rows, dtype=np.int64)
+        text = self.text
+        template = ''.join(f',"{name}":%r' for name in numbers) + '}'
+        values = zip(*(np.asarray(column).tolist() for column in numbers.values())) if numbers else repeat(())
+        return ('[' + ','.join(
+            text[start:stop] + template % row_values
+            for start, stop, row_values in zip(self.offsets[rows].tolist(), self.offsets[rows + 1].tolist(), values)
+        ) + ']').encode()
+
+    def arrow(self, rows, numbers, metadata):
+        """Arrow IPC stream of the books at `rows`, with the top-level fields as JSON schema metadata"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {field: pa.array(values[rows], type=pa.string()) for field, values in self.columns.items()}
+        columns.update((name, pa.array(np.asarray(column))) for name, column in numbers.items())
+        table = pa.table(columns, metadata={key: dumps(value) for key, value in metadata.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def response(self, fmt, list_name, rows, numbers, **fields):
+        """
+        Body of a response holding the books at `rows` under list_name plus the
+        top-level `fields`, as JSON or, with fmt 'arrow', an Arrow stream
+        """
+        if fmt == 'arrow':
+            return self.arrow(rows, numbers, fields)
+        head = b'{"' + list_name.encode() + b'":' + self.json_array(rows, numbers)
+        return head + b''.join(b',' + dumps(key) + b':' + dumps(value) for key, value in fields.items()) + b'}'
+
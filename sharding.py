@@ -0,0 +1,269 @@
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+from serialization import loads
+
+# -------------------- Catalog Partitioning --------------------
+
+def shard_of(book_id, n_shards):
+    """Shard owning book_id: a CRC32 of the id, the same in every process and on every machine"""
+    return zlib.crc32(str(book_id).encode()) % n_shards
+
+def parse_shard(spec):
+    """(index, count) of an 'index/count' shard spec such as '0/4'"""
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count or 1)
+    if not 0 <= index < count:
+        raise ValueError(f"Shard spec {spec!r} must be 'index/count' with 0 <= index < count")
+    return index, count
+
+def shard_rows(book_ids, index, count):
+    """Positions in book_ids of the books owned by shard `index` of `count`"""
+    owners = np.fromiter((shard_of(book_id, count) for book_id in book_ids), dtype=np.int64, count=len(book_ids))
+    return np.flatnonzero(owners == index)
+
+# -------------------- Scatter-Gather Coordinator --------------------
+
+class ShardError(Exception):
+    """A shard answered with an error status; detail is its message"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ShardUnavailable(Exception):
+    """The one shard a request needs is down or did not answer in time"""
+
+
+def merge_ranked(lists, limit, offset=0):
+    """
+    Merge per-shard book lists, each best first, into one page: highest score
+    first, ties in catalog order when the shards report catalog_row
+    """
+    books = [book for books in lists for book in books]
+    books.sort(key=lambda book: (-book.get('score', 0.0), book.get('catalog_row', 0)))
+    page = books[offset:offset + limit]
+    for book in page:
+        book.pop('catalog_row', None)
+    return page
+
+
+class ShardCoordinator:
+    """
+    Client side of a sharded catalog: every shard is a book_recommender_api
+    process started with BOOKMATCH_SHARD='i/n', owning the books that shard_of
+    maps to i, and shard_urls[i] is its address.
+
+    scatter() sends one request to every healthy shard at once and waits at most
+    `timeout` seconds; shards that are down, fail or are late are left out and
+    reported, so callers can answer with the partial result of the others.
+    check_health() polls every shard and verifies it serves the slot it is
+    configured for; a shard that fails a request is skipped until it passes a
+    check again.
+
+    Every shard must see every rating, so ratings a shard misses are queued for
+    it, up to max_pending_ratings, and replayed in order once it passes a health
+    check; until then its later ratings join the queue behind them.
+    """
+
+    def __init__(self, shard_urls, timeout=0.5, connect_timeout=0.5, pool_size=16, max_pending_ratings=100_000):
+        self.shard_urls = [url.rstrip('/') for url in shard_urls]
+        self.n_shards = len(self.shard_urls)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.n_shards, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size * self.n_shards, thread_name_prefix='shard')
+        self.lock = threading.Lock()
+        self.healthy = [True] * self.n_shards
+        self.status = [{'state': 'unknown'} for _ in self.shard_urls]
+        self.next_shard = 0
+        self.max_pending_ratings = max_pending_ratings
+        self.pending_ratings = [deque() for _ in self.shard_urls]
+
+    def owner(self, book_id):
+        return shard_of(book_id, self.n_shards)
+
+    def _call(self, shard, method, path, params=None, body=None, timeout=None):
+        response = self.session.request(method, self.shard_urls[shard] + path, params=params, json=body,
+                                        timeout=(self.connect_timeout, timeout or self.timeout))
+        if response.status_code >= 400:
+            try:
+                detail = loads(response.content)['detail']
+            except (ValueError, KeyError, TypeError):
+                detail = response.text
+            raise ShardError(response.status_code, detail)
+        return loads(response.content)
+
+    def _mark_down(self, shard, error):
+        with self.lock:
+            self.healthy[shard] = False
+            self.status[shard] = {'state': 'down', 'error': str(error)}
+
+    def scatter(self, method, path, params=None, body=None, shards=None):
+        """
+        ({shard: parsed response}, [missing shards]) of one request sent to every
+        healthy shard in parallel. A 4xx ShardError from any shard is raised.
+        """
+        shards = range(self.n_shards) if shards is None else shards
+        with self.lock:
+            targets = [shard for shard in shards if self.healthy[shard]]
+        futures = {self.executor.submit(self._call, shard, method, path, params, body): shard for shard in targets}
+        with METRICS.time_stage('scatter'):
+            done, late = wait(futures, timeout=self.timeout)
+        results, missing = {}, sorted(set(shards) - set(targets))
+        for future in done:
+            shard = futures[future]
+            try:
+                results[shard] = future.result()
+            except ShardError as e:
+                # A rejected request is the caller's to report; a failing shard is left out
+                if e.status_code < 500:
+                    raise
+                METRICS.increment('shard_errors_total')
+                missing.append(shard)
+            except Exception as e:
+                METRICS.increment('shard_errors_total')
+                self._mark_down(shard, e)
+                missing.append(shard)
+        METRICS.increment('shard_timeouts_total', len(late))
+        missing.extend(futures[future] for future in late)
+        if missing:
+            METRICS.increment('partial_responses_total')
+        return results, sorted(missing)
+
+    def call_one(self, shard, method, path, params=None, body=None):
+        """Parsed response of one shard; ShardUnavailable if it is down or misses the timeout"""
+        results, missing = self.scatter(method, path, params, body, shards=[shard])
+        if missing:
+            raise ShardUnavailable(f"Shard {shard} ({self.shard_urls[shard]}) is unavailable")
+        return results[shard]
+
+    def any_shard(self):
+        """A healthy shard, round-robin, for requests any shard can answer"""
+        with self.lock:
+            for _ in range(self.n_shards):
+                shard = self.next_shard
+                self.next_shard = (shard + 1) % self.n_shards
+                if self.healthy[shard]:
+                    return shard
+        raise ShardUnavailable("No shard is available")
+
+    def check_health(self):
+        """Poll every shard's /shard/health and update which are served; returns the per-shard status"""
+        futures = [self.executor.submit(self._call, shard, 'GET', '/shard/health') for shard in range(self.n_shards)]
+        for shard, future in enumerate(futures):
+            try:
+                health = future.result()
+                if (health['shard'], health['shards']) != (shard, self.n_shards):
+                    raise ValueError(f"serves shard {health['shard']}/{health['shards']}, "
+                                     f"configured as {shard}/{self.n_shards}")
+                status, healthy = {'state': 'up', **health}, True
+            except Exception as e:
+                status, healthy = {'state': 'down', 'error': str(e)}, False
+            with self.lock:
+                self.healthy[shard] = healthy
+                self.status[shard] = {'url': self.shard_urls[shard], **status}
+            if healthy:
+                self.replay_ratings(shard)
+        with self.lock:
+            for shard, pending in enumerate(self.pending_ratings):
+                self.status[shard]['pending_ratings'] = len(pending)
+        return list(self.status)
+
+    def replay_ratings(self, shard):
+        """Send a shard the ratings it missed, oldest first, stopping at the first failure"""
+        pending = self.pending_ratings[shard]
+        while pending:
+            try:
+                self._call(shard, 'POST', '/ratings', body=pending[0])
+            except ShardError as e:
+                if e.status_code >= 500:
+                    return
+                # Rejected outright: resending it cannot succeed
+                METRICS.increment('shard_ratings_dropped_total')
+            except Exception:
+                return
+            else:
+                METRICS.increment('shard_ratings_replayed_total')
+            with self.lock:
+                pending.popleft()
+
+    def seed(self, user_id, book_id=None):
+        """
+        The seed book of a recommendation request - book_id, else the user's
+        top-rated book - with its content vector and item factors from the shard
+        that owns it; book_id is None when the user needs cold-start picks
+        """
+        params = {'user_id': user_id}
+        if book_id is not None:
+            params['book_id'] = book_id
+        shard = self.any_shard() if book_id is None else self.owner(book_id)
+        seed = self.call_one(shard, 'GET', '/shard/seed', params)
+        if seed['book_id'] is not None and 'factors' not in seed:
+            # Any shard knows the user's history, but only the owner has the book's vectors
+            seed = self.call_one(self.owner(seed['book_id']), 'GET', '/shard/seed',
+                                 {'user_id': user_id, 'book_id': seed['book_id']})
+        return seed
+
+    def recommend(self, user_id, book_id=None, num_recommendations=10):
+        """(merged recommendations, missing shards) for a user and optional seed book"""
+        body = {**self.seed(user_id, book_id), 'user_id': user_id, 'num_recommendations': num_recommendations}
+        results, missing = self.scatter('POST', '/shard/recommendations', body=body)
+        merged = merge_ranked([result['recommendations'] for result in results.values()], num_recommendations)
+        return merged, missing
+
+    def search(self, query, limit=20, offset=0):
+        """(merged page of results, total matches, missing shards); every shard returns its first offset + limit"""
+        results, missing = self.scatter('GET', '/shard/search', {'query': query, 'limit': offset + limit})
+        merged = merge_ranked([result['results'] for result in results.values()], limit, offset)
+        return merged, sum(result['total'] for result in results.values()), missing
+
+    def rail(self, path, limit, params=None):
+        """
+        (merged books, year, missing shards) of a popularity rail. For new releases
+        every shard picks its own latest year, so only the shards with the latest
+        one contribute.
+        """
+        results, missing = self.scatter('GET', path, {**(params or {}), 'limit': limit})
+        years = [result.get('year') for result in results.values() if result.get('year')]
+        year = max(years, key=lambda value: int(value) if value.isdigit() else -1, default=None)
+        lists = [result['books'] for result in results.values()
+                 if path != '/books/new-releases' or result.get('year') == year]
+        return merge_ranked(lists, limit), year, missing
+
+    def add_rating(self, rating):
+        """
+        Forward a rating to every shard, which all keep every user's history, and
+        queue it for the shards that miss it or still have older ratings queued.
+        Returns those shards. ShardUnavailable, with nothing queued, if no shard
+        took the rating or a queue is full.
+        """
+        with self.lock:
+            if any(len(pending) >= self.max_pending_ratings for pending in self.pending_ratings):
+                raise ShardUnavailable("Too many ratings queued for an unavailable shard")
+            direct = [shard for shard, pending in enumerate(self.pending_ratings) if not pending]
+        results, missing = self.scatter('POST', '/ratings', body=rating, shards=direct)
+        if not results:
+            raise ShardUnavailable("No shard accepted the rating")
+        with self.lock:
+            queued = sorted(set(missing) | (set(range(self.n_shards)) - set(direct)))
+            for shard in queued:
+                self.pending_ratings[shard].append(rating)
+        METRICS.increment('shard_ratings_queued_total', len(queued))
+        return queued
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import book_recommender_api as api
+from benchmarks.recommender_benchmark import generate_data
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    """(books_df, ratings_df, users_df) loaded from small synthetic Book-Crossing-shaped CSVs"""
+    path = tmp_path_factory.mktemp('data')
+    generate_data(str(path), n_books=400, n_users=300, n_ratings=5000, seed=0)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(api, 'DATA_FILES', {name: str(path / filename)
+                                                for name, filename in api.DATA_FILES.items()})
+        return api.load_and_preprocess_data()
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import book_recommender_api as api
+
+
+@pytest.fixture(scope='module', params=['svd', 'als'])
+def model(request, dataset):
+    books_df, ratings_df, _ = dataset
+    model = api.CollaborativeRecommender(trainer=request.param, n_jobs=1)
+    model.fit(ratings_df, books_df)
+    return model
+
+
+def user_ids(model):
+    """Some trained users, a user folded in online and one the model has never seen"""
+    trained = list(model.user_inner_ids)[:20]
+    model.fold_in_user(10**6, np.array([0, 1, 2]), np.array([8.0, 9.0, 7.0]))
+    return trained + [10**6, -1]
+
+
+def test_score_users_matches_score_user(model):
+    users = user_ids(model)
+    scores = model.score_users(users)
+    assert scores.shape == (len(users), len(model.item_ids))
+    for row, user_id in zip(scores, users):
+        np.testing.assert_allclose(row, model.score_user(user_id), rtol=0, atol=1e-12)
+
+
+def test_score_users_at_positions_matches_score_items(model):
+    users = user_ids(model)
+    positions = np.arange(0, len(model.item_ids), 7)
+    scores = model.score_users(users, positions)
+    for row, user_id in zip(scores, users):
+        np.testing.assert_allclose(row, model.score_items(user_id, positions), rtol=0, atol=1e-12)
+
+
+def test_scores_stay_on_the_rating_scale(model):
+    scores = model.score_users(user_ids(model))
+    assert scores.min() >= api.RATING_RANGE[0] and scores.max() <= api.RATING_RANGE[1]
+
+
+def test_als_warm_start_stays_close_to_the_previous_model(dataset):
+    books_df, ratings_df, _ = dataset
+    previous = api.CollaborativeRecommender(trainer='als', n_jobs=1)
+    previous.fit(ratings_df, books_df)
+    refit = api.CollaborativeRecommender(trainer='als', n_jobs=1)
+    refit.fit(ratings_df, books_df, warm_start=previous)
+    user_id = next(iter(previous.user_inner_ids))
+    assert np.corrcoef(previous.score_user(user_id), refit.score_user(user_id))[0, 1] > 0.95
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import book_recommender_api as api
+
+
+@pytest.fixture(scope='module')
+def hybrid(dataset):
+    books_df, ratings_df, _ = dataset
+    return api.build_hybrid_recommender(books_df, ratings_df)
+
+
+@pytest.fixture(scope='module')
+def user_index(dataset, hybrid):
+    _, ratings_df, _ = dataset
+    return api.UserRatingIndex(ratings_df, hybrid.collaborative_recommender.item_ids)
+
+
+def test_recommend_batch_matches_recommend_rows(dataset, hybrid, user_index):
+    books_df = dataset[0]
+    users = [int(user_id) for user_id in user_index.user_ids[:40]]
+    seeds = [user_index.top_rated_book(user_id) or books_df['book_id'].iloc[0] for user_id in users]
+    # A user asking with a seed book of their own choosing, and an unknown user
+    users += [users[0], 10**6]
+    seeds += [books_df['book_id'].iloc[5], books_df['book_id'].iloc[7]]
+    rated = [user_index.rated_mask(user_id) for user_id in users]
+    top_ns = [10] * (len(users) - 1) + [3]
+
+    batch = hybrid.recommend_batch(users, seeds, rated, top_ns)
+
+    assert len(batch) == len(users)
+    for (rows, scores), user_id, seed, mask, top_n in zip(batch, users, seeds, rated, top_ns):
+        expected_rows, expected_scores = hybrid.recommend_rows(user_id, seed, mask, top_n=top_n)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(scores, expected_scores, rtol=0, atol=1e-12)
+
+
+def test_recommend_batch_leaves_out_rated_books(hybrid, user_index):
+    user_id = int(user_index.user_ids[0])
+    mask = user_index.rated_mask(user_id)
+    (rows, _), = hybrid.recommend_batch([user_id], [user_index.top_rated_book(user_id)], [mask], [20])
+    assert not mask[hybrid.row_item_positions[rows]].any()
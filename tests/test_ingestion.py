@@ -0,0 +1,50 @@
+import pytest
+
+import book_recommender_api as api
+
+
+@pytest.fixture
+def data_files(tmp_path, monkeypatch):
+    (tmp_path / 'books.csv').write_text(
+        'ISBN;Book-Title;Book-Author;Year-Of-Publication;Publisher;Image-URL-S;Image-URL-M;Image-URL-L\n'
+        'B1;Title One;Author;2000;P;s;m;l\n'
+        'B2;Title; Two;Author;2000;P;s;m;l\n'
+        ';No Isbn;Author;2000;P;s;m;l\n'
+        'B3;Title Three;Author;2001;P;s;m;l\n'
+    )
+    (tmp_path / 'ratings.csv').write_text(
+        'User-ID,ISBN,Book-Rating\n'
+        '1,B1,5\n'
+        '1,B3,0\n'
+        '2,B1,10\n'
+        '2,B3,11\n'
+        '3,B1,-1\n'
+        '3,B3,7.5\n'
+        'x,B1,4\n'
+        '4,,4\n'
+        '4,B1,4,extra\n'
+    )
+    (tmp_path / 'users.csv').write_text(
+        'User-ID,Location,Age\n'
+        '1,"a, b",20\n'
+        '2,"c, d",\n'
+        'nobody,"e, f",30\n'
+    )
+    monkeypatch.setattr(api, 'DATA_FILES', {name: str(tmp_path / filename)
+                                            for name, filename in api.DATA_FILES.items()})
+
+
+def test_malformed_rows_are_dropped_and_counted(data_files):
+    report = {}
+    books_df, ratings_df, users_df = api.load_and_preprocess_data(report=report)
+
+    assert list(books_df['book_id']) == ['B1', 'B3']
+    assert report['books'] == {'bad_fields': 1, 'missing_book_id': 1, 'rows': 2}
+
+    assert sorted(zip(ratings_df['user_id'], ratings_df['book_id'], ratings_df['rating'])) == [
+        (1, 'B1', 5), (1, 'B3', 0), (2, 'B1', 10)]
+    # 11, -1, 7.5, a non-numeric user id and a missing ISBN
+    assert report['ratings'] == {'bad_fields': 1, 'malformed_values': 5, 'rows': 3}
+
+    assert list(users_df['user_id']) == [1, 2]
+    assert report['users'] == {'bad_fields': 0, 'malformed_values': 1, 'rows': 2}
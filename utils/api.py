@@ -1,12 +1,31 @@
 import pandas as pd
-import requests
 import random
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 
+from utils.client import POOL_SIZE, APIError, BookMatchClient, make_session
+
 # Define API URL (change when deploying)
 API_URL = "http://0.0.0.0:8000"
 
 
+# One pooled keep-alive session for every browser session in this process
+@st.cache_resource
+def http_session():
+    return make_session()
+
+# One pool of dashboard fetch threads for every browser session, sized like the HTTP pool
+@st.cache_resource
+def fetch_executor():
+    return ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="bookmatch-fetch")
+
+# Client of the current browser session, so its response cache is per session
+def api_client():
+    if "api_client" not in st.session_state:
+        st.session_state.api_client = BookMatchClient(API_URL, session=http_session(), executor=fetch_executor())
+    return st.session_state.api_client
+
 # Load sample data for development/demo purposes
 @st.cache_data
 def load_sample_data():
@@ -51,38 +70,53 @@ def load_sample_data():
         })
         return books
 
-# Function to get book recommendations from API
-def get_recommendations(user_id, book_id=None, num_recommendations=6):
+# Books from a client call, or the fallback when the API is unreachable
+def books_or_fallback(result, fallback):
+    if isinstance(result, APIError):
+        st.error(f"Error: {result.detail}")
+        return []
+    if isinstance(result, Exception):
+        return fallback()
+    return result
+
+def call(fn, *args):
     try:
-        params = {
-            "user_id": user_id,
-            "num_recommendations": num_recommendations
-        }
-        if book_id:
-            params["book_id"] = book_id
-            
-        response = requests.get(f"{API_URL}/recommendations/", params=params)
-        if response.status_code == 200:
-            return response.json()["recommendations"]
-        else:
-            st.error(f"Error: {response.json()['detail']}")
-            return []
+        return fn(*args)
     except Exception as e:
-        # Return dummy recommendations for demonstration
-        books = load_sample_data()
-        return books.sample(num_recommendations).to_dict('records')
+        return e
 
-# Function to search books
+def sample_recommendations(num_recommendations=6):
+    # Return dummy recommendations for demonstration
+    books = load_sample_data()
+    return books.sample(min(num_recommendations, len(books))).to_dict('records')
+
+def sample_trending(limit=6):
+    # Return top-rated sample data for demonstration
+    books = load_sample_data()
+    if 'average_rating' not in books:
+        return books.head(limit).to_dict('records')
+    return books.sort_values('average_rating', ascending=False).head(limit).to_dict('records')
+
+def sample_new_releases(limit=3):
+    # Return the newest sample books for demonstration
+    books = load_sample_data()
+    return books.sort_values('published_date', ascending=False).head(limit).to_dict('records')
+
+# All dashboard rails in one round trip: (recommendations, trending, new releases)
+def get_dashboard(user_id, book_id=None, num_recommendations=6):
+    rails = api_client().dashboard(user_id, book_id, num_recommendations=num_recommendations, trending=6,
+                                   new_releases=3)
+    return (
+        books_or_fallback(rails["recommendations"], lambda: sample_recommendations(num_recommendations)),
+        books_or_fallback(rails["trending"], lambda: sample_trending(6)),
+        books_or_fallback(rails["new_releases"], lambda: sample_new_releases(3)),
+    )
+
+# Function to search books; debounced, so a newer search in this session supersedes it
 def search_books(query):
-    try:
-        response = requests.get(f"{API_URL}/books/search/", params={"query": query})
-        if response.status_code == 200:
-            return response.json()["results"]
-        else:
-            st.error(f"Error: {response.json()['detail']}")
-            return []
-    except Exception as e:
+    def sample_search():
         # Return filtered sample data for demonstration
         books = load_sample_data()
-        return books[books['title'].str.contains(query, case=False) | 
-                    books['authors'].str.contains(query, case=False)].to_dict('records')
\ No newline at end of file
+        return books[books['title'].str.contains(query, case=False) |
+                     books['authors'].str.contains(query, case=False)].to_dict('records')
+    return books_or_fallback(call(api_client().search, query), sample_search) or []
@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import pyarrow as pa
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+# Seconds to connect and to wait for a response; the dashboard would rather fall back than hang
+CONNECT_TIMEOUT = 1.0
+READ_TIMEOUT = 5.0
+
+# Keep-alive connections kept open to the API, and requests in flight at once
+POOL_SIZE = 8
+
+# Book lists come back as a compact Arrow stream instead of JSON when asked for
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class APIError(Exception):
+    """The API answered with an error status; detail is its message"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def make_session(pool_size=POOL_SIZE):
+    """requests.Session holding up to pool_size keep-alive connections per host, with no retries"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if HAVE_PYARROW:
+        session.headers["Accept"] = f"{ARROW_MEDIA_TYPE}, application/json"
+    return session
+
+
+class Debouncer:
+    """
+    Latest-wins gate for type-ahead requests. A call after a quiet spell goes
+    through at once; a call within `delay` seconds of the previous one waits out
+    the delay, and is dropped if another call arrived meanwhile.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.last_call = float('-inf')
+
+    def wait(self):
+        """True once this call should be sent, False if a newer call superseded it"""
+        now = time.monotonic()
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            quiet = now - self.last_call >= self.delay
+            self.last_call = now
+        if not quiet:
+            time.sleep(self.delay)
+        return call == self.calls
+
+
+class BookMatchClient:
+    """
+    HTTP client for the BookMatch API, one per front-end session.
+
+    Requests go through a pooled keep-alive session with strict timeouts, and
+    dashboard() fans out on a thread pool; pass both in to share them between
+    clients, otherwise each client makes its own. Book lists are kept for cache_ttl seconds keyed by
+    endpoint and parameters - so by user and book for recommendations - and
+    dashboard() fetches every dashboard rail at once. Searches are debounced.
+    """
+
+    def __init__(self, base_url, session=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), cache_ttl=30.0,
+                 search_debounce=0.3, max_cached=256, executor=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = session if session is not None else make_session()
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.search_debouncer = Debouncer(search_debounce)
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=POOL_SIZE)
+
+    def _fetch(self, path, params, list_name):
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            try:
+                detail = response.json()["detail"]
+            except ValueError:
+                detail = response.text
+            raise APIError(response.status_code, detail)
+        if response.headers.get("content-type", "").startswith(ARROW_MEDIA_TYPE):
+            return pa.ipc.open_stream(response.content).read_all().to_pylist()
+        return response.json()[list_name]
+
+    def _cached(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _store(self, key, books):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.cache) >= self.max_cached:
+                self.cache = {k: entry for k, entry in self.cache.items() if entry[0] > now}
+                while len(self.cache) >= self.max_cached:
+                    del self.cache[next(iter(self.cache))]
+            self.cache[key] = (now + self.cache_ttl, books)
+
+    def _request(self, key, path, params, list_name):
+        books = self._cached(key)
+        if books is None:
+            books = self._fetch(path, params, list_name)
+            self._store(key, books)
+        return books
+
+    def _recommendations_request(self, user_id, book_id, num_recommendations):
+        params = {"user_id": user_id, "num_recommendations": num_recommendations}
+        if book_id:
+            params["book_id"] = book_id
+        return (("recommendations", user_id, book_id, num_recommendations), "/recommendations/", params,
+                "recommendations")
+
+    def recommendations(self, user_id, book_id=None, num_recommendations=6):
+        return self._request(*self._recommendations_request(user_id, book_id, num_recommendations))
+
+    def trending(self, limit=6):
+        return self._request(("trending", limit), "/books/trending", {"limit": limit}, "books")
+
+    def new_releases(self, limit=3):
+        return self._request(("new_releases", limit), "/books/new-releases", {"limit": limit}, "books")
+
+    def search(self, query):
+        """
+        Books matching query, or None if a newer search superseded it while it
+        was being debounced. Queries shorter than the API's 3 characters match nothing.
+        """
+        query = " ".join(query.split())
+        if len(query) < 3:
+            return []
+        key = ("search", query.lower())
+        books = self._cached(key)
+        if books is not None:
+            return books
+        if not self.search_debouncer.wait():
+            return None
+        return self._request(key, "/books/search/", {"query": query}, "results")
+
+    def dashboard(self, user_id, book_id=None, num_recommendations=6, trending=6, new_releases=3):
+        """
+        Every dashboard rail, fetched concurrently: a dict of rail name to its
+        books, or to the exception that fetching it raised
+        """
+        requests_by_rail = {
+            "recommendations": self._recommendations_request(user_id, book_id, num_recommendations),
+            "trending": (("trending", trending), "/books/trending", {"limit": trending}, "books"),
+            "new_releases": (("new_releases", new_releases), "/books/new-releases", {"limit": new_releases}, "books"),
+        }
+        futures = {rail: self.executor.submit(self._request, *request) for rail, request in requests_by_rail.items()}
+        rails = {}
+        for rail, future in futures.items():
+            try:
+                rails[rail] = future.result()
+            except Exception as e:
+                rails[rail] = e
+        return rails